@@ -0,0 +1,73 @@
+"""
+Database profiles, picked with the DATABASE_PROFILE environment variable.
+
+`sqlite` (the default) keeps single-node deployments on SQLite files tuned
+through SQLITE_PRAGMAS. `postgres` reads the primary from POSTGRES_HOST,
+POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER and POSTGRES_PASSWORD.
+
+Both keep connections open for DATABASE_CONN_MAX_AGE seconds. Django 3.x
+has no CONN_HEALTH_CHECKS, so core.db.check_connections tests the open
+connections at the start of every request instead. Replicas are listed in
+DATABASE_REPLICAS, as comma separated file paths for SQLite or hosts for
+PostgreSQL, and serve the reads of views using core.db.ReplicaReadMixin.
+"""
+from functools import partial
+from pathlib import Path
+
+
+def sqlite_database(name, conn_max_age=600):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': str(name),
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': {
+            #Seconds to wait for the write lock
+            'timeout': 20,
+        },
+    }
+
+def postgres_database(host, environ, conn_max_age=600):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'HOST': host,
+        'PORT': environ.get('POSTGRES_PORT', '5432'),
+        'NAME': environ.get('POSTGRES_DB', 'api'),
+        'USER': environ.get('POSTGRES_USER', 'api'),
+        'PASSWORD': environ.get('POSTGRES_PASSWORD', ''),
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': {
+            'connect_timeout': 5,
+            'keepalives': 1,
+            'keepalives_idle': 30,
+        },
+    }
+    #Transaction pooling hands every transaction a different server
+    #connection, which named cursors cannot survive
+    if environ.get('DATABASE_POOLER') == 'pgbouncer':
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
+
+def database_profile(environ, base_dir):
+    """
+    Returns the DATABASES setting and the aliases of its replicas
+    """
+    profile = environ.get('DATABASE_PROFILE', 'sqlite')
+    conn_max_age = int(environ.get('DATABASE_CONN_MAX_AGE', 600))
+    replicas = [value.strip() for value in environ.get('DATABASE_REPLICAS', '').split(',') if value.strip()]
+
+    if profile == 'sqlite':
+        build = partial(sqlite_database, conn_max_age=conn_max_age)
+        primary = build(environ.get('SQLITE_PATH', Path(base_dir) / 'db.sqlite3'))
+    elif profile == 'postgres':
+        build = partial(postgres_database, environ=environ, conn_max_age=conn_max_age)
+        primary = build(environ.get('POSTGRES_HOST', 'localhost'))
+    else:
+        raise ValueError('Unknown DATABASE_PROFILE %r' % profile)
+
+    databases = {'default': primary}
+    for number, replica in enumerate(replicas, 1):
+        alias = 'replica%d' % number
+        databases[alias] = build(replica)
+        #Tests read and write a single database
+        databases[alias]['TEST'] = {'MIRROR': 'default'}
+    return databases, [alias for alias in databases if alias != 'default']
@@ -1,7 +1,10 @@
+import importlib.util
 import os
 from pathlib import Path
 from datetime import timedelta
 
+from .database import database_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'api.urls'
@@ -71,27 +77,120 @@ WSGI_APPLICATION = 'api.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
+# Profiles, persistent connections and replicas are described in
+# api/database.py. Users are kept on the primary for DATABASE_REPLICA_LAG
+# seconds after they write.
+
+DATABASES, DATABASE_REPLICAS = database_profile(os.environ, BASE_DIR)
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+DATABASE_REPLICA_LAG = 5
+DATABASE_PIN_CACHE_ALIAS = 'default'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+}
+
+# Cache
+# Course, lesson and slide reads are cached under versioned keys in
+# COURSES_CACHE_ALIAS. Point it at a FileBasedCache (or any shared backend)
+# to share entries between worker processes.
 
-DATABASES = {
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+COURSES_CACHE_ALIAS = 'default'
+COURSES_CACHE_TIMEOUT = 300
+
+# Access tokens carry the user's roles and token version. The version is
+# checked against TOKEN_VERSION_CACHE_ALIAS, so revocation reaches other
+# worker processes once their entry expires unless the cache is shared.
+TOKEN_VERSION_CACHE_ALIAS = 'default'
+TOKEN_VERSION_CACHE_TIMEOUT = 60
+
+# Permission checks keep what they look up, such as the owners of a
+# lesson's courses, in ROLE_CACHE_ALIAS and memoize it per request
+ROLE_CACHE_ALIAS = 'default'
+ROLE_CACHE_TIMEOUT = 300
+
+# Refresh tokens are rotated on every refresh and spent ones are kept in
+# the denylist until they expire. Run `manage.py purge_denylist`
+# periodically to drop the expired rows.
+TOKEN_DENYLIST_BACKEND = 'core.denylist.DatabaseDenylist'
+TOKEN_DENYLIST_OPTIONS = {
+    'cache_size': 10000,
+}
+
+# Login and signup throttling
+# Attempts are counted per client IP and per submitted email in sliding
+# windows; over the limit the request gets a 429 before any password is
+# hashed. The default backend counts per process, use
+# core.throttling.CacheWindowStore with a shared cache to count across
+# workers. Set a rate to None to turn that counter off, and leave a
+# scope out of THROTTLE_RATES to turn its throttling off.
+THROTTLE_BACKEND = 'core.throttling.LocMemWindowStore'
+THROTTLE_OPTIONS = {
+    'size': 10000,
+}
+THROTTLE_RATES = {
+    'login': {'ip': '30/min', 'email': '10/min'},
+    'registration': {'ip': '20/hour', 'email': '5/hour'},
+}
+
+# Response compression
+# Bodies of at least COMPRESSION_MIN_SIZE bytes are compressed with the
+# client's preferred encoding among COMPRESSION_ENCODINGS, ties going to
+# the first listed; brotli and zstd need the brotli and zstandard
+# packages. Cached course, lesson and slide lists keep their compressed
+# bodies next to the cached data.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_ENCODINGS = ('br', 'zstd', 'gzip')
+COMPRESSION_LEVELS = {
+    'br': 5,
+    'zstd': 3,
+}
+
+# Request metrics
+# Share of requests whose query count, SQL time, render time and size are
+# recorded, sent as Server-Timing and exported at /metrics/
+METRICS_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+METRICS_PREFIX = 'api'
+
 # REST API
+# JSON is encoded and parsed with orjson when it is installed, MessagePack
+# is negotiated when msgpack is installed, and the browsable API is only
+# served under DEBUG
+HAS_MSGPACK = importlib.util.find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
-    # 'DEFAULT_RENDERER_CLASSES': (
-    #     'rest_framework.renderers.JSONRenderer',
-    # ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+    ] + (['core.renderers.MessagePackRenderer'] if HAS_MSGPACK else []) + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []
+    ),
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['core.renderers.MessagePackParser'] if HAS_MSGPACK else []),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.RoleTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    # Client IPs for throttling come from REMOTE_ADDR. Behind reverse
+    # proxies, set this to their number so the address they append to
+    # X-Forwarded-For is used; the header is never trusted otherwise.
+    'NUM_PROXIES': 0,
 }
 
 SIMPLE_JWT = {
@@ -123,6 +222,34 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# New hashes use the first hasher; existing hashes made by another hasher
+# or with other costs are upgraded on the next login. Argon2 needs the
+# argon2-cffi package. Run `manage.py benchmark_hashers` to pick costs.
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'core.hashers.Argon2PasswordHasher',
+    'core.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Never below the framework defaults; 260000 PBKDF2 iterations is the
+# Django 3.2 default, above the 216000 of Django 3.1.
+PASSWORD_HASHER_COSTS = {
+    'pbkdf2_sha256': {'iterations': 260000},
+    'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},
+}
+
+# Threads hashing and verifying passwords, defaults to one per CPU
+PASSWORD_HASHING_WORKERS = None
+
+# Processes hashing passwords in `manage.py provision_users`, defaults to
+# one per CPU. The provisioning endpoint hashes in the threads above.
+USER_PROVISIONING_WORKERS = None
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
 
@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from core.metrics import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
     path('core/', include('core.urls', namespace="core")),
     path('api/', include('courses.urls', namespace="api")),
+    path('metrics/', MetricsView.as_view(), name="metrics"),
 ]
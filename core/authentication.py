@@ -0,0 +1,34 @@
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .tokens import RoleTokenUser, VERSION_CLAIM, acheck_token_version, check_token_version
+
+
+class RoleTokenAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from the token claims instead
+    of fetching the user row. Tokens issued without role claims fall back
+    to the database lookup.
+    """
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        check_token_version(validated_token)
+        return RoleTokenUser(validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        Async authenticate for plain Django async views, returns the user
+        or None when the request carries no token
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if VERSION_CLAIM not in validated_token:
+            return await sync_to_async(super().get_user, thread_sensitive=True)(validated_token)
+        await acheck_token_version(validated_token)
+        return RoleTokenUser(validated_token)
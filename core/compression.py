@@ -0,0 +1,151 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#Bodies of these types are already compressed
+INCOMPRESSIBLE_TYPES = ('image/', 'audio/', 'video/', 'application/zip', 'application/gzip', 'application/x-gzip')
+
+DEFAULT_LEVELS = {'br': 5, 'zstd': 3}
+
+
+def get_level(encoding):
+    levels = getattr(settings, 'COMPRESSION_LEVELS', {})
+    return levels.get(encoding, DEFAULT_LEVELS.get(encoding))
+
+def is_available(encoding):
+    if encoding == 'br':
+        return brotli is not None
+    if encoding == 'zstd':
+        return zstandard is not None
+    return encoding == 'gzip'
+
+def get_encodings():
+    """
+    The encodings the server offers, most preferred first
+    """
+    preferred = getattr(settings, 'COMPRESSION_ENCODINGS', ('br', 'zstd', 'gzip'))
+    return [encoding for encoding in preferred if is_available(encoding)]
+
+def get_min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+def parse_accept_encoding(header):
+    """
+    Returns {coding: q} from an Accept-Encoding header
+    """
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+def negotiate(request):
+    """
+    Returns the offered encoding the client accepts with the highest
+    quality, ties going to the server's preference, or None for identity
+    """
+    accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    best, best_quality = None, 0.0
+    for encoding in get_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=get_level('br'))
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=get_level('zstd')).compress(content)
+    return compress_string(content)
+
+def decompress(content, encoding):
+    if encoding == 'br':
+        return brotli.decompress(content)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    return gzip.decompress(content)
+
+def compress_stream(chunks, encoding):
+    """
+    Compresses an iterable of chunks, flushing after each one so streamed
+    records reach the client as they are produced
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=get_level('br'))
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=get_level('zstd')).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+    else:
+        yield from compress_sequence(chunks)
+
+def is_compressible(response):
+    if response.has_header('Content-Encoding'):
+        return False
+    content_type = response.get('Content-Type', '').lower()
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+def set_encoding(response, encoding):
+    response['Content-Encoding'] = encoding
+    #The compressed body is a different representation
+    if response.has_header('ETag'):
+        response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses responses with the best of brotli, zstd and gzip the client
+    accepts. Bodies below COMPRESSION_MIN_SIZE bytes are sent as they are,
+    and responses that already carry a Content-Encoding are left alone.
+    """
+    def process_response(self, request, response):
+        if not is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < get_min_size():
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        set_encoding(response, encoding)
+        return response
@@ -0,0 +1,136 @@
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+#Routing state of the current request
+state = Local()
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+}
+
+
+def get_replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if alias in connections.databases]
+
+def reset():
+    state.replicas = False
+    state.wrote = False
+
+def use_replicas():
+    """
+    Sends the reads that follow to the replicas, until a write or the end
+    of the request
+    """
+    state.replicas = True
+
+def use_primary():
+    state.replicas = False
+
+def pin_key(user):
+    return 'db:pinned:%s' % user.pk
+
+def get_pin_cache():
+    return caches[getattr(settings, 'DATABASE_PIN_CACHE_ALIAS', 'default')]
+
+def pin(user):
+    """
+    Keeps the reads of `user` on the primary long enough for the replicas
+    to catch up with their writes
+    """
+    get_pin_cache().set(pin_key(user), True, getattr(settings, 'DATABASE_REPLICA_LAG', 5))
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and get_pin_cache().get(pin_key(user)) is not None
+
+
+class ReplicaRouter:
+    """
+    Reads go to a random replica while `use_replicas()` is on, everything
+    else to the primary. A write switches the rest of the request back to
+    the primary so it reads what it wrote.
+    """
+    def db_for_read(self, model, **hints):
+        if not getattr(state, 'replicas', False) or getattr(state, 'wrote', False):
+            return None
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Lets GET and HEAD requests of a DRF view read from the replicas, unless
+    the user wrote recently and must read their own writes
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned(request.user):
+            use_replicas()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        use_primary()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaPinningMiddleware:
+    """
+    Starts every request on the primary and pins the user to it for
+    DATABASE_REPLICA_LAG seconds after a request that wrote
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            if state.wrote and user is not None and user.is_authenticated:
+                pin(user)
+            return response
+        finally:
+            reset()
+
+
+def apply_pragmas(connection):
+    """
+    Tunes a new SQLite connection: WAL lets readers run alongside the
+    writer, NORMAL sync is safe with WAL and busy_timeout waits for locks
+    instead of failing
+    """
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+def check_connections():
+    """
+    Closes persistent connections that stopped working since the last
+    request, e.g. after a database restart, so they reopen on first use.
+    Stands in for CONN_HEALTH_CHECKS, which Django 3.x does not have.
+    """
+    for connection in connections.all():
+        if not connection.settings_dict.get('CONN_MAX_AGE') or connection.connection is None:
+            continue
+        if connection.in_atomic_block:
+            continue
+        if not connection.is_usable():
+            connection.close()
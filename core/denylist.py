@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class LRUCache:
+    """
+    Thread-safe set of recently seen keys, bounded to `size` entries
+    """
+    def __init__(self, size):
+        self.size = size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self._keys:
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            if len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+class BaseDenylist:
+    """
+    Store of refresh token ids that must not be accepted again
+    """
+    def deny(self, jti, expires_at):
+        """
+        Adds `jti` to the denylist. Returns False when it was already
+        denied, so using a token and revoking it is one atomic step.
+        """
+        raise NotImplementedError
+
+    def is_denied(self, jti):
+        raise NotImplementedError
+
+    def purge(self, now=None):
+        """
+        Drops entries whose token expired, returns how many were dropped
+        """
+        raise NotImplementedError
+
+
+class DatabaseDenylist(BaseDenylist):
+    """
+    Denylist in the DeniedToken table. Lookups go through the unique jti
+    index and denied ids are remembered in an in-process LRU cache, so
+    replays of a revoked token do not reach the database at all. Ids that
+    are not denied are never cached: another process may deny them.
+    """
+    def __init__(self, cache_size=10000):
+        self.recent = LRUCache(cache_size)
+
+    def deny(self, jti, expires_at):
+        from .models import DeniedToken
+
+        if jti in self.recent:
+            return False
+        try:
+            with transaction.atomic():
+                DeniedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            self.recent.add(jti)
+            return False
+        self.recent.add(jti)
+        return True
+
+    def is_denied(self, jti):
+        from .models import DeniedToken
+
+        if jti in self.recent:
+            return True
+        if DeniedToken.objects.filter(jti=jti).exists():
+            self.recent.add(jti)
+            return True
+        return False
+
+    def purge(self, now=None):
+        from .models import DeniedToken
+
+        deleted, _ = DeniedToken.objects.filter(expires_at__lte=now or timezone.now()).delete()
+        return deleted
+
+
+_denylist = None
+
+def get_denylist():
+    """
+    Returns the denylist configured by TOKEN_DENYLIST_BACKEND, built once
+    per process so its front cache is shared between requests
+    """
+    global _denylist
+    if _denylist is None:
+        backend = import_string(getattr(settings, 'TOKEN_DENYLIST_BACKEND', 'core.denylist.DatabaseDenylist'))
+        _denylist = backend(**getattr(settings, 'TOKEN_DENYLIST_OPTIONS', {}))
+    return _denylist
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+
+
+class TunableCostMixin:
+    """
+    Reads the cost parameters of a hasher from PASSWORD_HASHER_COSTS,
+    keyed by algorithm. Hashes made with other parameters are upgraded by
+    `check_password` on the next successful login.
+    """
+    def __init__(self):
+        costs = getattr(settings, 'PASSWORD_HASHER_COSTS', {}).get(self.algorithm, {})
+        for name, value in costs.items():
+            setattr(self, name, value)
+
+
+class PBKDF2PasswordHasher(TunableCostMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(TunableCostMixin, hashers.Argon2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(TunableCostMixin, hashers.BasePasswordHasher):
+    """
+    Memory-hard scrypt from hashlib, stored in the same format as the
+    Django 4.0 scrypt hasher
+    """
+    algorithm = 'scrypt'
+    work_factor = 2 ** 14
+    block_size = 8
+    parallelism = 1
+    maxmem = 0
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=self.maxmem or 256 * r * (n + p), dklen=64,
+        )
+        hash = base64.b64encode(hash).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash)
+
+    def decode(self, encoded):
+        algorithm, work_factor, salt, block_size, parallelism, hash = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return {
+            'algorithm': algorithm,
+            'work_factor': int(work_factor),
+            'salt': salt,
+            'block_size': int(block_size),
+            'parallelism': int(parallelism),
+            'hash': hash,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        encoded_2 = self.encode(
+            password, decoded['salt'], decoded['work_factor'], decoded['block_size'], decoded['parallelism'],
+        )
+        return constant_time_compare(encoded, encoded_2)
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            'algorithm': decoded['algorithm'],
+            'work factor': decoded['work_factor'],
+            'block size': decoded['block_size'],
+            'parallelism': decoded['parallelism'],
+            'salt': hashers.mask_hash(decoded['salt']),
+            'hash': hashers.mask_hash(decoded['hash']),
+        }
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return (decoded['work_factor'], decoded['block_size'], decoded['parallelism']) != \
+            (self.work_factor, self.block_size, self.parallelism)
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+#Hashing is CPU bound and releases the GIL, so it runs in a pool bounded
+#to PASSWORD_HASHING_WORKERS threads. Request threads still wait for the
+#result, the pool only caps how many hashes run at once.
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    return _executor
+
+def _verify(password, encoded):
+    upgrade = []
+    is_correct = hashers.check_password(password, encoded, setter=upgrade.append)
+    return is_correct, bool(upgrade)
+
+def hash_password(password):
+    return get_executor().submit(hashers.make_password, password).result()
+
+def verify_password(password, encoded):
+    """
+    Checks `password` against `encoded` in the hashing pool, returns
+    whether it matched and whether the hash should be upgraded
+    """
+    return get_executor().submit(_verify, password, encoded).result()
+
+@receiver(setting_changed)
+def reset_hashing(setting, **kwargs):
+    global _executor
+    if setting == 'PASSWORD_HASHER_COSTS':
+        hashers.get_hashers.cache_clear()
+        hashers.get_hashers_by_algorithm.cache_clear()
+    elif setting == 'PASSWORD_HASHING_WORKERS':
+        with _executor_lock:
+            _executor = None
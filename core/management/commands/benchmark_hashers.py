@@ -0,0 +1,41 @@
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measures hashing and verification throughput of every configured password hasher on one core'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--password', default='correct horse battery staple')
+
+    def handle(self, *args, **options):
+        rounds = max(1, options['rounds'])
+        password = options['password']
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as e:
+                #Hashers backed by a missing library
+                self.stdout.write(self.style.WARNING('%s: skipped (%s)' % (hasher.algorithm, e)))
+                continue
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                hasher.encode(password, hasher.salt())
+            signups = rounds / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                hasher.verify(password, encoded)
+            logins = rounds / (time.perf_counter() - start)
+
+            summary = ', '.join(
+                '%s=%s' % (name, value) for name, value in hasher.safe_summary(encoded).items()
+                if name not in ('algorithm', 'salt', 'hash', 'checksum')
+            )
+            self.stdout.write('%s (%s): %.1f logins/s, %.1f signups/s per core' % (
+                hasher.algorithm, summary, logins, signups,
+            ))
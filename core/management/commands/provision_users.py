@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.provisioning import FORMATS, UserProvisioner, parse_rows
+
+
+class Command(BaseCommand):
+    help = 'Creates student and teacher accounts from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, or ndjson')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, help='Password hashing processes, defaults to one per CPU')
+
+    def handle(self, *args, **options):
+        format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        provisioner = UserProvisioner(batch_size=options['batch_size'], workers=options['workers'])
+        if options['path'] == '-':
+            result = provisioner.run(parse_rows(sys.stdin, format=format))
+        else:
+            with open(options['path'], encoding='utf-8', newline='') as lines:
+                result = provisioner.run(parse_rows(lines, format=format))
+
+        for row in result['results']:
+            if row['status'] == 'invalid':
+                self.stderr.write('line %(line)s: %(errors)s' % row)
+            elif row['status'] == 'duplicate':
+                self.stderr.write('line %(line)s: %(email)s is already taken' % row)
+        self.stdout.write(self.style.SUCCESS(
+            'Created %(created)d users (%(duplicate)d duplicates, %(invalid)d invalid)' % result
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.denylist import get_denylist
+
+
+class Command(BaseCommand):
+    help = 'Removes expired refresh tokens from the denylist'
+
+    def handle(self, *args, **options):
+        purged = get_denylist().purge()
+        self.stdout.write(self.style.SUCCESS('Purged %d expired tokens' % purged))
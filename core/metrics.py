@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+#Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = (
+    ('request_duration_seconds', 'Time spent handling the request', SECONDS_BUCKETS),
+    ('sql_duration_seconds', 'Time spent in SQL queries', SECONDS_BUCKETS),
+    ('sql_queries', 'Number of SQL queries', QUERY_BUCKETS),
+    ('render_duration_seconds', 'Time spent serializing the response body', SECONDS_BUCKETS),
+    ('response_size_bytes', 'Size of the response body', BYTES_BUCKETS),
+)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus layout
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """
+    In-process histograms of every metric, per view and method
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, labels, values):
+        with self.lock:
+            for name, _, buckets in METRICS:
+                if values.get(name) is None:
+                    continue
+                key = (name, labels)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(values[name])
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        """
+        Returns the histograms in the Prometheus text exposition format
+        """
+        prefix = getattr(settings, 'METRICS_PREFIX', 'api')
+        lines = []
+        with self.lock:
+            for name, help, _ in METRICS:
+                metric = '%s_%s' % (prefix, name)
+                lines.append('# HELP %s %s' % (metric, help))
+                lines.append('# TYPE %s histogram' % metric)
+                for (key, labels), histogram in sorted(self.histograms.items()):
+                    if key != name:
+                        continue
+                    label_text = ','.join('%s="%s"' % (label, escape(value)) for label, value in labels)
+                    for bound, count in histogram.cumulative():
+                        lines.append('%s_bucket{%s,le="%s"} %d' % (metric, label_text, bound, count))
+                    lines.append('%s_sum{%s} %s' % (metric, label_text, repr(float(histogram.sum))))
+                    lines.append('%s_count{%s} %d' % (metric, label_text, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting queries and their total time
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Records the query count, SQL time, render time and size of a sample
+    of responses. METRICS_SAMPLE_RATE is the sampled share of requests;
+    sampled responses get a Server-Timing header and are added to the
+    registry served by MetricsView.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'METRICS_SAMPLE_RATE', 0.0):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._metrics_render = [None, None]
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        render_start, render_end = request._metrics_render
+        render = render_end - render_start if render_end is not None else None
+        size = None if response.streaming else len(response.content)
+
+        registry.observe(self.get_labels(request, response), {
+            'request_duration_seconds': duration,
+            'sql_duration_seconds': recorder.duration,
+            'sql_queries': recorder.count,
+            'render_duration_seconds': render,
+            'response_size_bytes': size,
+        })
+
+        timings = [
+            'db;dur=%.2f;desc="%d queries"' % (recorder.duration * 1000, recorder.count),
+            'total;dur=%.2f' % (duration * 1000),
+        ]
+        if render is not None:
+            timings.insert(1, 'render;dur=%.2f' % (render * 1000))
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        #Runs right before DRF renders the response body
+        marks = getattr(request, '_metrics_render', None)
+        if marks is not None:
+            marks[0] = time.perf_counter()
+
+            def rendered(response):
+                marks[1] = time.perf_counter()
+            response.add_post_render_callback(rendered)
+        return response
+
+    def get_labels(self, request, response):
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        return (('view', view), ('method', request.method), ('status', str(response.status_code)))
+
+
+class MetricsView(APIView):
+    """
+    Per-view request metrics in the Prometheus text format
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import ugettext_lazy as _
 
+from .hashers import hash_password, verify_password
 from .managers import UserManager
 
 class User(AbstractUser):
@@ -12,6 +13,7 @@ class User(AbstractUser):
 	is_student = models.BooleanField('Student status', default=True)
 	is_teacher = models.BooleanField('Teacher status', default=False)
 	is_active = models.BooleanField('User account status', default=True, blank=True)
+	token_version = models.PositiveIntegerField(default=0, editable=False)
 
 	USERNAME_FIELD = 'email'
 	REQUIRED_FIELDS = ['first_name', 'last_name']
@@ -21,6 +23,24 @@ class User(AbstractUser):
 	def __str__(self):
 		return self.email
 
+	def set_password(self, raw_password):
+		self.password = hash_password(raw_password)
+		self._password = raw_password
+
+	def check_password(self, raw_password):
+		"""
+		Verifies the password in the hashing pool and stores a new hash when
+		the hasher or its cost changed
+		"""
+		is_correct, must_update = verify_password(raw_password, self.password)
+		if is_correct and must_update:
+			self.set_password(raw_password)
+			self._password = None
+			#Same password, so the tokens issued before stay valid
+			self._rehashed = True
+			self.save(update_fields=['password'])
+		return is_correct
+
 class Student(models.Model):
 	user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
 
@@ -28,3 +48,13 @@ class Teacher(models.Model):
 	user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
 
 
+
+class DeniedToken(models.Model):
+	"""
+	Refresh token that can no longer be used, kept until it expires
+	"""
+	jti = models.CharField(max_length=255, unique=True)
+	expires_at = models.DateTimeField(db_index=True)
+
+	def __str__(self):
+		return self.jti
@@ -1,11 +1,13 @@
 from rest_framework import permissions
 
+from .roles import get_resolver
+
 class IsStudent(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_student)
+        return get_resolver(request).has_role('student')
 
 class IsTeacher(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_teacher)
\ No newline at end of file
+        return get_resolver(request).has_role('teacher')
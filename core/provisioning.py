@@ -0,0 +1,193 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework.parsers import BaseParser
+
+from .models import Student, Teacher
+
+FORMATS = ('ndjson', 'csv')
+
+
+class UserProvisioningSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=64)
+    first_name = serializers.CharField(max_length=64)
+    last_name = serializers.CharField(max_length=64)
+    #Accounts provisioned without a password get an unusable one
+    password = serializers.CharField(max_length=128, min_length=8, required=False, allow_blank=False)
+    is_student = serializers.BooleanField(default=True)
+    is_teacher = serializers.BooleanField(default=False)
+
+    def validate_email(self, value):
+        return get_user_model().objects.normalize_email(value)
+
+    def validate(self, attrs):
+        if not attrs['is_student'] and not attrs['is_teacher']:
+            raise serializers.ValidationError('User must be either a student or a teacher')
+        return attrs
+
+
+class CSVParser(BaseParser):
+    """
+    Hands a CSV request body to the view as a lazy iterator of lines
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter(stream) if stream is not None else iter(())
+
+
+def decode_lines(lines):
+    for line in lines:
+        yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+def parse_rows(lines, format='ndjson'):
+    """
+    Yields (line number, record, error) for every row of an NDJSON or CSV
+    (with a header line) source
+    """
+    lines = decode_lines(lines)
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, {key: value for key, value in record.items() if key and value != ''}, None
+        return
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, {'non_field_errors': ['Invalid JSON: %s' % e]}
+            continue
+        if not isinstance(record, dict):
+            yield number, None, {'non_field_errors': ['Must be an object']}
+            continue
+        yield number, record, None
+
+
+def setup_worker():
+    #Spawned workers start without Django configured
+    django.setup()
+
+
+class UserProvisioner:
+    """
+    Creates a cohort of users with their Student/Teacher profile rows.
+    Every chunk of `batch_size` rows is validated, checked for emails that
+    are taken or repeated in the cohort with one query, hashed and written
+    with bulk_create in one transaction.
+
+    Passwords are hashed with `executor` when one is given, which the API
+    does with the process-wide hashing pool. Otherwise a pool of `workers`
+    processes is started for the run (inline when there is at most one),
+    which is meant for the provision_users command only.
+    """
+    def __init__(self, batch_size=1000, workers=None, executor=None):
+        self.batch_size = batch_size
+        if workers is None:
+            workers = getattr(settings, 'USER_PROVISIONING_WORKERS', None) or os.cpu_count() or 1
+        self.workers = workers
+        self.executor = executor
+        self.results = []
+        self.seen = set()
+
+    def run(self, rows):
+        executor = self.executor
+        if executor is None and self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=setup_worker)
+        try:
+            rows = iter(rows)
+            while True:
+                chunk = list(islice(rows, self.batch_size))
+                if not chunk:
+                    break
+                self.provision_chunk(chunk, executor)
+        finally:
+            if executor is not None and executor is not self.executor:
+                executor.shutdown()
+
+        self.results.sort(key=lambda result: result['line'])
+        counts = {'created': 0, 'duplicate': 0, 'invalid': 0}
+        for result in self.results:
+            counts[result['status']] += 1
+        return {**counts, 'results': self.results}
+
+    def provision_chunk(self, chunk, executor):
+        valid = []
+        for number, record, error in chunk:
+            if error is None:
+                serializer = UserProvisioningSerializer(data=record)
+                if serializer.is_valid():
+                    valid.append((number, serializer.validated_data))
+                    continue
+                error = serializer.errors
+            self.results.append({'line': number, 'status': 'invalid', 'errors': error})
+        valid = self.drop_duplicates(valid)
+
+        passwords = [data.get('password') for _, data in valid]
+        if executor is not None:
+            hashes = list(executor.map(make_password, passwords, chunksize=max(1, len(passwords) // self.workers)))
+        else:
+            hashes = [make_password(password) for password in passwords]
+        hashed = [(number, data, encoded) for (number, data), encoded in zip(valid, hashes)]
+
+        while True:
+            try:
+                with transaction.atomic():
+                    self.write_users(hashed)
+                return
+            except IntegrityError:
+                #Another writer took some of the emails since the check
+                remaining = self.drop_duplicates(hashed, seen=False)
+                if len(remaining) == len(hashed):
+                    raise
+                hashed = remaining
+
+    def drop_duplicates(self, rows, seen=True):
+        """
+        Reports rows whose email is taken, or was already provisioned from
+        an earlier row when `seen` is set, and returns the rest
+        """
+        emails = [row[1]['email'] for row in rows]
+        taken = set(get_user_model().objects.filter(email__in=emails).values_list('email', flat=True))
+
+        unique = []
+        for row in rows:
+            email = row[1]['email']
+            if email in taken or (seen and email in self.seen):
+                self.results.append({'line': row[0], 'email': email, 'status': 'duplicate'})
+                continue
+            if seen:
+                self.seen.add(email)
+            unique.append(row)
+        return unique
+
+    def write_users(self, hashed):
+        User = get_user_model()
+        users = []
+        for _, data, encoded in hashed:
+            data = dict(data)
+            data.pop('password', None)
+            users.append(User(password=encoded, **data))
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        #bulk_create only sets primary keys on some databases
+        ids = dict(User.objects.filter(email__in=[user.email for user in users]).values_list('email', 'id'))
+        Student.objects.bulk_create(
+            [Student(user_id=ids[user.email]) for user in users if user.is_student], batch_size=self.batch_size,
+        )
+        Teacher.objects.bulk_create(
+            [Teacher(user_id=ids[user.email]) for user in users if user.is_teacher], batch_size=self.batch_size,
+        )
+        for number, data, _ in hashed:
+            self.results.append({'line': number, 'email': data['email'], 'status': 'created', 'id': ids[data['email']]})
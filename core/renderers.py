@@ -0,0 +1,97 @@
+import decimal
+
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class DecimalStringEncoder(JSONEncoder):
+    """
+    DRF's JSONEncoder writing decimals as strings, as serializer fields do
+    with COERCE_DECIMAL_TO_STRING, so no precision is lost on the way
+    """
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+def encode_default(obj):
+    """
+    Converts what orjson and msgpack cannot encode natively (decimals, lazy
+    translations, querysets...) the way the stdlib fallback does
+    """
+    return DecimalStringEncoder().default(obj)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed. Indented output,
+    asked for with `; indent=` in the Accept header, and installs without
+    orjson go through the stdlib encoder.
+    """
+    encoder_class = DecimalStringEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser backed by orjson when it is installed
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % exc)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renders `application/msgpack` for clients that ask for it, requires the
+    msgpack package
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses `application/msgpack` request bodies, requires the msgpack
+    package
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % exc)
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+
+ROLES = ('student', 'teacher', 'staff', 'superuser')
+
+
+def get_cache():
+    return caches[getattr(settings, 'ROLE_CACHE_ALIAS', 'default')]
+
+def invalidate(*keys):
+    if keys:
+        get_cache().delete_many(keys)
+
+
+class RoleResolver:
+    """
+    Resolves the roles of a user and the permission data checks need, for
+    one request. Lookups are memoized on the resolver, in front of the
+    shared role cache, so repeated checks in a request cost nothing and
+    later requests cost a cache hit.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.memo = {}
+
+    @cached_property
+    def roles(self):
+        #Token users carry the roles as claims, so this never queries
+        if self.user is None or not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(role for role in ROLES if getattr(self.user, 'is_%s' % role, False))
+
+    def has_role(self, *roles):
+        return not self.roles.isdisjoint(roles)
+
+    def lookup(self, key, loader):
+        """
+        Returns the value cached under `key`, calling `loader()` on a miss.
+        Loaders must not return None.
+        """
+        if key in self.memo:
+            return self.memo[key]
+        cache = get_cache()
+        value = cache.get(key)
+        if value is None:
+            value = loader()
+            cache.set(key, value, getattr(settings, 'ROLE_CACHE_TIMEOUT', 300))
+        self.memo[key] = value
+        return value
+
+
+def get_resolver(request):
+    """
+    Returns the resolver of the request's current user, created once per
+    request
+    """
+    resolver = getattr(request, '_role_resolver', None)
+    if resolver is None or resolver.user is not request.user:
+        resolver = RoleResolver(request.user)
+        request._role_resolver = resolver
+    return resolver
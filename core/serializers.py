@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+
+from .tokens import RoleRefreshToken, VERSION_CLAIM, check_token_version
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -22,4 +25,25 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         if password is not None:
             instance.set_password(password)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues tokens carrying the role claims of the user
+    """
+    @classmethod
+    def get_token(cls, user):
+        return RoleRefreshToken.for_user(user)
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Rotates the refresh token: the submitted one is denied and a new one
+    is returned along with the access token. Tokens revoked by a role
+    change are refused.
+    """
+    def validate(self, attrs):
+        refresh = RoleRefreshToken(attrs['refresh'])
+        if VERSION_CLAIM in refresh:
+            check_token_version(refresh)
+        refresh.rotate()
+        return { 'access': str(refresh.access_token), 'refresh': str(refresh) }
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import db
+from .models import Student, Teacher
+from .tokens import REVOKING_FIELDS, set_token_version
+
+User = get_user_model()
+
+#Role flags with a profile row
+PROFILE_ROLES = {'is_student': Student, 'is_teacher': Teacher}
+
+@receiver(pre_save, sender=User)
+def bump_token_version(sender, instance, update_fields=None, **kwargs):
+    """
+    Moves the user to a new token version when a role, the account status
+    or the password changes, so tokens carrying the old claims are revoked
+    """
+    fields = REVOKING_FIELDS
+    if instance.__dict__.pop('_rehashed', False):
+        fields = tuple(name for name in fields if name != 'password')
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    stored = User.objects.filter(pk=instance.pk).values('token_version', *fields).first()
+    if stored is not None:
+        #Read by sync_role_profiles, which needs the flags before this save
+        instance._stored_roles = {name: stored[name] for name in PROFILE_ROLES}
+    if stored is not None and any(stored[name] != getattr(instance, name) for name in fields):
+        instance.token_version = stored['token_version'] + 1
+        if update_fields is not None:
+            #token_version is not part of this save, so it is written here
+            User.objects.filter(pk=instance.pk).update(token_version=instance.token_version)
+
+@receiver(post_save, sender=User)
+def cache_token_version(sender, instance, **kwargs):
+    set_token_version(instance.pk, instance.token_version)
+
+@receiver(post_delete, sender=User)
+def uncache_token_version(sender, instance, **kwargs):
+    set_token_version(instance.pk, None)
+
+@receiver(post_save, sender=User)
+def sync_role_profiles(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keeps the Student and Teacher profile rows in step with the role flags,
+    touching them only on creation or when a flag changed
+    """
+    stored = instance.__dict__.pop('_stored_roles', None)
+    if update_fields is not None and not set(PROFILE_ROLES) & set(update_fields):
+        return
+    for name, model in PROFILE_ROLES.items():
+        has_role = getattr(instance, name)
+        if created:
+            if has_role:
+                model.objects.create(user_id=instance.pk)
+        elif stored is not None and stored[name] == has_role:
+            continue
+        elif has_role:
+            model.objects.get_or_create(user_id=instance.pk)
+        else:
+            model.objects.filter(user_id=instance.pk).delete()
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        db.apply_pragmas(connection)
+
+@receiver(request_started)
+def check_database_connections(sender, **kwargs):
+    db.check_connections()
@@ -1,20 +1,49 @@
+import datetime
+import decimal
+import gzip
+import json
+import os
 import random
+import tempfile
+from io import BytesIO, StringIO
 
+from unittest import mock, skipUnless
+
+from django.db import connections
 from django.test import TestCase
 from django.urls import reverse
 from django.test import Client
-from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from http.cookies import SimpleCookie
 
 from rest_framework.test import APITestCase
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 #User model
 from django.contrib.auth import get_user_model
 
+from api.database import database_profile, sqlite_database
+from courses.models import Course
+
 #Permissions
 from .permissions import IsStudent, IsTeacher
+from .authentication import RoleTokenAuthentication
+from .denylist import DatabaseDenylist
+from .metrics import QUERY_BUCKETS, registry
+from . import compression, db, renderers
+from .roles import RoleResolver, get_resolver
+from .throttling import CacheWindowStore, get_store, estimate, parse_rate
+from .hashers import ScryptPasswordHasher
+from .models import DeniedToken, Student, Teacher
 
 class LoginTests(APITestCase):
     """
@@ -304,4 +333,662 @@ class UserCreateTests(TestCase):
                 email='admin@example.com',
                 password='admin',
                 is_superuser=False
-            )
\ No newline at end of file
+            )
+
+class TokenUserTests(APITestCase):
+    """
+    Testing the stateless token user and token revocation
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        data = {"email":"teacher@example.com", "password":"teacher"}
+        response = self.client.post(reverse("core:login"), data, format="json")
+        self._access = response.data["access"]
+        self._refresh = response.cookies["jwt"].value
+
+    def _authenticate(self):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self._access}")
+        return RoleTokenAuthentication().authenticate(request)
+
+    def test_login_token_claims(self):
+        token = AccessToken(self._access)
+        self.assertFalse(token["is_student"])
+        self.assertTrue(token["is_teacher"])
+        self.assertFalse(token["is_staff"])
+        self.assertEqual(token["ver"], 0)
+
+    def test_permissions_without_user_query(self):
+        with self.assertNumQueries(0):
+            user, token = self._authenticate()
+        self.assertEqual(user.id, self.user.id)
+        request = APIRequestFactory().get("/")
+        request.user = user
+        self.assertTrue(IsTeacher().has_permission(request, None))
+        self.assertFalse(IsStudent().has_permission(request, None))
+
+    def test_role_change_revokes_tokens(self):
+        #Saving without a role change keeps the tokens valid
+        self.user.first_name = "Paul"
+        self.user.save()
+        self._authenticate()
+
+        self.user.is_student = True
+        self.user.save()
+        with self.assertRaises(InvalidToken):
+            self._authenticate()
+
+        self.client.cookies.load({'jwt':self._refresh})
+        response = self.client.post(reverse("core:refresh"), {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        #Password changes saved with update_fields revoke as well
+        response = self.client.post(reverse("core:login"), {"email":"teacher@example.com", "password":"teacher"}, format="json")
+        self._access = response.data["access"]
+        self._authenticate()
+        self.user.set_password("changed")
+        self.user.save(update_fields=["password"])
+        with self.assertRaises(InvalidToken):
+            self._authenticate()
+
+    def test_tokens_without_claims_load_the_user(self):
+        self._access = str(RefreshToken.for_user(self.user).access_token)
+        with self.assertNumQueries(1):
+            user, token = self._authenticate()
+        self.assertEqual(user, self.user)
+
+class RefreshRotationTests(APITestCase):
+    """
+    Testing refresh token rotation and the denylist
+    """
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        data = {"email":"student@example.com", "password":"student"}
+        response = self.client.post(reverse("core:login"), data, format="json")
+        self._refresh = response.cookies["jwt"].value
+
+    def _refresh_with(self, refresh):
+        self.client.cookies.load({'jwt':refresh})
+        return self.client.post(reverse("core:refresh"), {}, format="json")
+
+    def test_refresh_rotates_cookie(self):
+        response = self._refresh_with(self._refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("access", response.data)
+        self.assertNotIn("refresh", response.data)
+        rotated = response.cookies["jwt"].value
+        self.assertNotEqual(rotated, self._refresh)
+
+        #The spent token is refused, its successor works
+        response = self._refresh_with(self._refresh)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self._refresh_with(rotated)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_denies_refresh_token(self):
+        self.client.cookies.load({'jwt':self._refresh})
+        response = self.client.post(reverse("core:logout"), {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self._refresh_with(self._refresh)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_database_denylist(self):
+        denylist = DatabaseDenylist(cache_size=2)
+        expires_at = timezone.now() + datetime.timedelta(hours=1)
+        self.assertTrue(denylist.deny("first", expires_at))
+        self.assertFalse(denylist.deny("first", expires_at))
+        with self.assertNumQueries(0):
+            self.assertTrue(denylist.is_denied("first"))
+
+        #Entries evicted from the front cache are still found in the table
+        denylist.deny("second", expires_at)
+        denylist.deny("third", expires_at)
+        with self.assertNumQueries(1):
+            self.assertTrue(denylist.is_denied("first"))
+        self.assertFalse(DatabaseDenylist().is_denied("fourth"))
+
+    def test_purge_command(self):
+        now = timezone.now()
+        DeniedToken.objects.create(jti="expired", expires_at=now - datetime.timedelta(minutes=1))
+        DeniedToken.objects.create(jti="active", expires_at=now + datetime.timedelta(hours=1))
+
+        output = StringIO()
+        call_command("purge_denylist", stdout=output)
+        self.assertIn("Purged 1 expired tokens", output.getvalue())
+        self.assertEqual(list(DeniedToken.objects.values_list("jti", flat=True)), ["active"])
+
+class PasswordHashingTests(TestCase):
+    """
+    Testing configurable password hashing
+    """
+    def _create_user(self):
+        User = get_user_model()
+        return User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+
+    @override_settings(PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}})
+    def test_costs_from_settings(self):
+        user = self._create_user()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(user.check_password("student"))
+        self.assertFalse(user.check_password("random"))
+
+    def test_upgrade_on_login(self):
+        with override_settings(PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}}):
+            user = self._create_user()
+        version = user.token_version
+
+        with override_settings(PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 2000}}):
+            self.assertTrue(user.check_password("student"))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+        #A rehash keeps the issued tokens valid
+        self.assertEqual(user.token_version, version)
+
+    def test_scrypt_hasher(self):
+        hasher = ScryptPasswordHasher()
+        hasher.work_factor = 2 ** 10
+        encoded = hasher.encode("student", hasher.salt())
+        self.assertTrue(encoded.startswith("scrypt$1024$"))
+        self.assertTrue(hasher.verify("student", encoded))
+        self.assertFalse(hasher.verify("random", encoded))
+        self.assertFalse(hasher.must_update(encoded))
+        hasher.work_factor = 2 ** 11
+        self.assertTrue(hasher.must_update(encoded))
+
+    @override_settings(
+        PASSWORD_HASHERS=['core.hashers.PBKDF2PasswordHasher', 'core.hashers.ScryptPasswordHasher'],
+        PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}, 'scrypt': {'work_factor': 2 ** 10}},
+    )
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command("benchmark_hashers", "--rounds", "2", stdout=output)
+        self.assertIn("pbkdf2_sha256 (iterations=1000)", output.getvalue())
+        self.assertIn("scrypt (work factor=1024", output.getvalue())
+        self.assertIn("logins/s", output.getvalue())
+
+@override_settings(PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}})
+class UserProvisioningTests(APITestCase):
+    """
+    Testing bulk user provisioning
+    """
+    def setUp(self):
+        User = get_user_model()
+        admin_user = User.objects.create_superuser(
+            email="admin@example.com",
+            password="admin",
+            first_name="Super",
+            last_name="User",
+        )
+        self.client.force_authenticate(admin_user)
+        self._url = reverse("core:user-provision")
+
+    def _users(self):
+        return [
+            {"email": "one@example.com", "first_name": "One", "last_name": "Student", "password": "password1"},
+            {"email": "two@example.com", "first_name": "Two", "last_name": "Teacher", "is_student": False, "is_teacher": True},
+            {"email": "one@example.com", "first_name": "Again", "last_name": "Student"},
+            {"email": "admin@example.com", "first_name": "Taken", "last_name": "Email"},
+            {"email": "not an email", "first_name": "Bad", "last_name": "Email"},
+            {"email": "three@example.com", "first_name": "No", "last_name": "Role", "is_student": False},
+        ]
+
+    @override_settings(USER_PROVISIONING_WORKERS=1)
+    def test_provision_json(self):
+        User = get_user_model()
+        response = self.client.post(self._url + "?batch_size=2", self._users(), format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["duplicate"], response.data["invalid"]), (2, 2, 2))
+        self.assertEqual(
+            [row["status"] for row in response.data["results"]],
+            ["created", "created", "duplicate", "duplicate", "invalid", "invalid"],
+        )
+
+        one = User.objects.get(email="one@example.com")
+        self.assertEqual(response.data["results"][0]["id"], one.id)
+        self.assertTrue(one.check_password("password1"))
+        self.assertFalse(User.objects.get(email="two@example.com").has_usable_password())
+        self.assertTrue(Student.objects.filter(user=one).exists())
+        #The superuser is a teacher too
+        self.assertEqual(
+            list(Teacher.objects.order_by("user__email").values_list("user__email", flat=True)),
+            ["admin@example.com", "two@example.com"],
+        )
+
+    @override_settings(USER_PROVISIONING_WORKERS=1)
+    def test_provision_csv(self):
+        body = "email,first_name,last_name,is_teacher\nfour@example.com,Four,Person,true\n"
+        response = self.client.post(self._url, body, content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"line": 2, "email": "four@example.com", "status": "created", "id": get_user_model().objects.get(email="four@example.com").id},
+        ])
+
+    @override_settings(USER_PROVISIONING_WORKERS=4)
+    def test_no_processes_per_request(self):
+        with mock.patch("core.provisioning.ProcessPoolExecutor") as pool:
+            response = self.client.post(self._url, self._users()[:2], format="json")
+        pool.assert_not_called()
+        self.assertEqual(response.data["created"], 2)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(self._url, self._users(), format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_provision_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as source:
+            source.writelines(json.dumps(user) + "\n" for user in self._users())
+        output = StringIO()
+        try:
+            call_command("provision_users", source.name, "--workers", "2", stdout=output, stderr=StringIO())
+        finally:
+            os.remove(source.name)
+        self.assertIn("Created 2 users (2 duplicates, 2 invalid)", output.getvalue())
+        self.assertTrue(get_user_model().objects.get(email="one@example.com").check_password("password1"))
+
+@override_settings(METRICS_SAMPLE_RATE=1.0)
+class MetricsTests(APITestCase):
+    """
+    Testing the request metrics middleware and endpoint
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com",
+            password="admin",
+            first_name="Super",
+            last_name="User",
+        )
+        self.client.force_authenticate(self.admin_user)
+        registry.clear()
+
+    def _get_user_list(self):
+        """
+        Requests the user list, returns the response and its query count
+        """
+        with CaptureQueriesContext(connections["default"]) as queries:
+            response = self.client.get(reverse("core:user-list"))
+        return response, len(queries)
+
+    def test_server_timing(self):
+        response, count = self._get_user_list()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="%d queries"' % count)
+        self.assertIn("render;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_sampling(self):
+        with override_settings(METRICS_SAMPLE_RATE=0.0):
+            response = self.client.get(reverse("core:user-list"))
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(registry.render().count("_count{"), 0)
+
+    def test_metrics_endpoint(self):
+        self._get_user_list()
+        _, count = self._get_user_list()
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        labels = 'view="core:user-list",method="GET",status="200"'
+        self.assertIn("# TYPE api_sql_queries histogram", text)
+        bucket = min(bound for bound in QUERY_BUCKETS if bound >= count)
+        self.assertIn('api_sql_queries_bucket{%s,le="%d"} 2' % (labels, bucket), text)
+        self.assertIn('api_sql_queries_sum{%s} %.1f' % (labels, 2 * count), text)
+        self.assertIn('api_request_duration_seconds_count{%s} 2' % labels, text)
+        self.assertIn('api_response_size_bytes_bucket{%s,le="+Inf"} 2' % labels, text)
+
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class RendererTests(APITestCase):
+    """
+    Testing the JSON and MessagePack renderers and parsers
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com",
+            password="admin",
+            first_name="Super",
+            last_name="User",
+        )
+        self.client.force_authenticate(self.admin_user)
+
+    def test_json_round_trip(self):
+        data = {"price": decimal.Decimal("1.50"), "when": datetime.date(2020, 1, 2), 1: ["a", None]}
+        body = renderers.FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(body), {"price": "1.50", "when": "2020-01-02", "1": ["a", None]})
+        parsed = renderers.FastJSONParser().parse(BytesIO(body))
+        self.assertEqual(parsed["price"], "1.50")
+        #The hook orjson and msgpack fall back to agrees with the stdlib path
+        self.assertEqual(renderers.encode_default(decimal.Decimal("1.50")), "1.50")
+
+    def test_negotiation(self):
+        response = self.client.get(reverse("core:user-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("application/json"))
+        self.assertEqual(json.loads(response.content)[0]["email"], "admin@example.com")
+
+        response = self.client.post(reverse("core:user-provision"), "{broken", content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("JSON parse error", response.data["detail"])
+
+    @skipUnless(renderers.msgpack, "msgpack is not installed")
+    def test_msgpack(self):
+        response = self.client.get(reverse("core:user-list"), HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(renderers.msgpack.unpackb(response.content, raw=False)[0]["email"], "admin@example.com")
+
+        url = reverse("core:user-detail", kwargs={"pk": self.admin_user.pk})
+        body = renderers.msgpack.packb({"first_name": "Packed"})
+        response = self.client.patch(url, body, content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.admin_user.refresh_from_db()
+        self.assertEqual(self.admin_user.first_name, "Packed")
+
+class CompressionTests(APITestCase):
+    """
+    Testing negotiated response compression
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com",
+            password="admin",
+            first_name="Super",
+            last_name="User",
+        )
+        self.client.force_authenticate(self.admin_user)
+        self.factory = APIRequestFactory()
+
+    def test_negotiate(self):
+        negotiate = lambda header: compression.negotiate(self.factory.get("/", HTTP_ACCEPT_ENCODING=header))
+        with override_settings(COMPRESSION_ENCODINGS=("gzip",)):
+            self.assertEqual(negotiate("gzip, deflate"), "gzip")
+            self.assertEqual(negotiate("*"), "gzip")
+            self.assertIsNone(negotiate("gzip;q=0, deflate"))
+            self.assertIsNone(negotiate(""))
+        self.assertEqual(compression.parse_accept_encoding("br;q=0.5, GZIP"), {"br": 0.5, "gzip": 1.0})
+
+    @override_settings(COMPRESSION_MIN_SIZE=10, COMPRESSION_ENCODINGS=("gzip",))
+    def test_middleware(self):
+        plain = self.client.get(reverse("core:user-list"))
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        response = self.client.get(reverse("core:user-list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        with override_settings(COMPRESSION_MIN_SIZE=1000000):
+            response = self.client.get(reverse("core:user-list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_stream(self):
+        for encoding in compression.get_encodings():
+            chunks = list(compression.compress_stream([b"a" * 100, b"b" * 100], encoding))
+            self.assertEqual(compression.decompress(b"".join(chunks), encoding), b"a" * 100 + b"b" * 100)
+
+class DatabaseProfileTests(TestCase):
+    """
+    Testing the database profiles
+    """
+    def test_sqlite_profile(self):
+        databases, replicas = database_profile({"DATABASE_REPLICAS": "a.sqlite3, b.sqlite3"}, tempfile.gettempdir())
+        self.assertEqual(replicas, ["replica1", "replica2"])
+        self.assertEqual(databases["replica2"]["NAME"], "b.sqlite3")
+        self.assertEqual(databases["replica1"]["TEST"], {"MIRROR": "default"})
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 600)
+        self.assertEqual(databases["default"]["NAME"], os.path.join(tempfile.gettempdir(), "db.sqlite3"))
+
+    def test_postgres_profile(self):
+        environ = {"DATABASE_PROFILE": "postgres", "POSTGRES_HOST": "primary", "DATABASE_CONN_MAX_AGE": "60", "DATABASE_POOLER": "pgbouncer"}
+        databases, replicas = database_profile(environ, tempfile.gettempdir())
+        self.assertEqual(replicas, [])
+        self.assertEqual(databases["default"]["HOST"], "primary")
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 60)
+        self.assertTrue(databases["default"]["DISABLE_SERVER_SIDE_CURSORS"])
+        with self.assertRaises(ValueError):
+            database_profile({"DATABASE_PROFILE": "oracle"}, tempfile.gettempdir())
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(APITestCase):
+    """
+    Testing read routing with a SQLite file standing in for a replica. The
+    replica is added once the test case set up its databases, so the test
+    runner never has to know about it.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = sqlite_database(os.path.join(cls.directory.name, "replica.sqlite3"))
+        call_command("migrate", database="replica", run_syncdb=True, verbosity=0)
+        Course.objects.using("replica").bulk_create([Course(title="Replica", slug="replica")])
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.databases["replica"]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        self.client.force_authenticate(self.user)
+        db.get_pin_cache().clear()
+        Course.objects.create(title="Primary")
+
+    def _titles(self):
+        response = self.client.get(reverse("api:course-list"))
+        return [course["title"] for course in response.data["results"]]
+
+    def test_reads_go_to_replicas(self):
+        self.assertEqual(self._titles(), ["Replica"])
+        with connections["replica"].cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+
+    def test_read_after_write(self):
+        response = self.client.post(reverse("api:course-create"), {"title": "New"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        #The user reads from the primary until the replicas caught up
+        self.assertEqual(self._titles(), ["New", "Primary"])
+        db.get_pin_cache().delete(db.pin_key(self.user))
+        self.assertEqual(self._titles(), ["Replica"])
+
+    def test_router(self):
+        router = db.ReplicaRouter()
+        db.reset()
+        self.assertIsNone(router.db_for_read(Course))
+        db.use_replicas()
+        self.assertEqual(router.db_for_read(Course), "replica")
+        self.assertEqual(router.db_for_write(Course), "default")
+        self.assertIsNone(router.db_for_read(Course))
+        db.reset()
+
+class RoleTests(TestCase):
+    """
+    Testing role profiles and the role resolver
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        cache.clear()
+
+    def test_profiles_follow_flags(self):
+        self.assertTrue(Teacher.objects.filter(user=self.user).exists())
+        self.assertFalse(Student.objects.filter(user=self.user).exists())
+        self.user.is_student, self.user.is_teacher = True, False
+        self.user.save()
+        self.assertTrue(Student.objects.filter(user=self.user).exists())
+        self.assertFalse(Teacher.objects.filter(user=self.user).exists())
+
+    def test_profiles_untouched_without_role_change(self):
+        self.user.first_name = "Paul"
+        with CaptureQueriesContext(connections["default"]) as queries:
+            self.user.save()
+        tables = ('"core_student"', '"core_teacher"')
+        self.assertFalse([query["sql"] for query in queries if any(table in query["sql"] for table in tables)])
+        self.assertTrue(Teacher.objects.filter(user=self.user).exists())
+
+    def test_resolver(self):
+        request = APIRequestFactory().get("/")
+        request.user = self.user
+        resolver = get_resolver(request)
+        self.assertIs(get_resolver(request), resolver)
+        self.assertEqual(resolver.roles, {"teacher"})
+        self.assertTrue(IsTeacher().has_permission(request, None))
+        self.assertFalse(IsStudent().has_permission(request, None))
+
+        request.user = AnonymousUser()
+        self.assertEqual(get_resolver(request).roles, frozenset())
+        self.assertFalse(IsTeacher().has_permission(request, None))
+
+        calls = []
+        loader = lambda: calls.append(1) or frozenset([1])
+        self.assertEqual(resolver.lookup("roles:test", loader), {1})
+        self.assertEqual(resolver.lookup("roles:test", loader), {1})
+        #Another request finds it in the shared cache
+        self.assertEqual(RoleResolver(self.user).lookup("roles:test", loader), {1})
+        self.assertEqual(len(calls), 1)
+
+@override_settings(
+    PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}},
+    THROTTLE_RATES={
+        'login': {'ip': '5/min', 'email': '2/min'},
+        'registration': {'ip': '1/hour', 'email': None},
+    },
+)
+class ThrottleTests(APITestCase):
+    """
+    Testing login and signup throttling
+    """
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        get_store().clear()
+        self.addCleanup(get_store().clear)
+
+    def _login(self, email, ip="10.0.0.1"):
+        data = {"email":email, "password":"random"}
+        return self.client.post(reverse("core:login"), data, format="json", REMOTE_ADDR=ip)
+
+    def test_email_limit(self):
+        self.assertEqual(self._login("student@example.com").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._login(" Student@example.com").status_code, status.HTTP_401_UNAUTHORIZED)
+
+        #Rejected before the user is looked up
+        with self.assertNumQueries(0):
+            response = self._login("student@example.com", ip="10.0.0.2")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+        #Other accounts are not affected
+        self.assertEqual(self._login("teacher@example.com").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ip_limit(self):
+        for number in range(5):
+            self.assertEqual(self._login("user%d@example.com" % number).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._login("other@example.com").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self._login("other@example.com", ip="10.0.0.2").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_forwarded_for_is_ignored(self):
+        for number in range(5):
+            response = self.client.post(
+                reverse("core:login"), {"email": "user%d@example.com" % number, "password": "random"}, format="json",
+                REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="192.168.0.%d" % number,
+            )
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(
+            reverse("core:login"), {"email": "other@example.com", "password": "random"}, format="json",
+            REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="192.168.0.99",
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_rates(self):
+        with self.assertRaises(ImproperlyConfigured):
+            parse_rate("0/min")
+        #Scopes left out of THROTTLE_RATES are not throttled
+        with override_settings(THROTTLE_RATES={}):
+            for _ in range(3):
+                self.assertEqual(self._login("student@example.com").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_registration_limit(self):
+        data = {
+            "email":"new@example.com",
+            "password":"student1234",
+            "first_name":"Michael",
+            "last_name":"Bubble",
+        }
+        response = self.client.post(reverse("core:signup"), data, format="json", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data["email"] = "other@example.com"
+        response = self.client.post(reverse("core:signup"), data, format="json", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(get_user_model().objects.filter(email="other@example.com").exists())
+
+    def test_sliding_window(self):
+        #Half way through a window, half of the previous one still counts
+        self.assertEqual(estimate(4, 1, 0.5), 3)
+        store = CacheWindowStore()
+        cache.clear()
+        store.incr(("login", "ip", "10.0.0.1"), 10, 60)
+        store.incr(("login", "ip", "10.0.0.1"), 11, 60)
+        store.incr(("login", "ip", "10.0.0.1"), 11, 60)
+        self.assertEqual(store.counts(("login", "ip", "10.0.0.1"), 11), (1, 2))
+        self.assertEqual(store.counts(("login", "ip", "10.0.0.1"), 12), (2, 0))
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command("benchmark_throttle", "--rounds", "50", stdout=output)
+        self.assertIn("locmem:", output.getvalue())
+        self.assertIn("us per rejected decision (0/50 allowed)", output.getvalue())
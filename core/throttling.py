@@ -0,0 +1,200 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Turns '10/min' into (10, 60). None disables the counter.
+    """
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    if int(count) < 1:
+        raise ImproperlyConfigured('Throttle rate %r must allow at least one attempt, use None to turn it off' % rate)
+    return int(count), PERIODS[period[0]]
+
+def estimate(previous, current, elapsed):
+    """
+    Sliding-window count: the attempts of the current fixed window plus the
+    share of the previous window the sliding window still overlaps.
+    `elapsed` is the part of the current window already gone, from 0 to 1.
+    """
+    return previous * (1 - elapsed) + current
+
+def retry_after(previous, current, limit, elapsed, window):
+    """
+    Seconds until the estimate drops under `limit` again
+    """
+    if current < limit:
+        #The previous window slides out during this one
+        return max(1, math.ceil((1 - (limit - current) / previous - elapsed) * window))
+    #This window's attempts have to slide out during the next one
+    return max(1, math.ceil((1 - elapsed + 1 - limit / current) * window))
+
+
+class LocMemWindowStore:
+    """
+    Counters of the process, one [window, current, previous] list per key
+    and at most `size` keys, the least recently used going first
+    """
+    def __init__(self, size=10000):
+        self.size = size
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def counts(self, key, window):
+        """
+        Returns the (previous, current) counts of the fixed window `window`
+        """
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                return 0, 0
+            start, current, previous = counter
+        if start == window:
+            return previous, current
+        if start == window - 1:
+            return current, 0
+        return 0, 0
+
+    def incr(self, key, window, timeout):
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                self._counters[key] = [window, 1, 0]
+                if len(self._counters) > self.size:
+                    self._counters.popitem(last=False)
+                return
+            self._counters.move_to_end(key)
+            if counter[0] == window:
+                counter[1] += 1
+            else:
+                counter[2] = counter[1] if counter[0] == window - 1 else 0
+                counter[0], counter[1] = window, 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class CacheWindowStore:
+    """
+    Counters in a shared cache, one entry per key and fixed window, so
+    every process counts the same attempts
+    """
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key, window):
+        return 'throttle:%s:%d' % (':'.join(key), window)
+
+    def counts(self, key, window):
+        keys = [self.make_key(key, window - 1), self.make_key(key, window)]
+        values = self.cache.get_many(keys)
+        return values.get(keys[0], 0), values.get(keys[1], 0)
+
+    def incr(self, key, window, timeout):
+        cache_key = self.make_key(key, window)
+        #Counters live for two windows, while the sliding window needs them
+        self.cache.add(cache_key, 0, timeout * 2)
+        try:
+            self.cache.incr(cache_key)
+        except ValueError:
+            #Expired between the two calls
+            self.cache.add(cache_key, 1, timeout * 2)
+
+
+_store = None
+
+def get_store():
+    """
+    Returns the store configured by THROTTLE_BACKEND, built once per process
+    """
+    global _store
+    if _store is None:
+        backend = import_string(getattr(settings, 'THROTTLE_BACKEND', 'core.throttling.LocMemWindowStore'))
+        _store = backend(**getattr(settings, 'THROTTLE_OPTIONS', {}))
+    return _store
+
+def normalize_email(request):
+    email = request.data.get('email') if hasattr(request.data, 'get') else None
+    if not isinstance(email, str) or not email.strip():
+        return None
+    #Fixed size keys, whatever the client sends
+    return hashlib.md5(email.strip().lower().encode()).hexdigest()
+
+
+class CredentialThrottle(BaseThrottle):
+    """
+    Sliding-window limits per client IP and per submitted email, read from
+    THROTTLE_RATES[scope]. Runs before the view parses credentials, so a
+    rejected attempt costs a couple of counter lookups and never reaches
+    the password hasher or the database. Rejected attempts are not counted.
+    """
+    scope = None
+    rates = None
+    store = None
+    timer = time.time
+
+    def get_rates(self):
+        if self.rates is not None:
+            return self.rates
+        return getattr(settings, 'THROTTLE_RATES', {}).get(self.scope, {})
+
+    def get_idents(self, request):
+        #The IP first, it does not need the body. X-Forwarded-For is only
+        #read behind the NUM_PROXIES trusted proxies
+        yield 'ip', self.get_ident(request)
+        email = normalize_email(request)
+        if email is not None:
+            yield 'email', email
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        rates = self.get_rates()
+        if not rates:
+            return True
+        store = self.store or get_store()
+        now = self.timer()
+        hits = []
+        for kind, ident in self.get_idents(request):
+            rate = parse_rate(rates.get(kind))
+            if rate is None:
+                continue
+            limit, period = rate
+            key = (self.scope, kind, ident)
+            window, elapsed = divmod(now, period)
+            previous, current = store.counts(key, int(window))
+            if estimate(previous, current, elapsed / period) >= limit:
+                self.wait_time = retry_after(previous, current, limit, elapsed / period, period)
+                return False
+            hits.append((key, int(window), period))
+        for key, window, period in hits:
+            store.incr(key, window, period)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class LoginThrottle(CredentialThrottle):
+    scope = 'login'
+
+
+class RegistrationThrottle(CredentialThrottle):
+    scope = 'registration'
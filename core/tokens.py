@@ -0,0 +1,121 @@
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .denylist import get_denylist
+
+#Claims copied from the user into every token, enough to run the
+#permission checks without loading the user
+ROLE_CLAIMS = ('is_student', 'is_teacher', 'is_staff', 'is_superuser')
+VERSION_CLAIM = 'ver'
+
+#Changing any of these fields revokes the tokens issued before
+REVOKING_FIELDS = ROLE_CLAIMS + ('is_active', 'password')
+
+
+def get_cache():
+    return caches[getattr(settings, 'TOKEN_VERSION_CACHE_ALIAS', 'default')]
+
+def version_key(user_id):
+    return 'core:token_version:%s' % user_id
+
+def get_token_version(user_id):
+    """
+    Returns the current token version of a user, or None when the user
+    does not exist. The database is only hit on a cache miss.
+    """
+    cache = get_cache()
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is not None:
+            cache.set(key, version, getattr(settings, 'TOKEN_VERSION_CACHE_TIMEOUT', 60))
+    return version
+
+def set_token_version(user_id, version):
+    cache = get_cache()
+    if version is None:
+        cache.delete(version_key(user_id))
+    else:
+        cache.set(version_key(user_id), version, getattr(settings, 'TOKEN_VERSION_CACHE_TIMEOUT', 60))
+
+def check_token_version(token):
+    """
+    Rejects a token issued before the roles of its user last changed
+    """
+    user_id = token[api_settings.USER_ID_CLAIM]
+    if token[VERSION_CLAIM] != get_token_version(user_id):
+        raise InvalidToken(_('Token has been revoked'))
+async def acheck_token_version(token):
+    """
+    Async check_token_version, only leaving the event loop on a cache miss
+    """
+    user_id = token[api_settings.USER_ID_CLAIM]
+    version = get_cache().get(version_key(user_id))
+    if version is None:
+        version = await sync_to_async(get_token_version, thread_sensitive=True)(user_id)
+    if token[VERSION_CLAIM] != version:
+        raise InvalidToken(_('Token has been revoked'))
+
+def deny_token(token):
+    """
+    Puts the refresh token on the denylist, returns False when it already
+    was there
+    """
+    expires_at = datetime.datetime.fromtimestamp(token['exp'], tz=datetime.timezone.utc)
+    return get_denylist().deny(token[api_settings.JTI_CLAIM], expires_at)
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the role claims and the token version of its
+    user. Access tokens derived from it copy both.
+    """
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in ROLE_CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+    def rotate(self):
+        """
+        Denies this token and turns it into a fresh one with a new id and
+        lifetime. A token that was already denied cannot be rotated again.
+        """
+        if not deny_token(self):
+            raise TokenError(_('Token is blacklisted'))
+        self.set_jti()
+        self.set_exp()
+
+
+class RoleTokenUser(TokenUser):
+    """
+    Stateless user built from the claims of a RoleRefreshToken
+    """
+    @property
+    def is_student(self):
+        return self.token.get('is_student', False)
+
+    @property
+    def is_teacher(self):
+        return self.token.get('is_teacher', False)
+
+    @property
+    def is_staff(self):
+        return self.token.get('is_staff', False)
+
+    @property
+    def is_superuser(self):
+        return self.token.get('is_superuser', False)
@@ -2,7 +2,7 @@ from django.urls import path
 
 from rest_framework_simplejwt.views import TokenVerifyView
 from .views import UserLogin, UserRefresh, UserLogout, UserRegistration
-from .views import UserList, UserDetail
+from .views import UserList, UserDetail, UserProvisioning
 
 app_name = 'core'
 urlpatterns = [
@@ -12,5 +12,6 @@ urlpatterns = [
     path('logout/', UserLogout, name='logout'),
     path('user/', UserList.as_view(), name="user-list"),
     path('user/<int:pk>/', UserDetail.as_view(), name="user-detail"),
+    path('user/provision/', UserProvisioning.as_view(), name="user-provision"),
     path('signup/', UserRegistration.as_view(), name="signup"),
 ]
\ No newline at end of file
@@ -8,17 +8,42 @@ from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.generics import ListCreateAPIView, CreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.views import APIView
 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from .serializers import UserSerializer, UserRegistrationSerializer
+from .serializers import RoleTokenObtainPairSerializer, RoleTokenRefreshSerializer
+from .tokens import deny_token
+from . import hashers
+from .provisioning import CSVParser, UserProvisioner, parse_rows
+from .renderers import FastJSONParser
+from .throttling import LoginThrottle, RegistrationThrottle
+
+from courses.bulk import NDJSONParser
+
+def set_refresh_cookie(response, refresh):
+    #Setting up a HTTP-only cookie to refresh access tokens automatically
+    response.set_cookie(
+        key='jwt',
+        value=refresh,
+        max_age=4*60*60,
+        domain="127.0.0.1",
+        samesite=None,
+        httponly=True,
+        secure=False #TO DO Change to true when using HTTPS and add samesite for protection
+    )
 
 class UserLogin(TokenObtainPairView):
+    #No authentication, so a throttled attempt is rejected without touching
+    #the session or the database
+    authentication_classes = ()
     permission_classes = (AllowAny,)
-    serializer = TokenObtainPairSerializer
+    throttle_classes = (LoginThrottle,)
+    serializer_class = RoleTokenObtainPairSerializer
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -30,21 +55,12 @@ class UserLogin(TokenObtainPairView):
 
         refresh = serializer.validated_data.pop('refresh')
         response = Response(serializer.validated_data, status=status.HTTP_200_OK)
-
-        #Setting up a HTTP-only cookie to refresh access tokens automatically
-        response.set_cookie(
-            key='jwt',
-            value=refresh,
-            max_age=4*60*60,
-            domain="127.0.0.1",
-            samesite=None,
-            httponly=True,
-            secure=False #TO DO Change to true when using HTTPS and add samesite for protection
-        )
+        set_refresh_cookie(response, refresh)
 
         return response
 
 class UserRefresh(TokenRefreshView):
+    serializer_class = RoleTokenRefreshSerializer
 
     def post(self, request, *args, **kwargs):
         try:
@@ -61,12 +77,22 @@ class UserRefresh(TokenRefreshView):
         except TokenError as e:
             raise InvalidToken(e.args[0])
 
-        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+        #The submitted refresh token is spent, the cookie gets its successor
+        refresh = serializer.validated_data.pop('refresh')
+        response = Response(serializer.validated_data, status=status.HTTP_200_OK)
+        set_refresh_cookie(response, refresh)
+
+        return response
 
 @require_POST
 def UserLogout(request):
     try:
         if (request.COOKIES['jwt']):
+            #Revoking the refresh token so a copy of the cookie stops working
+            try:
+                deny_token(RefreshToken(request.COOKIES['jwt']))
+            except TokenError:
+                pass
             response = HttpResponse(status=200)
             response.delete_cookie('jwt')
             return response
@@ -88,7 +114,9 @@ class UserDetail(RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
 
 class UserRegistration(CreateAPIView):
+    authentication_classes = ()
     permission_classes = (AllowAny,)
+    throttle_classes = (RegistrationThrottle,)
     serializer_class = UserRegistrationSerializer
 
     def create(self, request, *args, **kwargs):
@@ -104,4 +132,35 @@ class UserRegistration(CreateAPIView):
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class UserProvisioning(APIView):
+    """
+    Creates a cohort of users from a JSON list, NDJSON or CSV body and
+    returns the outcome of every row
+    """
+    permission_classes = (IsAdminUser,)
+    parser_classes = (FastJSONParser, NDJSONParser, CSVParser)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            batch_size = max(1, int(request.query_params.get('batch_size', 1000)))
+        except ValueError:
+            raise ValidationError({ 'batch_size': 'Must be an integer' })
+
+        if request.content_type.startswith(CSVParser.media_type):
+            rows = parse_rows(request.data, format='csv')
+        elif request.content_type.startswith(NDJSONParser.media_type):
+            rows = parse_rows(request.data, format='ndjson')
+        elif isinstance(request.data, list):
+            rows = (
+                (number, record, None) if isinstance(record, dict) else (number, None, {'non_field_errors': ['Must be an object']})
+                for number, record in enumerate(request.data, 1)
+            )
+        else:
+            raise ValidationError('Expected a list of users')
+
+        #Hashed by the long-lived pool of this process, no processes are
+        #started per request
+        result = UserProvisioner(batch_size=batch_size, executor=hashers.get_executor()).run(rows)
+        return Response(result)
@@ -0,0 +1,112 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+
+from core import db
+from core.authentication import RoleTokenAuthentication
+from core.renderers import FastJSONRenderer
+
+from .cache import CachedResponseMixin, get_cache, set_last_modified
+from .views import CategoryList, CourseList, LessonList, SlideList
+
+
+class AsyncListView:
+    """
+    ASGI-native GET endpoint for the list view `view_class`, reusing its
+    queryset, filters, pagination and serializers.
+
+    Token authentication and cached responses are served on the event
+    loop. Filtering, fetching and serializing a page run in one
+    thread-sensitive sync_to_async call, as the ORM has no async API in
+    this Django version. Only bearer tokens are accepted.
+    """
+    view_class = None
+
+    @classmethod
+    def as_view(cls):
+        #Django only runs function views natively on the event loop
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return HttpResponseNotAllowed(['GET', 'HEAD'])
+            return await cls().get(request, *args, **kwargs)
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await RoleTokenAuthentication().aauthenticate(request)
+            if user is None:
+                raise NotAuthenticated()
+        except APIException as e:
+            return self.error_response(e)
+
+        view = self.get_list_view(request, user, *args, **kwargs)
+        try:
+            #Checks may read lesson owners from the database
+            await sync_to_async(view.check_permissions, thread_sensitive=True)(view.request)
+        except APIException as e:
+            return self.error_response(e)
+        cached = isinstance(view, CachedResponseMixin)
+        if cached:
+            key, etag, last_modified = view.get_cache_validators(request)
+            if view.is_not_modified(request, etag, last_modified):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                return self.set_validators(response, etag, last_modified)
+            data = get_cache().get(key)
+            if data is not None:
+                return self.set_validators(self.json_response(data), etag, last_modified)
+
+        try:
+            response = await sync_to_async(self.read_list, thread_sensitive=True)(view, *args, **kwargs)
+        except APIException as e:
+            return self.error_response(e)
+        if cached:
+            view.cache_response(key, response.data)
+            return self.set_validators(self.json_response(response.data), etag, last_modified)
+        return self.json_response(response.data)
+
+    def read_list(self, view, *args, **kwargs):
+        """
+        Runs the list view on the replicas, unless the user wrote recently
+        """
+        if not db.is_pinned(view.request.user):
+            db.use_replicas()
+        try:
+            return view.list(view.request, *args, **kwargs)
+        finally:
+            db.use_primary()
+
+    def get_list_view(self, request, user, *args, **kwargs):
+        view = self.view_class(args=args, kwargs=kwargs, format_kwarg=None)
+        view.request = Request(request)
+        view.request.user = user
+        return view
+
+    def json_response(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+    def error_response(self, exc):
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else { 'detail': exc.detail }
+        response = self.json_response(detail, status_code=exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = RoleTokenAuthentication().authenticate_header(None)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        set_last_modified(response, last_modified)
+        return response
+
+
+class AsyncCategoryList(AsyncListView):
+    view_class = CategoryList
+
+class AsyncCourseList(AsyncListView):
+    view_class = CourseList
+
+class AsyncLessonList(AsyncListView):
+    view_class = LessonList
+
+class AsyncSlideList(AsyncListView):
+    view_class = SlideList
@@ -0,0 +1,149 @@
+import copy
+import json
+from urllib.parse import urlsplit
+
+from django.db.models import prefetch_related_objects
+from django.http import Http404, QueryDict
+from django.urls import resolve
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.mixins import RetrieveModelMixin
+
+#Headers describing the batch request itself rather than its parts
+DROPPED_HEADERS = (
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_ACCEPT_ENCODING',
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+)
+
+
+def failure(status_code, detail):
+    return {'status': status_code, 'body': {'detail': detail}}
+
+
+class BatchReader:
+    """
+    Answers GET sub-requests against courses.urls as the user of `request`.
+
+    Lookups of a single row by id are grouped per view and read with one
+    `in_bulk` query, after the view's own permission checks; other routes
+    run through their view with the caller's authentication. Every
+    sub-request gets its own status, so a missing row is a 404 entry
+    instead of a failed batch.
+    """
+    urlconf = 'courses.urls'
+
+    def __init__(self, request, prefix='/'):
+        self.request = request
+        self.prefix = prefix
+
+    def run(self, items):
+        results = [None] * len(items)
+        lookups = {}
+        for index, item in enumerate(items):
+            if item.get('method', 'GET').upper() != 'GET':
+                results[index] = failure(status.HTTP_405_METHOD_NOT_ALLOWED, 'Only GET requests can be batched.')
+                continue
+            try:
+                match, path, query = self.resolve(item['path'])
+            except Http404:
+                results[index] = failure(status.HTTP_404_NOT_FOUND, 'Not found.')
+                continue
+            if self.is_lookup(match, query):
+                lookups.setdefault(match.func.cls, []).append((index, match, path))
+            else:
+                results[index] = self.dispatch(match, path, query)
+
+        for view_class, lookup in lookups.items():
+            for index, result in self.read_rows(view_class, lookup):
+                results[index] = result
+        return [dict(result, path=item['path']) for item, result in zip(items, results)]
+
+    def resolve(self, path):
+        """
+        Returns the match of `path`, given with or without the API prefix,
+        its full path and its query string
+        """
+        url = urlsplit(path)
+        route = url.path
+        if route.startswith(self.prefix):
+            route = route[len(self.prefix):]
+        route = route.lstrip('/')
+        return resolve('/' + route, urlconf=self.urlconf), self.prefix + route, url.query
+
+    def is_lookup(self, match, query):
+        view_class = getattr(match.func, 'cls', None)
+        return view_class is not None and issubclass(view_class, RetrieveModelMixin) \
+            and getattr(view_class, 'lookup_field', None) == 'id' and set(match.kwargs) == {'id'} and not query
+
+    def make_request(self, match, path, query):
+        """
+        A GET copy of the caller's request for `path`, authenticated as the
+        caller without running the authentication classes again
+        """
+        request = copy.copy(self.request._request)
+        request.method = 'GET'
+        request.path = request.path_info = path
+        request.GET = QueryDict(query)
+        request.POST = QueryDict()
+        request.META = {key: value for key, value in request.META.items() if key not in DROPPED_HEADERS}
+        request.META.update({
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'HTTP_ACCEPT': 'application/json',
+        })
+        request.resolver_match = match
+        request._force_auth_user = self.request.user
+        request._force_auth_token = self.request.auth
+        return request
+
+    def make_view(self, match, path):
+        view = match.func.cls(**match.func.initkwargs)
+        view.args, view.kwargs = match.args, match.kwargs
+        view.request = view.initialize_request(self.make_request(match, path, ''), *match.args, **match.kwargs)
+        view.format_kwarg = None
+        return view
+
+    def read_rows(self, view_class, lookup):
+        """
+        Yields (index, result) for every lookup of `view_class`, reading all
+        their rows with one query
+        """
+        _, match, path = lookup[0]
+        view = self.make_view(match, path)
+        try:
+            view.check_permissions(view.request)
+        except APIException as e:
+            for index, _, _ in lookup:
+                yield index, {'status': e.status_code, 'body': e.detail}
+            return
+
+        queryset = view.get_queryset()
+        rows = queryset.in_bulk({int(match.kwargs['id']) for _, match, _ in lookup})
+        #Many-to-many fields of the serializer, one query per relation
+        fields = view.get_serializer().fields
+        prefetch_related_objects(list(rows.values()), *[
+            field.name for field in queryset.model._meta.many_to_many if field.name in fields
+        ])
+        for index, match, _ in lookup:
+            row = rows.get(int(match.kwargs['id']))
+            if row is None:
+                yield index, failure(status.HTTP_404_NOT_FOUND, 'Not found.')
+                continue
+            view.kwargs = match.kwargs
+            try:
+                view.check_object_permissions(view.request, row)
+            except APIException as e:
+                yield index, {'status': e.status_code, 'body': e.detail}
+                continue
+            yield index, {'status': status.HTTP_200_OK, 'body': view.get_serializer(row).data}
+
+    def dispatch(self, match, path, query):
+        response = match.func(self.make_request(match, path, query), *match.args, **match.kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.get('Content-Type', '').startswith('application/json') and response.content:
+            body = json.loads(response.content)
+        else:
+            body = None
+        return {'status': response.status_code, 'body': body}
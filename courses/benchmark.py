@@ -0,0 +1,317 @@
+import io
+import json
+import platform
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.text import slugify
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.tokens import RoleRefreshToken
+
+from .bulk import BulkImporter
+from .models import Category, Course, Lesson, Slide
+from .serializers import SlideSerializer
+
+WORDS = (
+    'python', 'django', 'rest', 'api', 'testing', 'design', 'data', 'model', 'query', 'index',
+    'cache', 'token', 'async', 'search', 'course', 'lesson', 'slide', 'tree', 'path', 'schema',
+    'deploy', 'scale', 'profile', 'debug', 'migrate', 'serialize', 'filter', 'paginate', 'secure', 'render',
+)
+
+PASSWORD = 'benchmark-password'
+
+
+def percentiles(values, points):
+    """
+    Returns {'p<point>': value} for the requested percentiles of `values`
+    """
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return {'p%d' % point: value for point in points}
+    cuts = statistics.quantiles(values, n=100)
+    return {'p%d' % point: cuts[point - 1] for point in points}
+
+
+def generate_catalogue(seed=0, categories=50, depth=8, courses=200, lessons=1000, slides=5, links=3, batch_size=1000):
+    """
+    Builds a deterministic catalogue for `seed`: a forest of categories
+    up to `depth` levels deep, courses spread over the categories, lessons
+    linked to up to `links` courses and `slides` slides per lesson.
+    Rows go through the bulk importer, so counters, search index and
+    cache versions are maintained as for an import.
+    """
+    rng = random.Random(seed)
+
+    def words(count):
+        return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+    start = (Category.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    rows = []
+    for index in range(categories):
+        pk, parent = start + index, None
+        #Parents are picked among the last few rows, which grows deep chains
+        if rows and rng.random() < 0.85:
+            candidate = rows[rng.randrange(max(0, len(rows) - 4), len(rows))]
+            if candidate.depth < depth - 1:
+                parent = candidate
+        path = '%s%d/' % (parent.path if parent else '', pk)
+        name = 'Category %d %s' % (pk, words(2))
+        rows.append(Category(
+            id=pk, name=name, slug=slugify(name), parent=parent, path=path, depth=path.count('/') - 1,
+        ))
+    Category.objects.bulk_create(rows, batch_size=batch_size)
+    category_ids = [row.id for row in rows]
+
+    course_start = (Course.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    lesson_start = (Lesson.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    course_ids = list(range(course_start, course_start + courses))
+
+    def records():
+        for pk in course_ids:
+            yield {
+                'type': 'course', 'id': pk, 'title': words(3).title(), 'description': words(20),
+                'category': rng.choice(category_ids) if category_ids else None,
+            }
+        for index in range(lessons):
+            pk = lesson_start + index
+            title = words(4).title()
+            yield {
+                'type': 'lesson', 'id': pk, 'slug': slugify(title), 'title': title, 'item': index, 'position': index,
+                'course': rng.sample(course_ids, rng.randint(0, min(links, len(course_ids)))),
+            }
+            for position in range(1, slides + 1):
+                slide_title = words(3).title()
+                yield {
+                    'type': 'slide', 'lesson': pk, 'position': position, 'title': slide_title,
+                    'slug': slugify(slide_title), 'content': words(rng.randint(50, 400)),
+                }
+
+    result = BulkImporter(batch_size=batch_size).run(json.dumps(record) for record in records())
+    if result['errors']:
+        raise ValueError('Generated records were rejected: %s' % result['errors'][:3])
+    return {'categories': categories, **result['created']}
+
+
+class Scenario:
+    """
+    One request to time. `build(context, iteration)` returns the method,
+    URL and body; `client` names the client of the context to send it with.
+    """
+    def __init__(self, name, build, client='student', expected=(200,)):
+        self.name = name
+        self.build = build
+        self.client = client
+        self.expected = expected
+
+
+def get(name, **kwargs):
+    return lambda context, iteration: ('get', reverse(name, kwargs={key: context[value] for key, value in kwargs.items()}), None)
+
+def with_query(name, query, **kwargs):
+    def build(context, iteration):
+        method, url, data = get(name, **kwargs)(context, iteration)
+        return method, url + query, data
+    return build
+
+SCENARIOS = (
+    #core.urls
+    Scenario('login', lambda context, iteration: (
+        'post', reverse('core:login'), {'email': 'student@benchmark.test', 'password': PASSWORD},
+    ), client='anonymous'),
+    Scenario('refresh', lambda context, iteration: ('post', reverse('core:refresh'), {}), client='session'),
+    Scenario('signup', lambda context, iteration: ('post', reverse('core:signup'), {
+        'email': 'signup%d@benchmark.test' % iteration, 'password': PASSWORD, 'first_name': 'Sign', 'last_name': 'Up',
+    }), client='anonymous'),
+    Scenario('user-list', get('core:user-list'), client='admin'),
+    Scenario('user-detail', get('core:user-detail', pk='student_id'), client='admin'),
+    #courses.urls
+    Scenario('cat-list', get('api:cat-list')),
+    Scenario('cat-rud', get('api:cat-rud', id='category_id'), client='teacher'),
+    Scenario('cat-descendants', get('api:cat-descendants', id='root_category_id')),
+    Scenario('cat-ancestors', get('api:cat-ancestors', id='category_id')),
+    Scenario('cat-courses', get('api:cat-courses', id='root_category_id')),
+    Scenario('course-list', get('api:course-list')),
+    Scenario('course-list-compact', with_query('api:course-list', '?compact=true&page_size=200')),
+    Scenario('course-list-search', with_query('api:course-list', '?search=python')),
+    Scenario('course-rud', get('api:course-rud', id='course_id'), client='teacher'),
+    Scenario('course-outline', get('api:course-outline', id='course_id')),
+    Scenario('course-create', lambda context, iteration: (
+        'post', reverse('api:course-create'), {'title': 'Benchmark %d' % iteration, 'description': 'Created'},
+    ), client='teacher', expected=(201,)),
+    Scenario('lesson-list', get('api:lesson-list')),
+    Scenario('lesson-list-course', lambda context, iteration: (
+        'get', reverse('api:lesson-list') + '?course=%d' % context['course_id'], None,
+    )),
+    Scenario('lesson-rud', get('api:lesson-rud', id='lesson_id'), client='teacher'),
+    Scenario('slide-list', get('api:slide-list', id='lesson_id')),
+    Scenario('slide-rud', get('api:slide-rud', id='lesson_id', position='slide_position'), client='teacher'),
+    Scenario('search', lambda context, iteration: ('get', reverse('api:search') + '?q=python+django', None)),
+    Scenario('async-course-list', get('api:async-course-list')),
+    Scenario('async-slide-list', get('api:async-slide-list', id='lesson_id')),
+    Scenario('bulk-export', get('api:bulk-export'), client='teacher'),
+)
+
+
+@contextmanager
+def without_throttling():
+    """
+    Turns login and signup throttling off, the scenarios repeat the same
+    attempts far beyond the configured rates. Nothing is counted meanwhile.
+    """
+    with override_settings(THROTTLE_RATES={}):
+        yield
+
+
+def create_context(seed=0):
+    """
+    Creates the benchmark users and picks the rows the scenarios read
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    users = {}
+    for role in ('student', 'teacher', 'admin'):
+        fields = {'first_name': role.title(), 'last_name': 'Benchmark', 'is_student': role != 'teacher', 'is_teacher': role != 'student'}
+        if role == 'admin':
+            users[role] = User.objects.create_superuser('%s@benchmark.test' % role, PASSWORD, **fields)
+        else:
+            users[role] = User.objects.create_user('%s@benchmark.test' % role, PASSWORD, **fields)
+
+    clients = {'anonymous': Client()}
+    for role, user in users.items():
+        access = str(RoleRefreshToken.for_user(user).access_token)
+        clients[role] = Client(HTTP_AUTHORIZATION='Bearer %s' % access)
+    clients['session'] = Client()
+    with without_throttling():
+        clients['session'].post(reverse('core:login'), {'email': 'student@benchmark.test', 'password': PASSWORD})
+
+    deepest = Category.objects.order_by('-depth', 'id').first()
+    lessons = list(Lesson.objects.filter(slide_count__gt=0).order_by('id').values_list('id', flat=True))
+    lesson_id = rng.choice(lessons)
+    return {
+        'clients': clients,
+        'student_id': users['student'].id,
+        'category_id': deepest.id,
+        'root_category_id': int(deepest.path.split('/')[0]),
+        'course_id': rng.choice(list(Course.objects.order_by('id').values_list('id', flat=True))),
+        'lesson_id': lesson_id,
+        'slide_position': Slide.objects.filter(lesson_id=lesson_id).order_by('position').values_list('position', flat=True)[0],
+    }
+
+
+def run_benchmark(context, iterations=50, scenarios=SCENARIOS):
+    """
+    Sends every scenario `iterations` times after one warm-up request and
+    returns throughput, latency percentiles in milliseconds and the
+    query count of the last request per scenario
+    """
+    results = {}
+    for scenario in scenarios:
+        client = context['clients'][scenario.client]
+        latencies, queries = [], 0
+        with without_throttling():
+            for iteration in range(-1, iterations):
+                method, url, data = scenario.build(context, iteration)
+                kwargs = {'data': data, 'content_type': 'application/json'} if method == 'post' else {}
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, **kwargs)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+                if response.status_code not in scenario.expected:
+                    raise ValueError('%s returned %d' % (scenario.name, response.status_code))
+                if iteration >= 0:
+                    latencies.append(elapsed * 1000)
+                    queries = len(captured)
+
+        results[scenario.name] = {
+            'requests': iterations,
+            'throughput': iterations / (sum(latencies) / 1000) if latencies else 0.0,
+            **percentiles(latencies, (50, 95, 99)),
+            'queries': queries,
+        }
+    return results
+
+
+def codecs():
+    """
+    (name, renderer, parser) of every installed wire format
+    """
+    available = [('json', JSONRenderer(), JSONParser())]
+    if renderers.orjson is not None:
+        available.append(('orjson', renderers.FastJSONRenderer(), renderers.FastJSONParser()))
+    if renderers.msgpack is not None:
+        available.append(('msgpack', renderers.MessagePackRenderer(), renderers.MessagePackParser()))
+    return available
+
+def benchmark_serialization(count=10000, rounds=3, seed=0):
+    """
+    Times SlideSerializer and every installed renderer and parser on
+    `count` slides, best of `rounds`, scaled to milliseconds per 10k
+    objects. Nothing touches the database.
+    """
+    rng = random.Random(seed)
+    slides = [
+        Slide(
+            id=index + 1, lesson_id=index // 10 + 1, position=index % 10 + 1, title=' '.join(rng.sample(WORDS, 3)),
+            slug='slide-%d' % index, content=' '.join(rng.choice(WORDS) for _ in range(rng.randint(50, 500))),
+        )
+        for index in range(count)
+    ]
+    scale = 10000 / max(count, 1)
+
+    def best(function):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        return result, min(timings) * 1000 * scale
+
+    data, serialize = best(lambda: SlideSerializer(slides, many=True).data)
+    results = {'serializer': {'serialize': serialize}}
+    for name, renderer, parser in codecs():
+        body, render = best(lambda: renderer.render(data))
+        _, parse = best(lambda: parser.parse(io.BytesIO(body), renderer.media_type, {}))
+        results[name] = {'render': render, 'parse': parse, 'bytes': len(body)}
+    return results
+
+
+def describe_environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Returns the regressions of `results` against `baseline`: more queries
+    than before, or throughput / p95 worse by more than `tolerance`
+    """
+    regressions = []
+    for name, current in sorted(results['scenarios'].items()):
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append('%s: %d queries (baseline %d)' % (name, current['queries'], previous['queries']))
+        if current['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append('%s: p95 %.2f ms (baseline %.2f ms)' % (name, current['p95'], previous['p95']))
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append('%s: %.1f req/s (baseline %.1f req/s)' % (name, current['throughput'], previous['throughput']))
+    return regressions
@@ -0,0 +1,279 @@
+import json
+from itertools import groupby, islice
+
+from django.core.management.color import no_style
+from django.db import IntegrityError, connections, router, transaction
+from django.utils.text import slugify
+from rest_framework import serializers
+from rest_framework.parsers import BaseParser
+
+from .models import Category, Course, CourseLesson, Lesson, Slide
+from .positions import append_links
+from .serializers import CourseSerializer, LessonSerializer, SlideSerializer
+from .signals import bulk_changed
+
+RECORD_TYPES = ('course', 'lesson', 'slide')
+
+
+class PrefetchedRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves primary keys from the batch-wide lookup in the serializer
+    context instead of running one query per value
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context['related'][self.queryset.model][int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+class CourseImportSerializer(CourseSerializer):
+    category = PrefetchedRelatedField(queryset=Category.objects.all(), allow_null=True, required=False)
+
+class LessonImportSerializer(LessonSerializer):
+    course = PrefetchedRelatedField(queryset=Course.objects.all(), many=True, required=False)
+
+    class Meta(LessonSerializer.Meta):
+        extra_kwargs = {'position': {'required': True}}
+
+class SlideImportSerializer(SlideSerializer):
+    lesson = PrefetchedRelatedField(queryset=Lesson.objects.all())
+
+    class Meta(SlideSerializer.Meta):
+        #Positions are checked once per chunk by the importer
+        validators = []
+        extra_kwargs = {'position': {'required': True}}
+
+
+class NDJSONParser(BaseParser):
+    """
+    Hands the request body to the view as a lazy iterator of lines
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter(stream) if stream is not None else iter(())
+
+
+def parse_records(lines):
+    """
+    Yields (line number, record, error) for every non-blank NDJSON line
+    """
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, {'non_field_errors': ['Invalid JSON: %s' % e]}
+            continue
+        if not isinstance(record, dict) or record.get('type') not in RECORD_TYPES:
+            yield number, None, {'type': ['Must be one of: %s' % ', '.join(RECORD_TYPES)]}
+            continue
+        yield number, record, None
+
+
+class BulkImporter:
+    """
+    Streams NDJSON records into the database. Every chunk of `batch_size`
+    lines is validated with the API serializers and written with
+    bulk_create inside its own transaction, courses first so lessons and
+    slides may refer to rows from the same chunk.
+    """
+    serializer_classes = {
+        'course': CourseImportSerializer,
+        'lesson': LessonImportSerializer,
+        'slide': SlideImportSerializer,
+    }
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.created = {record_type: 0 for record_type in RECORD_TYPES}
+        self.errors = []
+
+    def run(self, lines):
+        records = parse_records(lines)
+        while True:
+            chunk = list(islice(records, self.batch_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        self.errors.sort(key=lambda error: error['line'])
+        return {'created': self.created, 'errors': self.errors}
+
+    def import_chunk(self, chunk):
+        by_type = {record_type: [] for record_type in RECORD_TYPES}
+        for number, record, error in chunk:
+            if error is not None:
+                self.errors.append({'line': number, 'errors': error})
+            else:
+                by_type[record['type']].append((number, record))
+
+        created, errors = dict(self.created), len(self.errors)
+        try:
+            self.write_chunk(by_type)
+        except IntegrityError:
+            #Rows written meanwhile by others; the chunk was rolled back and
+            #its records are written one at a time to report the failing lines
+            self.created = created
+            del self.errors[errors:]
+            for record_type in RECORD_TYPES:
+                for number, record in by_type[record_type]:
+                    try:
+                        self.write_chunk({**{key: [] for key in RECORD_TYPES}, record_type: [(number, record)]})
+                    except IntegrityError:
+                        self.errors.append({'line': number, 'errors': {'non_field_errors': ['Conflicts with an existing row']}})
+
+    def write_chunk(self, by_type):
+        with transaction.atomic():
+            explicit_ids = []
+            for record_type in RECORD_TYPES:
+                valid = self.validate(record_type, by_type[record_type])
+                getattr(self, 'write_%ss' % record_type)(valid)
+                if any(record.get('id') is not None for _, record, _ in valid):
+                    explicit_ids.append(self.serializer_classes[record_type].Meta.model)
+            self.reset_sequences(explicit_ids)
+
+    def reset_sequences(self, models):
+        """
+        Moves the id sequences of `models` past the imported ids, which
+        bulk_create with explicit ids leaves behind on PostgreSQL
+        """
+        for model in models:
+            connection = connections[router.db_for_write(model)]
+            statements = connection.ops.sequence_reset_sql(no_style(), [model])
+            if statements:
+                with connection.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
+
+    def validate(self, record_type, records):
+        """
+        Returns (line, record, validated_data) for the valid records and
+        collects the errors of the rest. Related rows and taken ids are
+        fetched once per chunk.
+        """
+        if not records:
+            return []
+        model = self.serializer_classes[record_type].Meta.model
+        context = {'related': self.prefetch_related(record_type, records)}
+
+        ids = [record['id'] for _, record in records if record.get('id') is not None]
+        taken = set(model.objects.filter(id__in=[pk for pk in ids if isinstance(pk, int)]).values_list('id', flat=True))
+
+        valid = []
+        for number, record in records:
+            pk = record.get('id')
+            if pk is not None and (not isinstance(pk, int) or isinstance(pk, bool) or pk in taken):
+                self.errors.append({'line': number, 'errors': {'id': ['Must be an unused integer id']}})
+                continue
+            serializer = self.serializer_classes[record_type](data=record, context=context)
+            if not serializer.is_valid():
+                self.errors.append({'line': number, 'errors': serializer.errors})
+                continue
+            if pk is not None:
+                taken.add(pk)
+            valid.append((number, record, serializer.validated_data))
+        return valid
+
+    def prefetch_related(self, record_type, records):
+        field, model = {
+            'course': ('category', Category),
+            'lesson': ('course', Course),
+            'slide': ('lesson', Lesson),
+        }[record_type]
+
+        ids = set()
+        for _, record in records:
+            values = record.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                if isinstance(value, int) and not isinstance(value, bool):
+                    ids.add(value)
+        return {model: model.objects.only('id').in_bulk(ids)}
+
+    def write_courses(self, valid):
+        courses = [
+            Course(id=record.get('id'), slug=slugify(data['title']), **data)
+            for _, record, data in valid
+        ]
+        Course.objects.bulk_create(courses, batch_size=self.batch_size)
+        self.created['course'] += len(courses)
+        bulk_changed.send(sender=Course, instances=courses)
+
+    def write_lessons(self, valid):
+        #Backends returning the ids of inserted rows let new lessons and
+        #their links be bulk inserted too, the others need one save each
+        returns_ids = connections[router.db_for_write(Lesson)].features.can_return_rows_from_bulk_insert
+        links = []
+        lessons = []
+        for _, record, data in valid:
+            data = dict(data)
+            courses = data.pop('course', [])
+            lesson = Lesson(id=record.get('id'), **data)
+            if lesson.id is None and courses and not returns_ids:
+                lesson.save()
+            else:
+                lessons.append(lesson)
+            links.extend((lesson, course) for course in courses)
+
+        Lesson.objects.bulk_create(lessons, batch_size=self.batch_size)
+        #Lessons are appended to their courses in the order of the records
+        CourseLesson.objects.bulk_create(append_links([
+            CourseLesson(lesson_id=lesson.id, course_id=course.id)
+            for lesson, course in links
+        ]), batch_size=self.batch_size)
+        self.created['lesson'] += len(valid)
+        bulk_changed.send(sender=Lesson, instances=[lesson for lesson, _ in links] + lessons)
+
+    def write_slides(self, valid):
+        lesson_ids = {data['lesson'].id for _, _, data in valid}
+        taken = set(Slide.objects.filter(lesson_id__in=lesson_ids).values_list('lesson_id', 'position'))
+
+        slides = []
+        for number, record, data in valid:
+            position = (data['lesson'].id, data['position'])
+            if position in taken:
+                self.errors.append({'line': number, 'errors': {'position': ['A slide already exists at this position']}})
+                continue
+            taken.add(position)
+            slides.append(Slide(id=record.get('id'), **data))
+        Slide.objects.bulk_create(slides, batch_size=self.batch_size)
+        self.created['slide'] += len(slides)
+        bulk_changed.send(sender=Slide, instances=slides)
+
+
+def export_records(chunk_size=2000):
+    """
+    Yields the catalogue as NDJSON lines. Every table is read with
+    iterator() so memory stays flat; lesson links are merged in from a
+    second iterator over the through table ordered the same way.
+    """
+    def line(record):
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+    courses = Course.objects.order_by('id').values('id', 'title', 'description', 'category')
+    for course in courses.iterator(chunk_size=chunk_size):
+        yield line({'type': 'course', **course})
+
+    through = Lesson.course.through.objects.order_by('lesson_id', 'course_id').values_list('lesson_id', 'course_id')
+    links = groupby(through.iterator(chunk_size=chunk_size), key=lambda link: link[0])
+    pending = next(links, None)
+
+    lessons = Lesson.objects.order_by('id').values('id', 'slug', 'title', 'item', 'position')
+    for lesson in lessons.iterator(chunk_size=chunk_size):
+        while pending is not None and pending[0] < lesson['id']:
+            pending = next(links, None)
+        course = []
+        if pending is not None and pending[0] == lesson['id']:
+            course = [course_id for _, course_id in pending[1]]
+            pending = next(links, None)
+        yield line({'type': 'lesson', **lesson, 'course': course})
+
+    slides = Slide.objects.order_by('id').values('id', 'title', 'slug', 'lesson', 'position', 'content')
+    for slide in slides.iterator(chunk_size=chunk_size):
+        yield line({'type': 'slide', **slide})
@@ -0,0 +1,177 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from core import compression
+
+
+def get_cache():
+    return caches[getattr(settings, 'COURSES_CACHE_ALIAS', 'default')]
+
+def version_key(scope):
+    return 'courses:version:%s' % scope
+
+def get_version(scope):
+    """
+    Returns the current version of a cache scope. Versions are the
+    microsecond timestamp of the last write, which doubles as the
+    Last-Modified date of everything cached under them.
+    """
+    cache = get_cache()
+    key = version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+def bump(*scopes):
+    """
+    Moves the given scopes to a new version so entries cached under the
+    old one are never served again. The bump is repeated once the current
+    transaction commits, so a reader that cached uncommitted state in
+    between is invalidated as well.
+    """
+    def set_versions():
+        version = time.time_ns() // 1000
+        get_cache().set_many({version_key(scope): version for scope in scopes}, None)
+
+    set_versions()
+    transaction.on_commit(set_versions)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of If-None-Match with `etag`, as compressed
+    representations are sent with weakened ETags
+    """
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    return any(tag == opaque or tag == 'W/' + opaque for tag in parse_etags(if_none_match))
+
+
+def set_last_modified(response, last_modified):
+    """
+    Sends the Last-Modified date of a version once the second it names is
+    over. Dates have a one second resolution, so a write later in that
+    second would keep the date and If-Modified-Since would see no change.
+    """
+    if last_modified < int(time.time()):
+        response['Last-Modified'] = http_date(last_modified)
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for GET requests on generic views. Responses are
+    stored under the version of `get_cache_scope()`, and answered with
+    304 when the client already holds the current ETag or date.
+    """
+    cache_scope = None
+
+    def get_cache_scope(self):
+        return self.cache_scope
+
+    def get(self, request, *args, **kwargs):
+        key, etag, last_modified = self.get_cache_validators(request)
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self.get_compressed_response(request, key)
+            if response is None:
+                cache = get_cache()
+                data = cache.get(key)
+                if data is None:
+                    response = super().get(request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                    self.cache_response(key, response.data)
+                else:
+                    response = Response(data)
+                response.add_post_render_callback(lambda rendered: self.compress_response(request, rendered, key))
+
+        response['ETag'] = etag
+        set_last_modified(response, last_modified)
+        if response.has_header('Content-Encoding'):
+            compression.set_encoding(response, response['Content-Encoding'])
+        return response
+
+    def get_cache_validators(self, request):
+        """
+        Returns the cache key, ETag and Last-Modified timestamp of the
+        response to `request` at the current version of the scope
+        """
+        scope = self.get_cache_scope()
+        version = get_version(scope)
+        url = request.build_absolute_uri()
+        digest = hashlib.md5(('%s:%s' % (url, version)).encode('utf-8')).hexdigest()
+        return 'courses:response:%s:%s' % (scope, digest), quote_etag(digest), version // 1000000
+
+    def cache_response(self, key, data):
+        get_cache().set(key, data, getattr(settings, 'COURSES_CACHE_TIMEOUT', 300))
+
+    def get_body_key(self, request, key):
+        """
+        Key of the compressed body cached next to the data under `key`, or
+        None when the negotiated response is not stored compressed
+        """
+        renderer = getattr(request, 'accepted_renderer', None)
+        encoding = compression.negotiate(request)
+        if renderer is None or encoding is None or isinstance(renderer, BrowsableAPIRenderer):
+            return None
+        return '%s:%s:%s' % (key, renderer.format, encoding)
+
+    def get_compressed_response(self, request, key):
+        """
+        Answers from the compressed body stored by an earlier request,
+        skipping serialization, rendering and compression altogether
+        """
+        body_key = self.get_body_key(request, key)
+        content = get_cache().get(body_key) if body_key else None
+        if content is None:
+            return None
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = '%s; charset=%s' % (content_type, renderer.charset)
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Encoding'] = body_key.rsplit(':', 1)[1]
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def compress_response(self, request, response, key):
+        """
+        Post-render callback compressing the rendered body with the
+        negotiated encoding and keeping the bytes for the next requests
+        """
+        body_key = self.get_body_key(request, key)
+        if body_key is None or len(response.content) < compression.get_min_size():
+            return
+        encoding = body_key.rsplit(':', 1)[1]
+        content = compression.compress(response.content, encoding)
+        get_cache().set(body_key, content, getattr(settings, 'COURSES_CACHE_TIMEOUT', 300))
+        response.content = content
+        compression.set_encoding(response, encoding)
+        response['Content-Length'] = str(len(content))
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    def is_not_modified(self, request, etag, last_modified):
+        #The ETag wins over the date whenever the client sends one
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+        if last_modified >= int(time.time()):
+            return False
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
@@ -0,0 +1,30 @@
+from django.db.models import Count, F
+
+from .models import Course, Lesson
+
+
+def reconcile_courses(ids=None, batch_size=1000):
+    """
+    Rewrites `lesson_count` where it drifted from the links, returns the
+    ids of the fixed rows
+    """
+    courses = Course.objects.all()
+    if ids is not None:
+        courses = courses.filter(id__in=ids)
+    drifted = courses.annotate(actual=Count('lessons')).exclude(lesson_count=F('actual'))
+    fixed = [Course(id=pk, lesson_count=actual) for pk, actual in drifted.values_list('id', 'actual')]
+    Course.objects.bulk_update(fixed, ['lesson_count'], batch_size=batch_size)
+    return [row.id for row in fixed]
+
+def reconcile_lessons(ids=None, batch_size=1000):
+    """
+    Rewrites `slide_count` where it drifted from the slides, returns the
+    ids of the fixed rows
+    """
+    lessons = Lesson.objects.all()
+    if ids is not None:
+        lessons = lessons.filter(id__in=ids)
+    drifted = lessons.annotate(actual=Count('slides')).exclude(slide_count=F('actual'))
+    fixed = [Lesson(id=pk, slide_count=actual) for pk, actual in drifted.values_list('id', 'actual')]
+    Lesson.objects.bulk_update(fixed, ['slide_count'], batch_size=batch_size)
+    return [row.id for row in fixed]
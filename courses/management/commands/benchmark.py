@@ -0,0 +1,70 @@
+import json
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from courses.benchmark import compare, create_context, describe_environment, generate_catalogue, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a seeded catalogue in a throwaway test database, times every route of the '
+        'core and courses APIs and optionally fails on regressions against a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--depth', type=int, default=8)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--lessons', type=int, default=1000)
+        parser.add_argument('--slides', type=int, default=5, help='Slides per lesson')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per route')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Results file to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative loss of throughput and p95 before failing')
+
+    def handle(self, *args, **options):
+        if options['lessons'] < 1 or options['courses'] < 1 or options['categories'] < 1 or options['slides'] < 1:
+            raise CommandError('The catalogue needs at least one category, course, lesson and slide')
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for cache in caches.all():
+                cache.clear()
+            sizes = generate_catalogue(
+                seed=options['seed'], categories=options['categories'], depth=options['depth'],
+                courses=options['courses'], lessons=options['lessons'], slides=options['slides'],
+            )
+            context = create_context(seed=options['seed'])
+            scenarios = run_benchmark(context, iterations=options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        results = {
+            'seed': options['seed'],
+            'catalogue': sizes,
+            'iterations': options['iterations'],
+            'environment': describe_environment(),
+            'scenarios': scenarios,
+        }
+        for name, result in scenarios.items():
+            self.stdout.write('%-20s %8.1f req/s  p50 %7.2f ms  p95 %7.2f ms  p99 %7.2f ms  %3d queries' % (
+                name, result['throughput'], result['p50'], result['p95'], result['p99'], result['queries'],
+            ))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as source:
+                regressions = compare(results, json.load(source), tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against %s:\n  %s' % (options['baseline'], '\n  '.join(regressions)))
+            self.stdout.write(self.style.SUCCESS('No regressions against %s' % options['baseline']))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from courses.benchmark import benchmark_serialization
+
+
+class Command(BaseCommand):
+    help = 'Times the slide serializer and every installed renderer and parser per 10k slides'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        results = benchmark_serialization(count=max(1, options['count']), rounds=max(1, options['rounds']), seed=options['seed'])
+        self.stdout.write('%-10s serialize %8.1f ms / 10k' % ('serializer', results.pop('serializer')['serialize']))
+        for name, result in results.items():
+            self.stdout.write('%-10s render %8.1f ms / 10k  parse %8.1f ms / 10k  %10d bytes' % (
+                name, result['render'], result['parse'], result['bytes'],
+            ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from courses.bulk import export_records
+
+
+class Command(BaseCommand):
+    help = 'Exports courses, lessons and slides as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="Output file, or '-' for stdout")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            for line in export_records(chunk_size=options['chunk_size']):
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            output.writelines(export_records(chunk_size=options['chunk_size']))
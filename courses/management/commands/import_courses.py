@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from courses.bulk import BulkImporter
+
+
+class Command(BaseCommand):
+    help = 'Imports courses, lessons and slides from an NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file, or '-' for stdin")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        importer = BulkImporter(batch_size=options['batch_size'])
+        if options['path'] == '-':
+            result = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                result = importer.run(lines)
+
+        for error in result['errors']:
+            self.stderr.write('line %(line)s: %(errors)s' % error)
+        created = ', '.join('%d %ss' % (count, record_type) for record_type, count in result['created'].items())
+        self.stdout.write(self.style.SUCCESS('Created %s (%d errors)' % (created, len(result['errors']))))
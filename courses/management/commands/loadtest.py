@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.benchmark import percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends GET requests to one or more URLs at a fixed concurrency and reports requests/sec '
+        'and latency percentiles, e.g. a WSGI and an ASGI deployment of the same endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--token', help='Access token sent as a Bearer authorization header')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be positive')
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = 'Bearer %s' % options['token']
+
+        for url in options['urls']:
+            result = self.run(url, headers, options)
+            self.stdout.write(
+                '%s\n  %d requests, %d errors, %.1f req/s, p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms' % (
+                    url, result['requests'], result['errors'], result['rps'],
+                    result['p50'], result['p90'], result['p99'], result['max'],
+                )
+            )
+
+    def run(self, url, headers, options):
+        timeout = options['timeout']
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def fetch(_):
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+                    response.read()
+                failed = False
+            except (HTTPError, URLError, OSError):
+                failed = True
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                (errors if failed else latencies).append(elapsed)
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(fetch, range(options['warmup'])))
+            latencies.clear()
+            errors.clear()
+            start = time.perf_counter()
+            list(executor.map(fetch, range(options['requests'])))
+            duration = time.perf_counter() - start
+
+        return dict(
+            requests=options['requests'],
+            errors=len(errors),
+            rps=len(latencies) / duration,
+            max=max(latencies, default=0.0),
+            **percentiles(latencies, (50, 90, 99)),
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from courses.models import CourseLesson
+from courses.positions import GAP
+
+
+class Command(BaseCommand):
+    help = (
+        'Upgrades the course-lesson link table created for the former plain many-to-many field: '
+        'adds the position column and its index, then numbers the lessons of every course'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        #Schema changes run outside the transaction below, SQLite cannot
+        #alter tables inside one
+        if 'position' not in self.get_columns():
+            with connection.schema_editor() as editor:
+                editor.add_field(CourseLesson, CourseLesson._meta.get_field('position'))
+        constraints = self.get_constraints()
+        missing_indexes = [index for index in CourseLesson._meta.indexes if index.name not in constraints]
+        if missing_indexes:
+            with connection.schema_editor() as editor:
+                for index in missing_indexes:
+                    editor.add_index(CourseLesson, index)
+
+        with transaction.atomic():
+            #Links keep their current order, ties follow the global lesson position
+            links = CourseLesson.objects.order_by('course_id', 'position', 'lesson__position', 'lesson_id').only('id', 'course', 'position')
+            changed, course_id, position = [], None, 0
+            for link in links.iterator(chunk_size=options['batch_size']):
+                position = position + GAP if link.course_id == course_id else GAP
+                course_id = link.course_id
+                if link.position != position:
+                    link.position = position
+                    changed.append(link)
+            CourseLesson.objects.bulk_update(changed, ['position'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS('Renumbered %d course-lesson links' % len(changed)))
+
+    def get_columns(self):
+        with connection.cursor() as cursor:
+            return {column.name for column in connection.introspection.get_table_description(cursor, CourseLesson._meta.db_table)}
+
+    def get_constraints(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, CourseLesson._meta.db_table)
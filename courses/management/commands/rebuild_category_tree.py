@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized path and depth of every category'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = list(Category.objects.values_list('id', 'parent_id', 'path', 'depth'))
+        parents = {pk: parent_id for pk, parent_id, _, _ in rows}
+        children = defaultdict(list)
+        for pk, parent_id in parents.items():
+            children[parent_id].append(pk)
+
+        paths = {}
+        self.walk(children[None], children, paths)
+
+        #Rows left over hang off a parent cycle; the cycle is broken at
+        #one of its members, which becomes a root
+        detached = []
+        unreachable = set(parents) - set(paths)
+        while unreachable:
+            node, seen = min(unreachable), set()
+            while node not in seen:
+                seen.add(node)
+                node = parents[node]
+            detached.append(node)
+            self.walk([node], children, paths)
+            unreachable = set(parents) - set(paths)
+
+        changed = [
+            Category(id=pk, path=paths[pk], depth=paths[pk].count('/') - 1)
+            for pk, _, path, depth in rows
+            if path != paths[pk] or depth != paths[pk].count('/') - 1
+        ]
+        with transaction.atomic():
+            if detached:
+                Category.objects.filter(id__in=detached).update(parent=None)
+            Category.objects.bulk_update(changed, ['path', 'depth'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt %d of %d categories (%d detached from cycles)' % (len(changed), len(rows), len(detached))
+        ))
+
+    def walk(self, roots, children, paths):
+        stack = [(pk, '') for pk in roots]
+        while stack:
+            pk, parent_path = stack.pop()
+            paths[pk] = '%s%d/' % (parent_path, pk)
+            stack.extend((child, paths[pk]) for child in children[pk] if child not in paths)
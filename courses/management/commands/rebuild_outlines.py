@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses import outlines
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the precomputed outline documents of every course'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = outlines.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt %d outlines' % count))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = 'Recreates the full-text index of courses and lessons'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            raise CommandError('The database has no full-text search backend')
+        count = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Indexed %d documents' % count))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses import cache
+from courses.counters import reconcile_courses, reconcile_lessons
+
+
+class Command(BaseCommand):
+    help = 'Fixes drift in the lesson and slide counters of courses and lessons'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            courses = reconcile_courses(batch_size=options['batch_size'])
+            lessons = reconcile_lessons(batch_size=options['batch_size'])
+        if courses or lessons:
+            cache.bump('lessons', *['course:%s' % pk for pk in courses])
+        self.stdout.write(self.style.SUCCESS('Fixed %d courses and %d lessons' % (len(courses), len(lessons))))
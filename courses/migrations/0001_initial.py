@@ -0,0 +1,119 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.SlugField()),
+                ('path', models.CharField(db_index=True, default='', editable=False, max_length=255)),
+                ('depth', models.PositiveIntegerField(default=0, editable=False)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='courses.category')),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+            },
+        ),
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField()),
+                ('title', models.CharField(max_length=120)),
+                ('description', models.TextField(blank=True, default='')),
+                ('lesson_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='courses', to='courses.category')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='owned_courses', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseLesson',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_links', to='courses.course')),
+            ],
+            options={
+                'db_table': 'courses_lesson_course',
+            },
+        ),
+        migrations.CreateModel(
+            name='Lesson',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField()),
+                ('title', models.CharField(max_length=200)),
+                ('item', models.IntegerField()),
+                ('position', models.IntegerField()),
+                ('slide_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('course', models.ManyToManyField(blank=True, related_name='lessons', through='courses.CourseLesson', to='courses.Course')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Outline',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='outline', serialize=False, to='courses.course')),
+                ('etag', models.CharField(max_length=34)),
+                ('content', models.BinaryField()),
+                ('updated', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Slide',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField()),
+                ('position', models.IntegerField()),
+                ('content', models.TextField()),
+                ('lesson', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slides', to='courses.lesson')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='courselesson',
+            name='lesson',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_links', to='courses.lesson'),
+        ),
+        migrations.AddConstraint(
+            model_name='slide',
+            constraint=models.UniqueConstraint(fields=('lesson', 'position'), name='unique_slide_position'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['position', 'id'], name='courses_les_positio_2b827c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courselesson',
+            index=models.Index(fields=['course', 'position', 'lesson'], name='courselesson_outline_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='courselesson',
+            unique_together={('lesson', 'course')},
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['title', 'id'], name='courses_cou_title_974ba1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['slug', 'id'], name='courses_cat_slug_8df812_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together={('slug', 'parent')},
+        ),
+    ]
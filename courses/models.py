@@ -1,26 +1,113 @@
 import datetime
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
 from django.utils.text import slugify
 
+class CategoryQuerySet(models.QuerySet):
+
+	def subtree(self, path, include_self=False):
+		"""
+		Categories whose materialized path starts with `path`, expressed as
+		an index range scan: path characters are digits and '/', so every
+		descendant of '1/5/' sorts between '1/5/' and '1/50'.
+		"""
+		queryset = self.filter(path__gte=path, path__lt=path[:-1] + '0')
+		if not include_self:
+			queryset = queryset.exclude(path=path)
+		return queryset
+
+	def ancestors(self, path):
+		ids = [int(pk) for pk in path.split('/')[:-2]]
+		return self.filter(id__in=ids).order_by('depth')
+
 class Category(models.Model):
 	name = models.CharField(max_length=200)
 	slug = models.SlugField()
 	parent = models.ForeignKey('self', blank=True, on_delete=models.SET_NULL, null=True, related_name='children')
+	path = models.CharField(max_length=255, default='', db_index=True, editable=False)
+	depth = models.PositiveIntegerField(default=0, editable=False)
+
+	objects = CategoryQuerySet.as_manager()
 
 	class Meta:
 		unique_together = ('slug', 'parent',)
 		verbose_name_plural = "categories"   
+		indexes = [
+			models.Index(fields=['slug', 'id']),
+		]
 
 	def __str__(self):                           
 		return self.name
 
-class Course(models.Model):
+	def save(self, *args, **kwargs):
+		with transaction.atomic():
+			#Moves are checked and written before post_save, so receivers
+			#see the final paths and a rejected move writes nothing
+			if self.pk is not None:
+				self.update_path()
+			super(Category, self).save(*args, **kwargs)
+			if not self.path:
+				self.update_path()
+
+	def update_path(self):
+		"""
+		Recomputes the materialized path from the parent and moves the
+		whole subtree along with a single UPDATE when it changes
+		"""
+		parent_path = ''
+		if self.parent_id is not None:
+			parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+		old_path, old_depth = self.path, self.depth
+		new_path = '%s%d/' % (parent_path, self.pk)
+		new_depth = new_path.count('/') - 1
+		if new_path == old_path:
+			return
+		if old_path and parent_path.startswith(old_path):
+			raise ValueError('A category cannot be moved under its own subtree')
+
+		Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+		if old_path:
+			Category.objects.subtree(old_path).update(
+				path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+				depth=F('depth') + (new_depth - old_depth),
+			)
+		self.path, self.depth = new_path, new_depth
+
+class CountedModelMixin:
+	"""
+	Leaves the counter fields out of updates made with save(). Counters
+	are kept with F() updates, so an instance loaded before one of those
+	would write a stale count back.
+	"""
+	counter_fields = ()
+
+	def save(self, *args, **kwargs):
+		if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+			kwargs['update_fields'] = [
+				field.name for field in self._meta.concrete_fields
+				if not field.primary_key and field.name not in self.counter_fields
+			]
+		super().save(*args, **kwargs)
+
+class Course(CountedModelMixin, models.Model):
 	slug = models.SlugField()
 	title = models.CharField(max_length=120)
 	description = models.TextField(default="", blank=True)
 	category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='courses')
+	#Teacher allowed to edit the course and its lessons, anyone when empty
+	owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='owned_courses')
+	lesson_count = models.PositiveIntegerField(default=0, editable=False)
+
+	counter_fields = ('lesson_count',)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['title', 'id']),
+		]
 
 	def __str__(self):
 		return self.title
@@ -30,17 +117,61 @@ class Course(models.Model):
 		super(Course, self).save(*args, **kwargs)
 
 
-class Lesson(models.Model):
+class Lesson(CountedModelMixin, models.Model):
 	slug = models.SlugField()
 	title = models.CharField(max_length=200)
 	item = models.IntegerField()
-	course = models.ManyToManyField(Course, blank=True, related_name='lessons')
+	course = models.ManyToManyField(Course, blank=True, related_name='lessons', through='CourseLesson')
 	position = models.IntegerField()
+	slide_count = models.PositiveIntegerField(default=0, editable=False)
+
+	counter_fields = ('slide_count',)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['position', 'id']),
+		]
 
 	def __str__(self):
 		return self.slug
 
 
+class CourseLesson(models.Model):
+	"""
+	Membership of a lesson in a course, with its position in that course.
+	Kept in the table of the former auto-created link model, so existing
+	links survive; see the migrate_lesson_links command.
+	"""
+	course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lesson_links')
+	lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='course_links')
+	position = models.IntegerField(default=0)
+
+	class Meta:
+		db_table = 'courses_lesson_course'
+		unique_together = ('lesson', 'course',)
+		indexes = [
+			#Covers the ordered lesson ids of a course without a table lookup
+			models.Index(fields=['course', 'position', 'lesson'], name='courselesson_outline_idx'),
+		]
+
+	def __str__(self):
+		return '%s: %s' % (self.course_id, self.lesson_id)
+
+
+class Outline(models.Model):
+	"""
+	Precomputed outline document of a course, kept gzipped along with the
+	strong ETag of its JSON; see courses/outlines.py
+	"""
+	course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='outline')
+	etag = models.CharField(max_length=34)
+	content = models.BinaryField()
+	updated = models.DateTimeField()
+
+	def __str__(self):
+		return '%s: %s' % (self.course_id, self.etag)
+
+
 class Slide(models.Model):
 	title = models.CharField(max_length=200)
 	slug = models.SlugField()
@@ -48,5 +179,10 @@ class Slide(models.Model):
 	position = models.IntegerField()
 	content = models.TextField()
 
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['lesson', 'position'], name='unique_slide_position'),
+		]
+
 	def __str__(self):
 		return self.title
\ No newline at end of file
@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import quote_etag
+from django.utils.text import compress_string
+
+from core import compression
+
+from .cache import get_cache
+from .models import Category, Course, CourseLesson, Outline, Slide
+
+
+def build(course_ids):
+    """
+    Returns the outline documents of the given courses by id: the course,
+    its category path, its lessons in course order and the titles of
+    their slides. Four queries whatever the number of courses.
+    """
+    courses = list(
+        Course.objects.filter(id__in=course_ids).select_related('category')
+        .only('slug', 'title', 'category__path')
+    )
+    ancestor_ids = {int(pk) for course in courses if course.category for pk in course.category.path.split('/')[:-1]}
+    categories = {row['id']: row for row in Category.objects.filter(id__in=ancestor_ids).values('id', 'slug', 'name')}
+
+    links = defaultdict(list)
+    rows = CourseLesson.objects.filter(course_id__in=course_ids).order_by('course_id', 'position', 'lesson_id') \
+        .values_list('course_id', 'lesson_id', 'position', 'lesson__slug', 'lesson__title')
+    for course_id, lesson_id, position, slug, title in rows:
+        links[course_id].append({'id': lesson_id, 'slug': slug, 'title': title, 'position': position})
+
+    slides = defaultdict(list)
+    lesson_ids = {lesson['id'] for lessons in links.values() for lesson in lessons}
+    if lesson_ids:
+        rows = Slide.objects.filter(lesson_id__in=lesson_ids).order_by('lesson_id', 'position') \
+            .values('id', 'lesson_id', 'title', 'position')
+        for row in rows:
+            slides[row.pop('lesson_id')].append(row)
+
+    documents = {}
+    for course in courses:
+        path = course.category.path.split('/')[:-1] if course.category else []
+        documents[course.id] = {
+            'id': course.id,
+            'slug': course.slug,
+            'title': course.title,
+            'category': [categories[int(pk)] for pk in path if int(pk) in categories],
+            'lessons': [dict(lesson, slides=slides[lesson['id']]) for lesson in links[course.id]],
+        }
+    return documents
+
+def render(document):
+    """
+    Returns the strong ETag and the gzipped compact JSON of a document
+    """
+    content = json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return quote_etag(hashlib.md5(content).hexdigest()), compress_string(content)
+
+def decompress(content):
+    return gzip.decompress(content)
+
+def encode(etag, content, encoding):
+    """
+    Returns the gzipped `content` of the outline with `etag` recompressed
+    with `encoding`, cached under the ETag so it is only done once
+    """
+    if encoding == 'gzip':
+        return content
+    key = 'courses:outline:%s:%s' % (etag.strip('"'), encoding)
+    cache = get_cache()
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = compression.compress(decompress(content), encoding)
+        cache.set(key, encoded, getattr(settings, 'COURSES_CACHE_TIMEOUT', 300))
+    return encoded
+
+def rebuild(course_ids):
+    """
+    Stores fresh outlines of the given courses, only writing the ones whose
+    content changed, and drops the outlines of courses that are gone.
+    Returns the number of outlines written.
+    """
+    course_ids = set(course_ids)
+    if not course_ids:
+        return 0
+    documents = build(course_ids)
+    with transaction.atomic():
+        current = dict(Outline.objects.filter(course_id__in=course_ids).values_list('course_id', 'etag'))
+        now = timezone.now()
+        created, updated = [], []
+        for course_id, document in documents.items():
+            etag, content = render(document)
+            if course_id not in current:
+                created.append(Outline(course_id=course_id, etag=etag, content=content, updated=now))
+            elif current[course_id] != etag:
+                updated.append(Outline(course_id=course_id, etag=etag, content=content, updated=now))
+        Outline.objects.bulk_create(created)
+        Outline.objects.bulk_update(updated, ['etag', 'content', 'updated'])
+        gone = set(current) - set(documents)
+        if gone:
+            Outline.objects.filter(course_id__in=gone).delete()
+    return len(created) + len(updated)
+
+def rebuild_lessons(lesson_ids):
+    """
+    Rebuilds the outlines of every course the given lessons belong to
+    """
+    lesson_ids = {pk for pk in lesson_ids if pk is not None}
+    if not lesson_ids:
+        return 0
+    course_ids = CourseLesson.objects.filter(lesson_id__in=lesson_ids).values_list('course_id', flat=True)
+    return rebuild(set(course_ids))
+
+def rebuild_all(batch_size=1000):
+    count = 0
+    course_ids = list(Course.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(course_ids), batch_size):
+        count += rebuild(course_ids[start:start + batch_size])
+    Outline.objects.exclude(course_id__in=Course.objects.values('id')).delete()
+    return count
+
+def get(course_id):
+    """
+    Returns the (etag, gzipped content) of a course outline with a single
+    primary key lookup, building it first if it was never stored. None
+    when the course does not exist.
+    """
+    outline = Outline.objects.filter(course_id=course_id).values_list('etag', 'content').first()
+    if outline is None:
+        rebuild([course_id])
+        outline = Outline.objects.filter(course_id=course_id).values_list('etag', 'content').first()
+        if outline is None:
+            return None
+    etag, content = outline
+    return etag, bytes(content)
@@ -0,0 +1,172 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over the queryset's own ordering.
+
+    The primary key is appended to the ordering as a tie breaker so every
+    position is unique and pages stay stable while rows are inserted. A page
+    is fetched with a single `WHERE (a, b, id) > (...) LIMIT n` style query,
+    which is answered from the matching composite index at any depth.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.ordering_fields = [self.get_ordering_field(queryset, name) for name, _ in self.ordering]
+        self.base_url = request.build_absolute_uri()
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = [(name, not desc) for name, desc in ordering]
+
+        queryset = queryset.order_by(*[('-' if desc else '') + name for name, desc in ordering])
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        """
+        Returns the ordering as a list of (field, descending) pairs,
+        always ending with the primary key.
+        """
+        fields = queryset.query.order_by or getattr(view, 'ordering', None) or ('pk',)
+        if isinstance(fields, str):
+            fields = (fields,)
+
+        ordering = []
+        for field in fields:
+            desc = field.startswith('-')
+            name = field.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            ordering.append((name, desc))
+            if name == 'id':
+                break
+        else:
+            ordering.append(('id', ordering[-1][1] if ordering else False))
+        return ordering
+
+    def get_ordering_field(self, queryset, name):
+        """
+        Model field or annotation output field behind an ordering column,
+        used to check the values of decoded cursors
+        """
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        Expands the row comparison (a, b, id) > (x, y, z) into
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND id > z).
+        """
+        keyset = Q()
+        for index, (name, desc) in enumerate(ordering):
+            condition = Q(**{'%s__%s' % (name, 'lt' if desc else 'gt'): position[index]})
+            for prev_index in range(index):
+                condition &= Q(**{ordering[prev_index][0]: position[prev_index]})
+            keyset |= condition
+        return keyset
+
+    def get_position(self, instance):
+        return [getattr(instance, name) for name, _ in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode((encoded + padding).encode('ascii')))
+            position = payload['p']
+            reverse = bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        #Well-formed cursors may still carry values of the wrong type
+        try:
+            position = [
+                field.to_python(value) if field is not None and value is not None else value
+                for field, value in zip(self.ordering_fields, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = True
+        encoded = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii').rstrip('='))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,83 @@
+from rest_framework import permissions
+
+from core.roles import get_resolver, invalidate
+
+from .models import Course, CourseLesson
+
+
+def lesson_owners_key(lesson_id):
+    return 'roles:lesson-owners:%s' % lesson_id
+
+def get_lesson_owners(resolver, lesson_id):
+    """
+    Owner ids of the courses the lesson belongs to, None standing for
+    courses without an owner
+    """
+    return resolver.lookup(lesson_owners_key(lesson_id), lambda: frozenset(
+        Course.objects.filter(lesson_links__lesson_id=lesson_id).values_list('owner_id', flat=True)
+    ))
+
+def get_owners_by_lesson(lesson_ids):
+    """
+    Owner ids of the courses of every lesson in `lesson_ids`, read with one
+    query for checks on many lessons at once
+    """
+    owners = {pk: set() for pk in lesson_ids}
+    for lesson_id, owner_id in CourseLesson.objects.filter(lesson_id__in=owners).values_list('lesson_id', 'course__owner_id'):
+        owners[lesson_id].add(owner_id)
+    return {pk: frozenset(value) for pk, value in owners.items()}
+
+def invalidate_lessons(lesson_ids):
+    invalidate(*[lesson_owners_key(pk) for pk in set(lesson_ids)])
+
+def invalidate_courses(course_ids):
+    invalidate_lessons(CourseLesson.objects.filter(course_id__in=course_ids).values_list('lesson_id', flat=True))
+
+def may_edit(resolver, owners):
+    """
+    Staff edit everything. Teachers edit what they own, and what nobody
+    owns.
+    """
+    if resolver.has_role('staff', 'superuser'):
+        return True
+    if not resolver.has_role('teacher'):
+        return False
+    owned = owners - {None}
+    return not owned or resolver.user.pk in owned
+
+
+class IsCourseOwner(permissions.BasePermission):
+    """
+    Writes to a course need its owner, read from the course itself
+    """
+    def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return may_edit(get_resolver(request), frozenset([obj.owner_id]))
+
+
+class IsLessonOwner(permissions.BasePermission):
+    """
+    Writes under lesson/<id>/ need the owner of one of the lesson's
+    courses. Owners are cached per lesson, so the check costs no query
+    once warm.
+    """
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        resolver = get_resolver(request)
+        lesson_id = view.kwargs.get('id')
+        if lesson_id is None:
+            return may_edit(resolver, frozenset())
+        return may_edit(resolver, get_lesson_owners(resolver, lesson_id))
+
+class IsLessonReader(permissions.BasePermission):
+    """
+    The content under lesson/<id>/ is read by students, and by the teachers
+    who may edit the lesson
+    """
+    def has_permission(self, request, view):
+        resolver = get_resolver(request)
+        if resolver.has_role('student'):
+            return True
+        return may_edit(resolver, get_lesson_owners(resolver, view.kwargs.get('id')))
@@ -0,0 +1,96 @@
+from django.db.models import Max, Min
+
+#Room left between neighbours, so an insert can take the midpoint and
+#touch only its own row
+GAP = 1024
+
+
+def append_position(queryset):
+    last = queryset.aggregate(last=Max('position'))['last']
+    return GAP if last is None else last + GAP
+
+def append_links(links, exclude=()):
+    """
+    Gives course-lesson links positions after the last lesson of their
+    course, in list order, with one query for all courses. Links with ids
+    in `exclude` are not counted as already placed.
+    """
+    from .models import CourseLesson
+
+    course_ids = {link.course_id for link in links}
+    last = dict(
+        CourseLesson.objects.filter(course_id__in=course_ids).exclude(id__in=exclude)
+        .values('course_id').annotate(last=Max('position')).values_list('course_id', 'last')
+    )
+    for link in links:
+        position = last.get(link.course_id)
+        link.position = last[link.course_id] = GAP if position is None else position + GAP
+    return links
+
+def insert_position(queryset, after=None, unique=False):
+    """
+    Returns a free position right after the row with id `after`, or in
+    front of every row when it is None. The rows of `queryset` are spread
+    out again when there is no gap left at that point.
+    """
+    while True:
+        lower = None
+        following = queryset
+        if after is not None:
+            lower = queryset.filter(id=after).values_list('position', flat=True).get()
+            following = following.filter(position__gt=lower)
+        upper = following.order_by('position').values_list('position', flat=True).first()
+
+        if upper is None:
+            return (lower if lower is not None else 0) + GAP
+        if lower is None:
+            return upper - GAP
+        if upper - lower > 1:
+            return (lower + upper) // 2
+        rebalance(queryset, unique=unique)
+
+def rebalance(queryset, unique=False):
+    """
+    Rewrites the positions of `queryset` to multiples of GAP, keeping the
+    order
+    """
+    rows = list(queryset.order_by('position', 'id'))
+    for index, row in enumerate(rows, 1):
+        row.position = index * GAP
+    save_positions(queryset, rows, unique=unique)
+    return rows
+
+def reorder(queryset, ids, unique=False):
+    """
+    Puts the rows with `ids` in that order by handing out their own
+    positions again, so rows that are not listed keep their place. Returns
+    the rows whose position changed.
+    """
+    rows = {row.id: row for row in queryset.filter(id__in=ids)}
+    missing = [pk for pk in ids if pk not in rows]
+    if missing:
+        raise LookupError(missing)
+
+    slots = sorted(row.position for row in rows.values())
+    changed = []
+    for pk, position in zip(ids, slots):
+        if rows[pk].position != position:
+            rows[pk].position = position
+            changed.append(rows[pk])
+    save_positions(queryset, changed, unique=unique)
+    return changed
+
+def save_positions(queryset, rows, unique=False, batch_size=500):
+    """
+    Writes the positions of `rows` with bulk_update. When positions are
+    unique within `queryset`, rows are first parked below the lowest one so
+    no intermediate state violates the constraint.
+    """
+    if not rows:
+        return
+    model = queryset.model
+    if unique:
+        lowest = min(queryset.aggregate(lowest=Min('position'))['lowest'] or 0, 0)
+        parked = [model(id=row.id, position=lowest - index) for index, row in enumerate(rows, 1)]
+        model.objects.bulk_update(parked, ['position'], batch_size=batch_size)
+    model.objects.bulk_update(rows, ['position'], batch_size=batch_size)
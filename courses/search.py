@@ -0,0 +1,222 @@
+import re
+from itertools import groupby
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Course, Lesson, Slide
+
+#Documents share one table; the kind is folded into the row id so that
+#updates and deletes are primary key lookups on every backend
+KINDS = ('course', 'lesson')
+
+
+def document_id(kind, object_id):
+    return object_id * len(KINDS) + KINDS.index(kind)
+
+def match_terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 virtual table ranked with bm25, titles weighted over bodies
+    """
+    table = 'courses_search'
+
+    def create(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(title, body, tokenize="unicode61")' % self.table
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % self.table)
+
+    def index(self, documents):
+        rows = [(document_id(kind, pk), title, body) for kind, pk, title, body in documents]
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % self.table, [row[:1] for row in rows])
+            cursor.executemany('INSERT INTO %s (rowid, title, body) VALUES (%%s, %%s, %%s)' % self.table, rows)
+
+    def remove(self, kind, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM %s WHERE rowid = %%s' % self.table, [(document_id(kind, pk),) for pk in pks]
+            )
+
+    def match(self, terms):
+        return ' '.join('"%s"*' % term for term in terms)
+
+    def ids_sql(self, kind, terms):
+        sql = 'SELECT rowid / {n} FROM {table} WHERE {table} MATCH %s AND rowid %% {n} = {kind}'.format(
+            n=len(KINDS), table=self.table, kind=KINDS.index(kind)
+        )
+        return sql, [self.match(terms)]
+
+    def search(self, terms, kind=None, limit=20, offset=0):
+        sql = 'SELECT rowid, title, bm25({table}, 10.0, 1.0) AS rank FROM {table} WHERE {table} MATCH %s'.format(
+            table=self.table
+        )
+        params = [self.match(terms)]
+        if kind is not None:
+            sql += ' AND rowid %% {n} = {kind}'.format(n=len(KINDS), kind=KINDS.index(kind))
+        sql += ' ORDER BY rank LIMIT %s OFFSET %s'
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(rowid, title, -rank) for rowid, title, rank in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """
+    Weighted tsvector column behind a GIN index, ranked with ts_rank
+    """
+    table = 'courses_search'
+
+    def create(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS %s (id bigint PRIMARY KEY, title text NOT NULL, '
+                'document tsvector NOT NULL)' % self.table
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS %s_document ON %s USING GIN (document)' % (self.table, self.table)
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE %s' % self.table)
+
+    def index(self, documents):
+        rows = [(document_id(kind, pk), title, title, body) for kind, pk, title, body in documents]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO %s (id, title, document) VALUES (%%s, %%s, '
+                "setweight(to_tsvector('simple', %%s), 'A') || setweight(to_tsvector('simple', %%s), 'B')) "
+                'ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title, document = EXCLUDED.document' % self.table,
+                rows,
+            )
+
+    def remove(self, kind, pks):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE id = ANY(%%s)' % self.table, [[document_id(kind, pk) for pk in pks]]
+            )
+
+    def match(self, terms):
+        return ' & '.join('%s:*' % term for term in terms)
+
+    def ids_sql(self, kind, terms):
+        sql = "SELECT id / {n} FROM {table} WHERE document @@ to_tsquery('simple', %s) AND id %% {n} = {kind}".format(
+            n=len(KINDS), table=self.table, kind=KINDS.index(kind)
+        )
+        return sql, [self.match(terms)]
+
+    def search(self, terms, kind=None, limit=20, offset=0):
+        sql = (
+            "SELECT id, title, ts_rank(document, to_tsquery('simple', %%s)) AS rank FROM %s "
+            "WHERE document @@ to_tsquery('simple', %%s)" % self.table
+        )
+        params = [self.match(terms)] * 2
+        if kind is not None:
+            sql += ' AND id %% {n} = {kind}'.format(n=len(KINDS), kind=KINDS.index(kind))
+        sql += ' ORDER BY rank DESC LIMIT %s OFFSET %s'
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+def get_backend():
+    """
+    Returns the full-text backend for the current database, or None when
+    the database has no full-text support and LIKE searches are used
+    """
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class is not None else None
+
+
+def course_documents(pks=None):
+    courses = Course.objects.order_by('id')
+    if pks is not None:
+        courses = courses.filter(id__in=pks)
+    for pk, title, description in courses.values_list('id', 'title', 'description').iterator():
+        yield 'course', pk, title, description
+
+def lesson_documents(pks=None):
+    """
+    Lessons are indexed with the titles and content of their slides,
+    merged in from a second iterator ordered the same way
+    """
+    lessons = Lesson.objects.order_by('id')
+    slides = Slide.objects.exclude(lesson=None).order_by('lesson_id', 'position')
+    if pks is not None:
+        lessons = lessons.filter(id__in=pks)
+        slides = slides.filter(lesson_id__in=pks)
+
+    grouped = groupby(slides.values_list('lesson_id', 'title', 'content').iterator(), key=lambda slide: slide[0])
+    pending = next(grouped, None)
+    for pk, title in lessons.values_list('id', 'title').iterator():
+        while pending is not None and pending[0] < pk:
+            pending = next(grouped, None)
+        body = ''
+        if pending is not None and pending[0] == pk:
+            body = '\n'.join('%s\n%s' % (slide_title, content) for _, slide_title, content in pending[1])
+            pending = next(grouped, None)
+        yield 'lesson', pk, title, body
+
+
+def reindex(kind, pks):
+    backend = get_backend()
+    if backend is None or not pks:
+        return
+    documents = course_documents(pks) if kind == 'course' else lesson_documents(pks)
+    backend.index(list(documents))
+
+def remove(kind, pks):
+    backend = get_backend()
+    if backend is not None and pks:
+        backend.remove(kind, pks)
+
+def rebuild(batch_size=1000):
+    backend = get_backend()
+    if backend is None:
+        return 0
+    backend.create()
+    backend.clear()
+    count = 0
+    for documents in (course_documents(), lesson_documents()):
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                backend.index(batch)
+                count, batch = count + len(batch), []
+        backend.index(batch)
+        count += len(batch)
+    return count
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Drop-in for SearchFilter that matches `?search=` against the full-text
+    index of `search_kind` with one indexed subquery. Falls back to the
+    LIKE based `search_fields` on databases without a backend.
+    """
+    def filter_queryset(self, request, queryset, view):
+        backend = get_backend()
+        terms = match_terms(request.query_params.get(self.search_param, ''))
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        if not terms:
+            return queryset
+        sql, params = backend.ids_sql(view.search_kind, terms)
+        return queryset.filter(id__in=RawSQL(sql, params))
@@ -1,27 +1,69 @@
 from rest_framework import serializers
 from .models import Category, Course, Lesson, Slide
 
-class SlideSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Drops every field not listed in the `fields` context entry
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class SlideSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     lesson = serializers.PrimaryKeyRelatedField(read_only=True)
     class Meta:
         model = Slide
         fields = '__all__'
+        #Left out, the view appends the slide or inserts it after ?after=
+        extra_kwargs = {'position': {'required': False}}
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    #Declared since DRF makes relations with a through model read-only
+    course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all(), many=True, required=False)
 
     class Meta:
         model = Lesson
         fields = '__all__'
+        extra_kwargs = {'position': {'required': False}}
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     slug = serializers.SlugField(read_only=True)
+    owner = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Course
         fields = '__all__'
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     #courses = CourseListSerializer(many=True, read_only=True)
     class Meta:
         model = Category
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and self.instance.path \
+                and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError('A category cannot be moved under its own subtree')
+        return value
+
+#Compact representations for list views
+class SlideListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Slide
+        fields = ['id', 'slug', 'title', 'position', 'lesson']
+
+class LessonListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Lesson
+        fields = ['id', 'slug', 'title', 'position', 'slide_count']
+
+class CourseListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Course
+        fields = ['id', 'slug', 'title', 'category', 'lesson_count']
@@ -0,0 +1,283 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from . import cache, counters, outlines, permissions, positions, search
+from .models import Category, Course, CourseLesson, Lesson, Slide
+
+#Sent with `instances` after rows were written without save(), e.g. by
+#bulk_create or queryset updates, so derived data can catch up
+bulk_changed = Signal()
+
+@receiver(post_delete, sender=Category)
+def detach_category_subtree(sender, instance, **kwargs):
+    """
+    Children of a deleted category are set to NULL by the database,
+    so their subtrees become roots and lose the deleted prefix
+    """
+    if not instance.path:
+        return
+    Category.objects.subtree(instance.path).update(
+        path=Substr('path', len(instance.path) + 1),
+        depth=F('depth') - (instance.depth + 1),
+    )
+
+#Cache invalidation
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    cache.bump('course:%s' % instance.pk, 'lessons')
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson(sender, instance, **kwargs):
+    cache.bump('lessons', 'slides:%s' % instance.pk)
+
+@receiver(m2m_changed, sender=Lesson.course.through)
+def invalidate_lesson_courses(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache.bump('lessons')
+
+@receiver(post_save, sender=Slide)
+@receiver(post_delete, sender=Slide)
+def invalidate_slide(sender, instance, **kwargs):
+    if instance.lesson_id is not None:
+        cache.bump('slides:%s' % instance.lesson_id)
+
+@receiver(bulk_changed)
+def invalidate_bulk(sender, instances, **kwargs):
+    if sender is Course:
+        cache.bump('lessons', *['course:%s' % course.pk for course in instances])
+    elif sender is Lesson:
+        cache.bump('lessons', *['slides:%s' % lesson.pk for lesson in instances])
+    elif sender is Slide:
+        cache.bump(*{'slides:%s' % slide.lesson_id for slide in instances})
+    elif sender is CourseLesson:
+        cache.bump('lessons', *{'course:%s' % link.course_id for link in instances})
+
+
+#Full-text index
+def create_search_index(sender, using, **kwargs):
+    backend = search.get_backend()
+    if backend is not None:
+        backend.create()
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, **kwargs):
+    search.reindex('course', [instance.pk])
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    search.remove('course', [instance.pk])
+
+@receiver(post_save, sender=Lesson)
+def index_lesson(sender, instance, **kwargs):
+    search.reindex('lesson', [instance.pk])
+
+@receiver(post_delete, sender=Lesson)
+def unindex_lesson(sender, instance, **kwargs):
+    search.remove('lesson', [instance.pk])
+
+@receiver(post_save, sender=Slide)
+@receiver(post_delete, sender=Slide)
+def index_slide(sender, instance, **kwargs):
+    if instance.lesson_id is not None:
+        search.reindex('lesson', [instance.lesson_id])
+
+@receiver(bulk_changed)
+def index_bulk(sender, instances, **kwargs):
+    if sender is Course:
+        search.reindex('course', [course.pk for course in instances])
+    elif sender is Lesson:
+        search.reindex('lesson', list({lesson.pk for lesson in instances}))
+    elif sender is Slide:
+        search.reindex('lesson', list({slide.lesson_id for slide in instances}))
+
+
+#Denormalized counters
+def change_lesson_count(course_ids, delta):
+    if course_ids:
+        Course.objects.filter(id__in=course_ids).update(lesson_count=F('lesson_count') + delta)
+        cache.bump(*['course:%s' % pk for pk in course_ids])
+
+@receiver(m2m_changed, sender=Lesson.course.through)
+def count_lesson_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        #The cleared links are only known before they are deleted
+        if reverse:
+            instance._cleared_links = instance.lessons.count()
+        else:
+            instance._cleared_links = list(instance.course.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            change_lesson_count([instance.pk], delta * len(pk_set))
+        else:
+            change_lesson_count(list(pk_set), delta)
+    elif action == 'post_clear':
+        if reverse:
+            change_lesson_count([instance.pk], -instance._cleared_links)
+        else:
+            change_lesson_count(instance._cleared_links, -1)
+
+@receiver(pre_delete, sender=Lesson)
+def count_deleted_lesson(sender, instance, **kwargs):
+    change_lesson_count(list(instance.course.values_list('id', flat=True)), -1)
+
+@receiver(post_save, sender=Slide)
+def count_created_slide(sender, instance, created, **kwargs):
+    if created and instance.lesson_id is not None:
+        Lesson.objects.filter(id=instance.lesson_id).update(slide_count=F('slide_count') + 1)
+        cache.bump('lessons')
+
+@receiver(post_delete, sender=Slide)
+def count_deleted_slide(sender, instance, **kwargs):
+    if instance.lesson_id is not None:
+        Lesson.objects.filter(id=instance.lesson_id).update(slide_count=F('slide_count') - 1)
+        cache.bump('lessons')
+
+@receiver(bulk_changed)
+def count_bulk(sender, instances, **kwargs):
+    if sender is Lesson:
+        lesson_ids = {lesson.pk for lesson in instances}
+        course_ids = Lesson.course.through.objects.filter(lesson_id__in=lesson_ids).values_list('course_id', flat=True)
+        fixed = counters.reconcile_courses(set(course_ids))
+        counters.reconcile_lessons(lesson_ids)
+        cache.bump(*['course:%s' % pk for pk in fixed])
+    elif sender is Slide:
+        counters.reconcile_lessons({slide.lesson_id for slide in instances})
+
+
+#Positions of lessons in courses
+@receiver(m2m_changed, sender=CourseLesson)
+def position_lesson_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Links added through the related managers are appended to their courses
+    """
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        links = CourseLesson.objects.filter(course_id=instance.pk, lesson_id__in=pk_set).order_by('lesson_id')
+    else:
+        links = CourseLesson.objects.filter(lesson_id=instance.pk, course_id__in=pk_set)
+    links = list(links.only('id', 'course', 'position'))
+    positions.append_links(links, exclude=[link.id for link in links])
+    CourseLesson.objects.bulk_update(links, ['position'])
+    cache.bump(*['course:%s' % link.course_id for link in links])
+
+
+#Course outlines, rebuilt after the receivers above so positions and
+#category paths are final
+@receiver(post_save, sender=Category)
+def rebuild_category_outlines(sender, instance, created, **kwargs):
+    if created:
+        return
+    categories = Category.objects.subtree(instance.path, include_self=True)
+    outlines.rebuild(Course.objects.filter(category__in=categories).values_list('id', flat=True))
+
+@receiver(pre_delete, sender=Category)
+def collect_category_outlines(sender, instance, **kwargs):
+    categories = Category.objects.subtree(instance.path, include_self=True)
+    instance._outline_courses = list(Course.objects.filter(category__in=categories).values_list('id', flat=True))
+
+@receiver(post_delete, sender=Category)
+def rebuild_deleted_category_outlines(sender, instance, **kwargs):
+    outlines.rebuild(getattr(instance, '_outline_courses', ()))
+
+@receiver(post_save, sender=Course)
+def rebuild_course_outline(sender, instance, **kwargs):
+    outlines.rebuild([instance.pk])
+
+@receiver(post_save, sender=Lesson)
+def rebuild_lesson_outlines(sender, instance, created, **kwargs):
+    if not created:
+        outlines.rebuild_lessons([instance.pk])
+
+@receiver(pre_delete, sender=Lesson)
+def collect_lesson_outlines(sender, instance, **kwargs):
+    instance._outline_courses = list(instance.course_links.values_list('course_id', flat=True))
+
+@receiver(post_delete, sender=Lesson)
+def rebuild_deleted_lesson_outlines(sender, instance, **kwargs):
+    outlines.rebuild(getattr(instance, '_outline_courses', ()))
+
+@receiver(post_save, sender=Slide)
+@receiver(post_delete, sender=Slide)
+def rebuild_slide_outlines(sender, instance, **kwargs):
+    outlines.rebuild_lessons([instance.lesson_id])
+
+@receiver(m2m_changed, sender=CourseLesson)
+def rebuild_link_outlines(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._outline_courses = list(instance.course_links.values_list('course_id', flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        outlines.rebuild([instance.pk] if reverse else pk_set)
+    elif action == 'post_clear':
+        outlines.rebuild([instance.pk] if reverse else instance._outline_courses)
+
+@receiver(bulk_changed)
+def rebuild_bulk_outlines(sender, instances, **kwargs):
+    if sender is Category:
+        course_ids = set()
+        for category in instances:
+            categories = Category.objects.subtree(category.path, include_self=True)
+            course_ids.update(Course.objects.filter(category__in=categories).values_list('id', flat=True))
+        outlines.rebuild(course_ids)
+    elif sender is Course:
+        outlines.rebuild([course.pk for course in instances])
+    elif sender is Lesson:
+        outlines.rebuild_lessons([lesson.pk for lesson in instances])
+    elif sender is Slide:
+        outlines.rebuild_lessons([slide.lesson_id for slide in instances])
+    elif sender is CourseLesson:
+        outlines.rebuild({link.course_id for link in instances})
+
+
+#Cached lesson owners
+@receiver(post_save, sender=Course)
+def invalidate_course_owners(sender, instance, created, **kwargs):
+    if not created:
+        permissions.invalidate_courses([instance.pk])
+
+@receiver(pre_delete, sender=Course)
+def collect_deleted_course_lessons(sender, instance, **kwargs):
+    instance._owned_lessons = list(instance.lesson_links.values_list('lesson_id', flat=True))
+
+@receiver(post_delete, sender=Course)
+def invalidate_deleted_course_owners(sender, instance, **kwargs):
+    permissions.invalidate_lessons(getattr(instance, '_owned_lessons', ()))
+
+@receiver(post_delete, sender=Lesson)
+def invalidate_deleted_lesson_owners(sender, instance, **kwargs):
+    permissions.invalidate_lessons([instance.pk])
+
+@receiver(m2m_changed, sender=CourseLesson)
+def invalidate_link_owners(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._owned_lessons = list(instance.lesson_links.values_list('lesson_id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        permissions.invalidate_lessons([instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        permissions.invalidate_lessons(pk_set)
+    elif action == 'post_clear':
+        permissions.invalidate_lessons(instance._owned_lessons)
+
+@receiver(pre_delete, sender=get_user_model())
+def collect_deleted_owner_lessons(sender, instance, **kwargs):
+    #Their courses lose the owner through SET_NULL, without signals
+    instance._owned_lessons = list(
+        CourseLesson.objects.filter(course__owner=instance).values_list('lesson_id', flat=True)
+    )
+
+@receiver(post_delete, sender=get_user_model())
+def invalidate_deleted_owner(sender, instance, **kwargs):
+    permissions.invalidate_lessons(getattr(instance, '_owned_lessons', ()))
+
+@receiver(bulk_changed)
+def invalidate_bulk_owners(sender, instances, **kwargs):
+    if sender is Course:
+        permissions.invalidate_courses([course.pk for course in instances])
+    elif sender is Lesson:
+        permissions.invalidate_lessons([lesson.pk for lesson in instances])
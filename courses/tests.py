@@ -1,14 +1,36 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import tempfile
+from unittest import mock
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
 from django.test import Client
 from rest_framework_simplejwt.tokens import RefreshToken
+from core import compression
+from core.throttling import get_store
+from core.tokens import RoleRefreshToken
 
 #User model
 from django.contrib.auth import get_user_model
 
+from .benchmark import SCENARIOS, benchmark_serialization, compare, create_context, generate_catalogue, run_benchmark
+from .cache import get_version
+from .models import Category, Course, CourseLesson, Lesson, Outline, Slide
+from .permissions import IsCourseOwner, IsLessonOwner
+from .positions import GAP
+
 class EndpointTests(APITestCase):
     """
     Testing API endpoints
@@ -100,4 +122,1172 @@ class EndpointTests(APITestCase):
             response = self.client.delete(url, data={"ping": "pong"}, format="json")
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-# TODO test cat / course / lesson / slide creation
\ No newline at end of file
+class PaginationTests(APITestCase):
+    """
+    Testing keyset pagination on list endpoints
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        self.client.force_authenticate(user)
+
+        #Duplicate titles make the id tie breaker matter
+        for title in ["Beta", "Alpha", "Beta", "Gamma", "Beta", "Alpha", "Delta"]:
+            Course.objects.create(title=title)
+
+    def test_course_pages(self):
+        expected = list(Course.objects.order_by('title', 'id').values_list('id', flat=True))
+
+        seen = []
+        url = reverse("api:course-list") + "?page_size=2"
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            pages.append(response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, expected)
+        self.assertIsNone(pages[0]["previous"])
+
+        #Walking back from the last page returns the same rows
+        response = self.client.get(pages[-1]["previous"])
+        self.assertEqual(response.data["results"], pages[-2]["results"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("api:course-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        #Well-formed, but the id is not a number
+        cursor = base64.urlsafe_b64encode(json.dumps({"p": ["Alpha", "one"]}).encode()).decode().rstrip("=")
+        response = self.client.get(reverse("api:course-list") + "?cursor=" + cursor)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class CategoryTreeTests(APITestCase):
+    """
+    Testing the materialized category tree
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        self.client.force_authenticate(user)
+
+        self.root = Category.objects.create(name="Science", slug="science")
+        self.physics = Category.objects.create(name="Physics", slug="physics", parent=self.root)
+        self.optics = Category.objects.create(name="Optics", slug="optics", parent=self.physics)
+        self.art = Category.objects.create(name="Art", slug="art")
+
+    def test_paths(self):
+        self.optics.refresh_from_db()
+        self.assertEqual(self.optics.path, "%d/%d/%d/" % (self.root.id, self.physics.id, self.optics.id))
+        self.assertEqual(self.optics.depth, 2)
+
+        #Moving a branch rewrites the whole subtree
+        self.physics.parent = self.art
+        self.physics.save()
+        self.optics.refresh_from_db()
+        self.assertEqual(self.optics.path, "%d/%d/%d/" % (self.art.id, self.physics.id, self.optics.id))
+
+        #Deleting a category turns its children into roots
+        self.art.delete()
+        self.optics.refresh_from_db()
+        self.assertEqual(self.optics.path, "%d/%d/" % (self.physics.id, self.optics.id))
+        self.assertEqual(self.optics.depth, 1)
+
+    def test_cycle_is_rejected(self):
+        self.root.parent = self.optics
+        with self.assertRaises(ValueError):
+            self.root.save()
+        self.root.refresh_from_db()
+        self.assertIsNone(self.root.parent_id)
+        self.assertEqual(self.root.path, "%d/" % self.root.id)
+
+    def test_tree_endpoints(self):
+        course = Course.objects.create(title="Lenses", category=self.optics)
+        Course.objects.create(title="Painting", category=self.art)
+
+        response = self.client.get(reverse("api:cat-descendants", kwargs={"id": self.root.id}))
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.physics.id, self.optics.id])
+
+        response = self.client.get(reverse("api:cat-ancestors", kwargs={"id": self.optics.id}))
+        self.assertEqual([item["id"] for item in response.data], [self.root.id, self.physics.id])
+
+        response = self.client.get(reverse("api:cat-courses", kwargs={"id": self.root.id}))
+        self.assertEqual([item["id"] for item in response.data["results"]], [course.id])
+
+        response = self.client.get(reverse("api:cat-ancestors", kwargs={"id": 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebuild_command(self):
+        Category.objects.update(path="", depth=0)
+        call_command("rebuild_category_tree", stdout=StringIO())
+        self.optics.refresh_from_db()
+        self.assertEqual(self.optics.path, "%d/%d/%d/" % (self.root.id, self.physics.id, self.optics.id))
+
+class CacheTests(APITestCase):
+    """
+    Testing the versioned read-through cache
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        self.client.force_authenticate(user)
+        self.course = Course.objects.create(title="Cached course")
+        self._url = reverse("api:course-rud", kwargs={"id": self.course.id})
+
+    def _test_read_through(self):
+        response = self.client.get(self._url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        #Served from the cache without touching the database
+        with self.assertNumQueries(0):
+            response = self.client.get(self._url)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(self._url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        #Dates are sent once the second of the version is over
+        version = get_version("course:%d" % self.course.id)
+        with mock.patch("courses.cache.time.time", return_value=version / 1000000 + 1):
+            last_modified = self.client.get(self._url)["Last-Modified"]
+            response = self.client.get(self._url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        #Writes bump the version
+        response = self.client.patch(self._url, {"title": "Renamed course"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self._url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Renamed course")
+
+    def test_last_modified_within_the_second(self):
+        version = get_version("course:%d" % self.course.id)
+        second = version // 1000000
+        with mock.patch("courses.cache.time.time", return_value=second + 0.999):
+            response = self.client.get(self._url)
+            self.assertFalse(response.has_header("Last-Modified"))
+            #A date naming the running second proves nothing
+            response = self.client.get(self._url, HTTP_IF_MODIFIED_SINCE=http_date(second))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with mock.patch("courses.cache.time.time", return_value=second + 1):
+            response = self.client.get(self._url)
+        self.assertEqual(response["Last-Modified"], http_date(second))
+
+    def test_locmem_cache(self):
+        self._test_read_through()
+
+    def test_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            caches = {"default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }}
+            with self.settings(CACHES=caches):
+                self._test_read_through()
+
+class SlideLookupTests(APITestCase):
+    """
+    Testing lesson scoped slide routes
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        self.client.force_authenticate(user)
+        self.lesson = Lesson.objects.create(slug="intro", title="Intro", item=1, position=1)
+        Slide.objects.create(title="First", slug="first", lesson=self.lesson, position=1, content="a")
+        Slide.objects.create(title="Second", slug="second", lesson=self.lesson, position=2, content="b")
+
+    def test_slide_read_query_count(self):
+        url = reverse("api:slide-rud", kwargs={"id": self.lesson.id, "position": 2})
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Second")
+
+        url = reverse("api:slide-rud", kwargs={"id": self.lesson.id, "position": 3})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_slide_create(self):
+        data = {"title": "Third", "slug": "third", "position": 3, "content": "c"}
+        response = self.client.post(reverse("api:slide-create", kwargs={"id": self.lesson.id}), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["lesson"], self.lesson.id)
+
+        #Taken position
+        response = self.client.post(reverse("api:slide-create", kwargs={"id": self.lesson.id}), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        #Missing lesson
+        response = self.client.post(reverse("api:slide-create", kwargs={"id": 999}), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class BulkTests(APITestCase):
+    """
+    Testing NDJSON bulk import and export
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        self.client.force_authenticate(user)
+
+    def _records(self):
+        return [
+            {"type": "course", "id": 10, "title": "Bulk Course", "description": "d"},
+            {"type": "lesson", "id": 20, "slug": "l", "title": "Lesson", "item": 1, "position": 1, "course": [10]},
+            {"type": "slide", "title": "S1", "slug": "s1", "lesson": 20, "position": 1, "content": "one"},
+            {"type": "slide", "title": "S2", "slug": "s2", "lesson": 20, "position": 2, "content": "two"},
+            {"type": "slide", "title": "S3", "slug": "s3", "lesson": 20, "position": 2, "content": "taken"},
+            {"type": "slide", "title": "S4", "slug": "s4", "lesson": 99, "position": 1, "content": "orphan"},
+            {"type": "teacher"},
+        ]
+
+    def test_import_and_export(self):
+        body = "\n".join(json.dumps(record) for record in self._records()) + "\nnot json\n"
+        response = self.client.post(
+            reverse("api:bulk-import") + "?batch_size=3", body, content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], {"course": 1, "lesson": 1, "slide": 2})
+        self.assertEqual([error["line"] for error in response.data["errors"]], [5, 6, 7, 8])
+
+        course = Course.objects.get(id=10)
+        self.assertEqual(course.slug, "bulk-course")
+        self.assertEqual(course.lesson_count, 1)
+        self.assertEqual(Lesson.objects.get(id=20).slide_count, 2)
+        self.assertEqual(list(course.lessons.values_list("id", flat=True)), [20])
+
+        response = self.client.get(reverse("api:bulk-export"))
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([line["type"] for line in lines], ["course", "lesson", "slide", "slide"])
+        self.assertEqual(lines[1]["course"], [10])
+
+    def test_import_lessons_without_ids(self):
+        records = [{"type": "course", "id": 10, "title": "Bulk Course", "description": "d"}]
+        records += [
+            {"type": "lesson", "slug": "l%d" % number, "title": "Lesson", "item": 1, "position": number, "course": [10]}
+            for number in range(3)
+        ]
+        body = "\n".join(json.dumps(record) for record in records)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("api:bulk-import"), body, content_type="application/x-ndjson")
+        self.assertEqual(response.data["created"], {"course": 1, "lesson": 3, "slide": 0})
+        course = Course.objects.get(id=10)
+        self.assertEqual(course.lesson_count, 3)
+        self.assertEqual(list(course.lessons.order_by("course_links__position").values_list("slug", flat=True)), ["l0", "l1", "l2"])
+
+        #Backends returning ids insert the lessons with one statement
+        inserts = [query for query in queries if query["sql"].startswith('INSERT INTO "courses_lesson"')]
+        self.assertEqual(len(inserts), 1 if connection.features.can_return_rows_from_bulk_insert else 3)
+
+    def test_conflicts_are_reported_per_line(self):
+        bulk_create = Slide.objects.bulk_create
+
+        def racing_bulk_create(slides, **kwargs):
+            #Another writer took the second position after the check
+            if any(slide.position == 2 for slide in slides):
+                raise IntegrityError("UNIQUE constraint failed")
+            return bulk_create(slides, **kwargs)
+
+        body = "\n".join(json.dumps(record) for record in self._records()[:4])
+        with mock.patch.object(Slide.objects, "bulk_create", side_effect=racing_bulk_create):
+            response = self.client.post(reverse("api:bulk-import"), body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], {"course": 1, "lesson": 1, "slide": 1})
+        self.assertEqual(response.data["errors"], [{"line": 4, "errors": {"non_field_errors": ["Conflicts with an existing row"]}}])
+        self.assertEqual(list(Slide.objects.values_list("position", flat=True)), [1])
+
+    def test_sequences_follow_imported_ids(self):
+        body = "\n".join(json.dumps(record) for record in self._records()[:3])
+        with mock.patch.object(connection.ops, "sequence_reset_sql", return_value=[]) as reset:
+            self.client.post(reverse("api:bulk-import"), body, content_type="application/x-ndjson")
+        self.assertEqual([call.args[1] for call in reset.call_args_list], [[Course], [Lesson]])
+        #The next row without an id gets a fresh one
+        self.assertGreater(Course.objects.create(title="Next").id, 10)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as source:
+            source.writelines(json.dumps(record) + "\n" for record in self._records()[:4])
+        try:
+            call_command("import_courses", source.name, stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(source.name)
+        self.assertEqual(Slide.objects.filter(lesson_id=20).count(), 2)
+
+        output = StringIO()
+        call_command("export_courses", stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
+
+class SearchTests(APITestCase):
+    """
+    Testing the full-text search index
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        self.client.force_authenticate(user)
+        cache.clear()
+
+        self.python = Course.objects.create(title="Python basics", description="Learn programming")
+        self.cooking = Course.objects.create(title="Cooking", description="Pasta and python-free recipes")
+        self.lesson = Lesson.objects.create(slug="loops", title="Loops", item=1, position=1)
+        Slide.objects.create(title="For", slug="for", lesson=self.lesson, position=1, content="Iterating in Python")
+
+    def test_search_endpoint(self):
+        response = self.client.get(reverse("api:search") + "?q=pyth")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = [(item["type"], item["id"]) for item in response.data["results"]]
+        #Title matches rank first
+        self.assertEqual(results[0], ("course", self.python.id))
+        self.assertEqual(set(results), {("course", self.python.id), ("course", self.cooking.id), ("lesson", self.lesson.id)})
+
+        response = self.client.get(reverse("api:search") + "?q=python&type=lesson")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.lesson.id])
+
+        response = self.client.get(reverse("api:search") + "?q=python&limit=1")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNotNone(response.data["next"])
+        for query in ("limit=0", "offset=-1"):
+            response = self.client.get(reverse("api:search") + "?q=python&" + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_incremental_updates(self):
+        self.python.title = "Rust basics"
+        self.python.description = ""
+        self.python.save()
+        Slide.objects.filter(lesson=self.lesson).delete()
+        self.cooking.delete()
+
+        response = self.client.get(reverse("api:search") + "?q=python")
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.get(reverse("api:course-list") + "?search=rust")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.python.id])
+
+    def test_rebuild_command(self):
+        call_command("rebuild_search_index", stdout=StringIO())
+        response = self.client.get(reverse("api:lesson-list") + "?search=iterating")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.lesson.id])
+
+class SparseFieldsetTests(APITestCase):
+    """
+    Testing field selection on list endpoints
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        self.client.force_authenticate(user)
+        cache.clear()
+        self.lesson = Lesson.objects.create(slug="intro", title="Intro", item=1, position=1)
+        Slide.objects.create(title="First", slug="first", lesson=self.lesson, position=1, content="x" * 1000)
+
+    def test_fields_param(self):
+        url = reverse("api:slide-list", kwargs={"id": self.lesson.id}) + "?fields=id,title"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {"id", "title"})
+        self.assertFalse(any('"content"' in query["sql"] for query in queries))
+
+        response = self.client.get(reverse("api:course-list") + "?fields=id,price")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compact_serializers(self):
+        response = self.client.get(reverse("api:slide-list", kwargs={"id": self.lesson.id}) + "?compact=true")
+        self.assertNotIn("content", response.data[0])
+
+        Course.objects.create(title="Course", description="Long description")
+        response = self.client.get(reverse("api:course-list") + "?compact=1")
+        self.assertEqual(set(response.data["results"][0]), {"id", "slug", "title", "category", "lesson_count"})
+
+class CounterTests(TestCase):
+    """
+    Testing the denormalized lesson and slide counters
+    """
+    def setUp(self):
+        self.course = Course.objects.create(title="Course")
+        self.other = Course.objects.create(title="Other")
+        self.lesson = Lesson.objects.create(slug="one", title="One", item=1, position=1)
+        self.second = Lesson.objects.create(slug="two", title="Two", item=2, position=2)
+
+    def _counts(self):
+        return list(Course.objects.order_by('id').values_list('lesson_count', flat=True))
+
+    def test_lesson_count(self):
+        self.lesson.course.add(self.course, self.other)
+        self.course.lessons.add(self.second)
+        self.assertEqual(self._counts(), [2, 1])
+
+        #Adding an existing link does not count twice
+        self.lesson.course.add(self.course)
+        self.assertEqual(self._counts(), [2, 1])
+
+        self.lesson.course.remove(self.other)
+        self.assertEqual(self._counts(), [2, 0])
+        self.course.lessons.clear()
+        self.assertEqual(self._counts(), [0, 0])
+
+        self.second.course.add(self.course, self.other)
+        self.second.course.clear()
+        self.assertEqual(self._counts(), [0, 0])
+
+        self.lesson.course.add(self.course)
+        self.lesson.delete()
+        self.assertEqual(self._counts(), [0, 0])
+
+    def test_slide_count(self):
+        slide = Slide.objects.create(title="S", slug="s", lesson=self.lesson, position=1, content="")
+        Slide.objects.create(title="T", slug="t", lesson=self.lesson, position=2, content="")
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.slide_count, 2)
+
+        slide.delete()
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.slide_count, 1)
+
+    def test_stale_instances(self):
+        #Saving copies loaded before the counters moved keeps the counts
+        stale_course = Course.objects.get(id=self.course.id)
+        stale_lesson = Lesson.objects.get(id=self.lesson.id)
+        self.lesson.course.add(self.course)
+        Slide.objects.create(title="S", slug="s", lesson=self.lesson, position=1, content="")
+
+        stale_course.title = "Renamed"
+        stale_course.save()
+        stale_lesson.title = "Renamed"
+        stale_lesson.save()
+        self.assertEqual(self._counts(), [1, 0])
+        self.lesson.refresh_from_db()
+        self.assertEqual((self.lesson.title, self.lesson.slide_count), ("Renamed", 1))
+        self.assertEqual(Course.objects.get(id=self.course.id).slug, "renamed")
+
+    def test_reconcile_command(self):
+        self.lesson.course.add(self.course)
+        Slide.objects.create(title="S", slug="s", lesson=self.lesson, position=1, content="")
+        Course.objects.update(lesson_count=7)
+        Lesson.objects.update(slide_count=7)
+
+        output = StringIO()
+        call_command("reconcile_counters", stdout=output)
+        self.assertIn("Fixed 2 courses and 2 lessons", output.getvalue())
+        self.assertEqual(self._counts(), [1, 0])
+        self.assertEqual(list(Lesson.objects.order_by('id').values_list('slide_count', flat=True)), [1, 0])
+
+# TODO test cat / course / lesson / slide creation
+
+class AsyncReadTests(TestCase):
+    """
+    Testing the async read endpoints
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        access = str(RoleRefreshToken.for_user(user).access_token)
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {access}")
+        cache.clear()
+        self.course = Course.objects.create(title="Course")
+        self.lesson = Lesson.objects.create(slug="intro", title="Intro", item=1, position=1)
+        self.lesson.course.add(self.course)
+        Slide.objects.create(title="First", slug="first", lesson=self.lesson, position=1, content="Content")
+
+    def test_matches_sync_views(self):
+        Category.objects.create(name="Music", slug="music")
+        for name, kwargs, fields in (
+            ("cat-list", {}, "id,name"),
+            ("course-list", {}, "id,title"),
+            ("lesson-list", {}, "id,title"),
+            ("slide-list", {"id": self.lesson.id}, "id,title"),
+        ):
+            sync_response = self.client.get(reverse("api:%s" % name, kwargs=kwargs) + "?fields=" + fields)
+            async_response = self.client.get(reverse("api:async-%s" % name, kwargs=kwargs) + "?fields=" + fields)
+            self.assertEqual(sync_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), json.loads(json.dumps(sync_response.data)))
+
+    def test_authentication(self):
+        response = Client().get(reverse("api:async-course-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = Client(HTTP_AUTHORIZATION="Bearer invalid").get(reverse("api:async-course-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse("api:async-course-list"), {})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_cached_response(self):
+        url = reverse("api:async-slide-list", kwargs={"id": self.lesson.id})
+        response = self.client.get(url)
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()[0]["title"], "First")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalid_params(self):
+        response = self.client.get(reverse("api:async-course-list") + "?fields=price")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.json())
+
+@override_settings(PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}})
+class BenchmarkTests(TestCase):
+    """
+    Testing the catalogue generator and benchmark driver
+    """
+    def setUp(self):
+        cache.clear()
+
+    def _snapshot(self):
+        return (
+            list(Category.objects.order_by('id').values_list('name', 'path')),
+            list(Lesson.objects.order_by('id').values_list('title', 'slide_count')),
+            list(Lesson.course.through.objects.order_by('lesson_id', 'course_id').values_list('lesson_id', 'course_id')),
+        )
+
+    def test_generate_catalogue(self):
+        sizes = generate_catalogue(seed=7, categories=12, depth=4, courses=5, lessons=8, slides=2)
+        self.assertEqual(sizes, {"categories": 12, "course": 5, "lesson": 8, "slide": 16})
+        self.assertEqual(Category.objects.filter(depth__gte=4).count(), 0)
+        self.assertTrue(Category.objects.filter(depth__gt=0).exists())
+        self.assertEqual(set(Lesson.objects.values_list('slide_count', flat=True)), {2})
+        snapshot = self._snapshot()
+
+        #The same seed builds the same catalogue
+        for model in (Slide, Lesson, Course, Category):
+            model.objects.all().delete()
+        generate_catalogue(seed=7, categories=12, depth=4, courses=5, lessons=8, slides=2)
+        self.assertEqual(self._snapshot(), snapshot)
+
+    def test_run_benchmark(self):
+        generate_catalogue(seed=1, categories=5, depth=3, courses=3, lessons=4, slides=2)
+        results = run_benchmark(create_context(seed=1), iterations=2)
+        self.assertEqual(set(results), {scenario.name for scenario in SCENARIOS})
+        for result in results.values():
+            self.assertEqual(result["requests"], 2)
+            self.assertGreater(result["throughput"], 0)
+            self.assertLessEqual(result["p50"], result["p99"])
+
+    @override_settings(THROTTLE_RATES={
+        'login': {'ip': '2/min', 'email': '2/min'},
+        'registration': {'ip': '1/hour', 'email': '1/hour'},
+    })
+    def test_ignores_throttling(self):
+        get_store().clear()
+        self.addCleanup(get_store().clear)
+        generate_catalogue(seed=1, categories=2, depth=2, courses=1, lessons=1, slides=1)
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in ("login", "signup")]
+        results = run_benchmark(create_context(seed=1), iterations=5, scenarios=scenarios)
+        self.assertEqual({name: result["requests"] for name, result in results.items()}, {"login": 5, "signup": 5})
+        #The configured rates apply again afterwards
+        data = {"email": "student@benchmark.test", "password": "wrong"}
+        statuses = [self.client.post(reverse("core:login"), data, content_type="application/json").status_code for _ in range(3)]
+        self.assertEqual(statuses, [status.HTTP_401_UNAUTHORIZED] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_benchmark_serialization(self):
+        with self.assertNumQueries(0):
+            results = benchmark_serialization(count=20, rounds=1)
+        self.assertGreater(results["serializer"]["serialize"], 0)
+        self.assertIn("json", results)
+        for name, result in results.items():
+            if name != "serializer":
+                self.assertGreater(result["bytes"], 0)
+                self.assertGreater(result["render"], 0)
+
+    def test_compare(self):
+        baseline = {"scenarios": {"course-list": {"queries": 2, "p95": 10.0, "throughput": 100.0}}}
+        results = {"scenarios": {
+            "course-list": {"queries": 2, "p95": 11.0, "throughput": 90.0},
+            "new-route": {"queries": 9, "p95": 99.0, "throughput": 1.0},
+        }}
+        self.assertEqual(compare(results, baseline), [])
+
+        results["scenarios"]["course-list"] = {"queries": 3, "p95": 20.0, "throughput": 50.0}
+        self.assertEqual(len(compare(results, baseline)), 3)
+
+class PositionTests(APITestCase):
+    """
+    Testing gap-based positions and bulk reordering
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        self.client.force_authenticate(user)
+        cache.clear()
+        self.lesson = Lesson.objects.create(slug="intro", title="Intro", item=1, position=1)
+        self._create_url = reverse("api:slide-create", kwargs={"id": self.lesson.id})
+
+    def _create_slide(self, title, query=""):
+        data = {"title": title, "slug": title.lower(), "content": title}
+        response = self.client.post(self._create_url + query, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _titles(self):
+        return list(Slide.objects.filter(lesson=self.lesson).order_by("position").values_list("title", flat=True))
+
+    def test_append_and_insert(self):
+        first = self._create_slide("First")
+        last = self._create_slide("Last")
+        self.assertEqual((first["position"], last["position"]), (GAP, 2 * GAP))
+
+        middle = self._create_slide("Middle", "?after=%d" % first["id"])
+        self.assertEqual(middle["position"], GAP + GAP // 2)
+        self._create_slide("Front", "?after=")
+        self.assertEqual(self._titles(), ["Front", "First", "Middle", "Last"])
+
+        response = self.client.post(self._create_url + "?after=999", {"title": "X", "slug": "x", "content": ""}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_append_locks_the_lesson(self):
+        with mock.patch.object(Lesson.objects, "select_for_update", wraps=Lesson.objects.select_for_update) as lock:
+            self._create_slide("First")
+        lock.assert_called_once_with()
+        data = {"title": "Placed", "slug": "placed", "content": "", "position": 5}
+        with mock.patch.object(Lesson.objects, "select_for_update", wraps=Lesson.objects.select_for_update) as lock:
+            self.client.post(self._create_url, data, format="json")
+        lock.assert_not_called()
+
+    def test_rebalance_when_gap_is_used_up(self):
+        first = Slide.objects.create(title="First", slug="first", lesson=self.lesson, position=1, content="")
+        Slide.objects.create(title="Second", slug="second", lesson=self.lesson, position=2, content="")
+        self._create_slide("Between", "?after=%d" % first.id)
+        self.assertEqual(self._titles(), ["First", "Between", "Second"])
+        positions = list(Slide.objects.filter(lesson=self.lesson).order_by("position").values_list("position", flat=True))
+        self.assertEqual(positions, [GAP, GAP + GAP // 2, 2 * GAP])
+
+    def test_reorder_slides(self):
+        ids = [self._create_slide(title)["id"] for title in ("A", "B", "C", "D")]
+        url = reverse("api:slide-reorder", kwargs={"id": self.lesson.id})
+        response = self.client.post(url, {"order": [ids[3], ids[2], ids[1], ids[0]]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["id"] for row in response.data], [ids[3], ids[2], ids[1], ids[0]])
+        self.assertEqual(self._titles(), ["D", "C", "B", "A"])
+
+        #Listing a subset only moves those rows among their own positions
+        response = self.client.post(url, {"order": [ids[0], ids[3]]}, format="json")
+        self.assertEqual(self._titles(), ["A", "C", "B", "D"])
+
+        #The cached slide list follows the new order
+        response = self.client.get(reverse("api:slide-list", kwargs={"id": self.lesson.id}))
+        self.assertEqual([slide["title"] for slide in response.data], ["A", "C", "B", "D"])
+
+        for order in ([ids[0], 999], [ids[0], ids[0]], "abc"):
+            response = self.client.post(url, {"order": order}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reorder_lessons(self):
+        second = Lesson.objects.create(slug="second", title="Second", item=2, position=2)
+        response = self.client.post(reverse("api:lesson-create"), {"slug": "third", "title": "Third", "item": 3}, format="json")
+        self.assertEqual(response.data["position"], 2 + GAP)
+
+        response = self.client.post(reverse("api:lesson-reorder"), {"order": [response.data["id"], second.id, self.lesson.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Lesson.objects.order_by("position").values_list("slug", flat=True)), ["third", "second", "intro"])
+
+class CourseMembershipTests(APITestCase):
+    """
+    Testing per-course lesson positions and the course outline
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        self.client.force_authenticate(user)
+        cache.clear()
+        self.course = Course.objects.create(title="Course")
+        self.other = Course.objects.create(title="Other")
+        self.first = Lesson.objects.create(slug="first", title="First", item=1, position=2)
+        self.second = Lesson.objects.create(slug="second", title="Second", item=2, position=1)
+
+    def _positions(self, course):
+        return list(CourseLesson.objects.filter(course=course).order_by("position").values_list("lesson__slug", "position"))
+
+    def test_links_are_appended(self):
+        self.first.course.add(self.course, self.other)
+        self.course.lessons.add(self.second)
+        self.assertEqual(self._positions(self.course), [("first", GAP), ("second", 2 * GAP)])
+        self.assertEqual(self._positions(self.other), [("first", GAP)])
+
+        #The global lesson position no longer decides the order in a course
+        response = self.client.get(reverse("api:lesson-list") + "?course=%d" % self.course.id)
+        self.assertEqual([lesson["slug"] for lesson in response.data["results"]], ["first", "second"])
+        response = self.client.get(reverse("api:lesson-list") + "?course=%d&page_size=1" % self.course.id)
+        response = self.client.get(response.data["next"])
+        self.assertEqual([lesson["slug"] for lesson in response.data["results"]], ["second"])
+
+        response = self.client.post(
+            reverse("api:lesson-create"), {"slug": "third", "title": "Third", "item": 3, "course": [self.other.id]}, format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["course"], [self.other.id])
+        self.assertEqual(self._positions(self.other), [("first", GAP), ("third", 2 * GAP)])
+
+    def test_outline(self):
+        self.course.lessons.add(self.second, self.first)
+        CourseLesson.objects.filter(lesson=self.first).update(position=1)
+        Slide.objects.create(title="B", slug="b", lesson=self.first, position=2, content="Long content")
+        Slide.objects.create(title="A", slug="a", lesson=self.first, position=1, content="Long content")
+        url = reverse("api:course-outline", kwargs={"id": self.course.id})
+
+        #Served from the stored document with a single read
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data["title"], "Course")
+        self.assertEqual([lesson["slug"] for lesson in data["lessons"]], ["first", "second"])
+        self.assertEqual([slide["title"] for slide in data["lessons"][0]["slides"]], ["A", "B"])
+        self.assertNotIn("content", data["lessons"][0]["slides"][0])
+        self.assertEqual(data["lessons"][1]["slides"], [])
+        self.assertFalse(response["ETag"].startswith("W/"))
+
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), response.content)
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        #The gzipped body is another representation of the same outline
+        self.assertEqual(compressed["ETag"], "W/" + response["ETag"])
+        revalidated = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=compressed["ETag"])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(reverse("api:course-outline", kwargs={"id": self.other.id}))
+        self.assertEqual(json.loads(response.content)["lessons"], [])
+        response = self.client.get(reverse("api:course-outline", kwargs={"id": 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_outline_follows_changes(self):
+        parent = Category.objects.create(name="Parent", slug="parent")
+        child = Category.objects.create(name="Child", slug="child", parent=parent)
+        self.course.category = child
+        self.course.save()
+        self.course.lessons.add(self.first)
+        slide = Slide.objects.create(title="A", slug="a", lesson=self.first, position=1, content="Long content")
+        url = reverse("api:course-outline", kwargs={"id": self.course.id})
+        etag = self.client.get(url)["ETag"]
+
+        def outline():
+            return json.loads(self.client.get(url).content)
+
+        self.assertEqual([category["name"] for category in outline()["category"]], ["Parent", "Child"])
+        parent.name = "Renamed"
+        parent.save()
+        self.assertEqual([category["name"] for category in outline()["category"]], ["Renamed", "Child"])
+        child.parent = None
+        child.save()
+        self.assertEqual([category["name"] for category in outline()["category"]], ["Child"])
+
+        self.first.title = "Renamed lesson"
+        self.first.save()
+        self.assertEqual(outline()["lessons"][0]["title"], "Renamed lesson")
+        self.course.lessons.add(self.second)
+        self.assertEqual([lesson["slug"] for lesson in outline()["lessons"]], ["first", "second"])
+        slide.delete()
+        self.assertEqual(outline()["lessons"][0]["slides"], [])
+        self.second.delete()
+        self.assertEqual([lesson["slug"] for lesson in outline()["lessons"]], ["first"])
+        self.first.course.clear()
+        self.assertEqual(outline()["lessons"], [])
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+        #Outlines lost or never stored are rebuilt
+        Outline.objects.all().delete()
+        output = StringIO()
+        call_command("rebuild_outlines", stdout=output)
+        self.assertIn("Rebuilt 2 outlines", output.getvalue())
+        course_id = self.course.id
+        self.course.delete()
+        self.assertFalse(Outline.objects.filter(course_id=course_id).exists())
+
+    def test_reorder_in_course(self):
+        self.course.lessons.add(self.first, self.second)
+        self.other.lessons.add(self.first, self.second)
+        url = reverse("api:lesson-reorder") + "?course=%d" % self.course.id
+        outline_url = reverse("api:course-outline", kwargs={"id": self.course.id})
+        self.client.get(reverse("api:lesson-list") + "?course=%d" % self.course.id)
+
+        response = self.client.post(url, {"order": [self.second.id, self.first.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": self.second.id, "position": GAP}, {"id": self.first.id, "position": 2 * GAP}])
+        self.assertEqual(self._positions(self.course), [("second", GAP), ("first", 2 * GAP)])
+        #Other courses and the global lesson order are left alone
+        self.assertEqual(self._positions(self.other), [("first", GAP), ("second", 2 * GAP)])
+        self.assertEqual(list(Lesson.objects.order_by("position").values_list("slug", flat=True)), ["second", "first"])
+
+        response = self.client.get(reverse("api:lesson-list") + "?course=%d" % self.course.id)
+        self.assertEqual([lesson["slug"] for lesson in response.data["results"]], ["second", "first"])
+        outline = json.loads(self.client.get(outline_url).content)
+        self.assertEqual([lesson["slug"] for lesson in outline["lessons"]], ["second", "first"])
+
+        third = Lesson.objects.create(slug="third", title="Third", item=3, position=3)
+        response = self.client.post(url, {"order": [third.id, self.first.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse("api:lesson-reorder") + "?course=999", {"order": [self.first.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_migrate_lesson_links(self):
+        self.course.lessons.add(self.first, self.second)
+        CourseLesson.objects.update(position=0)
+        output = StringIO()
+        call_command("migrate_lesson_links", stdout=output)
+        self.assertIn("Renumbered 2 course-lesson links", output.getvalue())
+        #Ties are broken by the global lesson position
+        self.assertEqual(self._positions(self.course), [("second", GAP), ("first", 2 * GAP)])
+
+@override_settings(COMPRESSION_MIN_SIZE=100, COMPRESSION_ENCODINGS=("gzip",))
+class CompressedPayloadTests(APITestCase):
+    """
+    Testing compressed bodies kept next to cached responses
+    """
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="John",
+            last_name="Lennon",
+            is_student=True,
+            is_teacher=False,
+        )
+        self.client.force_authenticate(user)
+        cache.clear()
+        self.lesson = Lesson.objects.create(slug="lesson", title="Lesson", item=1, position=1)
+        for position in range(1, 4):
+            Slide.objects.create(title="Slide", slug="slide", lesson=self.lesson, position=position, content="Long content " * 100)
+        self.url = reverse("api:slide-list", kwargs={"id": self.lesson.id})
+
+    def test_slide_list(self):
+        plain = self.client.get(self.url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        #Served from the stored bytes without serializing or compressing
+        with self.assertNumQueries(0), mock.patch.object(compression, "compress") as compress:
+            cached = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        compress.assert_not_called()
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["Content-Encoding"], "gzip")
+        self.assertEqual(cached["ETag"], response["ETag"])
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        #A change moves the scope to a new version
+        Slide.objects.filter(position=1).first().delete()
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 2)
+
+class OwnershipTests(APITestCase):
+    """
+    Testing course and lesson ownership checks
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.owner, self.other = [
+            User.objects.create_user(
+                email="%s@example.com" % name,
+                password=name,
+                first_name=name,
+                last_name="Teacher",
+                is_student=False,
+                is_teacher=True,
+            )
+            for name in ("owner", "other")
+        ]
+        cache.clear()
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(reverse("api:course-create"), {"title": "Owned"}, format="json")
+        self.course = Course.objects.get(id=response.data["id"])
+        self.lesson = Lesson.objects.create(slug="lesson", title="Lesson", item=1, position=1)
+        self.course.lessons.add(self.lesson)
+        Slide.objects.create(title="A", slug="a", lesson=self.lesson, position=1, content="a")
+        self.slide_url = reverse("api:slide-rud", kwargs={"id": self.lesson.id, "position": 1})
+
+    def test_course_owner(self):
+        self.assertEqual(self.course.owner, self.owner)
+        url = reverse("api:course-rud", kwargs={"id": self.course.id})
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, {"title": "Taken"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.patch(url, {"title": "Renamed", "owner": self.other.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["owner"], self.owner.id)
+
+    def test_lesson_owner(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(self.slide_url, {"title": "Taken"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        data = {"title": "B", "slug": "b", "content": "b"}
+        response = self.client.post(reverse("api:slide-create", kwargs={"id": self.lesson.id}), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.patch(reverse("api:lesson-rud", kwargs={"id": self.lesson.id}), {"title": "Taken"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.slide_url).status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.patch(self.slide_url, {"title": "Renamed"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        #Lessons in no owned course are open to every teacher
+        self.course.lessons.remove(self.lesson)
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(self.slide_url, {"title": "Shared"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_lesson_create_and_slide_list(self):
+        data = {"slug": "second", "title": "Second", "item": 2, "course": [self.course.id]}
+        slides_url = reverse("api:slide-list", kwargs={"id": self.lesson.id})
+        self.client.force_authenticate(self.other)
+        response = self.client.post(reverse("api:lesson-create"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(slides_url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(reverse("api:lesson-create"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(slides_url).status_code, status.HTTP_200_OK)
+
+    def test_lesson_reorder(self):
+        second = Lesson.objects.create(slug="second", title="Second", item=2, position=2)
+        url = reverse("api:lesson-reorder")
+        self.client.force_authenticate(self.other)
+        response = self.client.post(url, {"order": [second.id, self.lesson.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(list(Lesson.objects.order_by("position").values_list("slug", flat=True)), ["lesson", "second"])
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(url, {"order": [second.id, self.lesson.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Lesson.objects.order_by("position").values_list("slug", flat=True)), ["second", "lesson"])
+
+    def test_checks_are_cached(self):
+        self.client.patch(self.slide_url, {"title": "Warm"}, format="json")
+        view = mock.Mock(kwargs={"id": self.lesson.id})
+        request = APIRequestFactory().patch(self.slide_url)
+        request.user = self.owner
+        with self.assertNumQueries(0):
+            self.assertTrue(IsLessonOwner().has_permission(request, view))
+            self.assertTrue(IsCourseOwner().has_object_permission(request, view, self.course))
+        request.user = self.other
+        with self.assertNumQueries(0):
+            self.assertFalse(IsLessonOwner().has_permission(request, view))
+
+class MultiGetTests(APITestCase):
+    """
+    Testing ?ids= multi-get and batch requests
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.teacher = User.objects.create_user(
+            email="teacher@example.com",
+            password="teacher",
+            first_name="John",
+            last_name="Lennon",
+            is_student=False,
+            is_teacher=True,
+        )
+        cache.clear()
+        self.client.force_authenticate(self.teacher)
+        self.courses = [Course.objects.create(title="Course %d" % number) for number in range(3)]
+        self.lessons = [Lesson.objects.create(slug="lesson-%d" % number, title="Lesson %d" % number, item=1, position=number) for number in range(3)]
+
+    def test_ids_param(self):
+        ids = [self.courses[2].id, self.courses[0].id, 999]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("api:course-list") + "?ids=%s&fields=id,title" % ",".join(map(str, ids)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["id"] for row in response.data["results"]], ids[:2])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(reverse("api:lesson-list") + "?ids=%d" % self.lessons[1].id)
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.lessons[1].id])
+        response = self.client.get(reverse("api:lesson-list") + "?ids=1,a")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch(self):
+        paths = [reverse("api:course-rud", kwargs={"id": course.id}) for course in self.courses]
+        paths += ["lesson/%d/" % lesson.id for lesson in self.lessons]
+        paths += ["course/999/", "nowhere/", "lesson/?ids=%d&fields=id" % self.lessons[0].id]
+        data = {"requests": [{"path": path} for path in paths] + [{"path": "course/new", "method": "POST"}]}
+
+        #One query per model and per many-to-many field, one for the list
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("api:batch"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        responses = response.data["responses"]
+        self.assertEqual([item["path"] for item in responses[:-1]], paths)
+        self.assertEqual([item["body"]["title"] for item in responses[:3]], ["Course 0", "Course 1", "Course 2"])
+        self.assertEqual([item["body"]["id"] for item in responses[3:6]], [lesson.id for lesson in self.lessons])
+        self.assertEqual([item["status"] for item in responses[6:]], [404, 404, 200, 405])
+        self.assertEqual(responses[8]["body"]["results"], [{"id": self.lessons[0].id}])
+
+    def test_batch_permissions(self):
+        User = get_user_model()
+        student = User.objects.create_user(
+            email="student@example.com",
+            password="student",
+            first_name="Freddy",
+            last_name="Mercury",
+            is_student=True,
+            is_teacher=False,
+        )
+        self.client.force_authenticate(student)
+        data = {"requests": [{"path": "course/%d/" % self.courses[0].id}, {"path": "course/?ids=%d" % self.courses[0].id}]}
+        response = self.client.post(reverse("api:batch"), data, format="json")
+        self.assertEqual([item["status"] for item in response.data["responses"]], [403, 200])
+
+        response = self.client.post(reverse("api:batch"), {"requests": "course/1/"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class BulkWriteTests(APITestCase):
+    """
+    Testing bulk PATCH and DELETE
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.owner, self.other = [
+            User.objects.create_user(
+                email="%s@example.com" % name,
+                password=name,
+                first_name=name,
+                last_name="Teacher",
+                is_student=False,
+                is_teacher=True,
+            )
+            for name in ("owner", "other")
+        ]
+        cache.clear()
+        self.client.force_authenticate(self.owner)
+        self.category = Category.objects.create(name="Music", slug="music")
+        self.courses = [Course.objects.create(title="Course %d" % number, category=self.category, owner=self.owner) for number in range(3)]
+
+    def test_patch_filter(self):
+        url = reverse("api:course-bulk")
+        data = {"filter": {"category": self.category.id}, "data": {"title": "Retired course"}}
+        response = self.client.patch(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": 3, "ids": sorted(course.id for course in self.courses), "missing": []})
+        self.assertEqual(set(Course.objects.values_list("slug", flat=True)), {"retired-course"})
+        #Outlines follow without save()
+        self.assertEqual(json.loads(gzip.decompress(Outline.objects.get(course=self.courses[0]).content))["title"], "Retired course")
+
+        response = self.client.patch(url, {"filter": {"price": 1}, "data": {"title": "X"}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {"ids": [self.courses[0].id], "data": {"lesson_count": 5}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_patch_rows(self):
+        rows = [{"id": course.id, "title": "Renamed %d" % number} for number, course in enumerate(self.courses)]
+        response = self.client.patch(reverse("api:course-bulk"), {"rows": rows + [{"id": 999, "title": "Gone"}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["missing"], [999])
+        self.assertEqual(list(Course.objects.order_by("id").values_list("slug", flat=True)), ["renamed-0", "renamed-1", "renamed-2"])
+
+        response = self.client.patch(reverse("api:course-bulk"), {"rows": [{"id": self.courses[0].id, "title": ["x"]}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ownership(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(reverse("api:course-bulk"), {"ids": [self.courses[0].id], "data": {"title": "Taken"}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.delete(reverse("api:course-bulk"), {"filter": {"owner": self.owner.id}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Course.objects.count(), 3)
+
+    def test_delete(self):
+        lesson = Lesson.objects.create(slug="lesson", title="Lesson", item=1, position=1)
+        for position in range(1, 4):
+            Slide.objects.create(title="Slide", slug="slide", lesson=lesson, position=position, content="x")
+        url = reverse("api:slide-bulk", kwargs={"id": lesson.id})
+        response = self.client.delete(url, {"ids": [1000]}, format="json")
+        self.assertEqual(response.data, {"deleted": {}, "ids": [], "missing": [1000]})
+        response = self.client.delete(url, {"filter": {}}, format="json")
+        self.assertEqual(response.data["deleted"], {"courses.Slide": 3})
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.slide_count, 0)
+
+        child = Category.objects.create(name="Jazz", slug="jazz", parent=self.category)
+        grandchild = Category.objects.create(name="Bebop", slug="bebop", parent=child)
+        response = self.client.delete(reverse("api:cat-bulk"), {"ids": [self.category.id, child.id]}, format="json")
+        self.assertEqual(response.data["deleted"]["courses.Category"], 2)
+        grandchild.refresh_from_db()
+        self.assertEqual((grandchild.path, grandchild.depth), ("%d/" % grandchild.id, 0))
@@ -1,9 +1,12 @@
 from django.urls import path
 
-from .views import CategoryList, CategoryCreate, CategoryRetrieveUpdateDestroy
-from .views import CourseList, CourseCreate, CourseRetrieveUpdateDestroy
-from .views import LessonList, LessonCreate, LessonRetrieveUpdateDestroy
-from .views import SlideList, SlideCreate, SlideRetrieveUpdateDestroy
+from .views import CategoryList, CategoryCreate, CategoryRetrieveUpdateDestroy, CategoryBulk
+from .views import CategoryDescendants, CategoryAncestors, CategoryCourses
+from .views import CourseList, CourseCreate, CourseRetrieveUpdateDestroy, CourseOutline, CourseBulk
+from .views import LessonList, LessonCreate, LessonRetrieveUpdateDestroy, LessonReorder, LessonBulk
+from .views import SlideList, SlideCreate, SlideRetrieveUpdateDestroy, SlideReorder, SlideBulk
+from .views import Search, Batch, BulkImport, BulkExport
+from .async_views import AsyncCategoryList, AsyncCourseList, AsyncLessonList, AsyncSlideList
 
 app_name = 'courses'
 urlpatterns = [
@@ -11,19 +14,45 @@ urlpatterns = [
     path('cat/', CategoryList.as_view(), name="cat-list"),
     path('cat/new', CategoryCreate.as_view(), name="cat-create"),
     path('cat/<int:id>/', CategoryRetrieveUpdateDestroy.as_view(), name="cat-rud"),
+    path('cat/bulk', CategoryBulk.as_view(), name="cat-bulk"),
+    path('cat/<int:id>/descendants/', CategoryDescendants.as_view(), name="cat-descendants"),
+    path('cat/<int:id>/ancestors/', CategoryAncestors.as_view(), name="cat-ancestors"),
+    path('cat/<int:id>/courses/', CategoryCourses.as_view(), name="cat-courses"),
 
     #Courses
     path('course/', CourseList.as_view(), name="course-list"),
     path('course/new', CourseCreate.as_view(), name="course-create"),
     path('course/<int:id>/', CourseRetrieveUpdateDestroy.as_view(), name="course-rud"),
+    path('course/bulk', CourseBulk.as_view(), name="course-bulk"),
+    path('course/<int:id>/outline/', CourseOutline.as_view(), name="course-outline"),
 
     #Lessons
     path('lesson/', LessonList.as_view(), name="lesson-list"),
     path('lesson/new', LessonCreate.as_view(), name="lesson-create"),
     path('lesson/<int:id>/', LessonRetrieveUpdateDestroy.as_view(), name="lesson-rud"),
+    path('lesson/reorder', LessonReorder.as_view(), name="lesson-reorder"),
+    path('lesson/bulk', LessonBulk.as_view(), name="lesson-bulk"),
 
     #Slides
     path('lesson/<int:id>/slides/', SlideList.as_view(), name="slide-list"),
     path('lesson/<int:id>/slides/new', SlideCreate.as_view(), name="slide-create"),
     path('lesson/<int:id>/slides/<int:position>/', SlideRetrieveUpdateDestroy.as_view(), name="slide-rud"),
+    path('lesson/<int:id>/slides/reorder', SlideReorder.as_view(), name="slide-reorder"),
+    path('lesson/<int:id>/slides/bulk', SlideBulk.as_view(), name="slide-bulk"),
+
+    #Search
+    path('search/', Search.as_view(), name="search"),
+
+    #Batch
+    path('batch/', Batch.as_view(), name="batch"),
+
+    #Bulk
+    path('bulk/import', BulkImport.as_view(), name="bulk-import"),
+    path('bulk/export', BulkExport.as_view(), name="bulk-export"),
+
+    #Async reads
+    path('async/cat/', AsyncCategoryList.as_view(), name="async-cat-list"),
+    path('async/course/', AsyncCourseList.as_view(), name="async-course-list"),
+    path('async/lesson/', AsyncLessonList.as_view(), name="async-lesson-list"),
+    path('async/lesson/<int:id>/slides/', AsyncSlideList.as_view(), name="async-slide-list"),
 ]
\ No newline at end of file
@@ -1,39 +1,185 @@
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework import status
 
-from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveUpdateDestroyAPIView
+from collections import Counter
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import slugify
+from rest_framework.views import APIView
+from rest_framework.generics import GenericAPIView, ListAPIView, CreateAPIView, RetrieveUpdateDestroyAPIView
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from .models import Category, Course, Lesson, Slide
+from .batch import BatchReader
+from .bulk import BulkImporter, NDJSONParser, export_records
+from . import outlines
+from .cache import CachedResponseMixin, etag_matches
+from .models import Category, Course, CourseLesson, Lesson, Slide
+from .pagination import KeysetPagination
+from .permissions import IsCourseOwner, IsLessonOwner, IsLessonReader, get_owners_by_lesson, may_edit
+from .positions import append_position, insert_position, reorder
+from .search import FullTextSearchFilter, get_backend, match_terms, KINDS
 from .serializers import CategorySerializer, CourseSerializer, LessonSerializer, SlideSerializer
+from .serializers import CourseListSerializer, LessonListSerializer, SlideListSerializer
+from .signals import bulk_changed
 
-from core.permissions import IsStudent, IsTeacher
+from core import compression
+from core.db import ReplicaReadMixin
+from core.permissions import IsTeacher
+from core.roles import get_resolver
 from rest_framework.permissions import IsAuthenticated
 
+def is_id_list(value):
+    return isinstance(value, list) and all(isinstance(pk, int) and not isinstance(pk, bool) for pk in value) \
+        and len(set(value)) == len(value)
+
+class SparseFieldsetMixin:
+    """
+    Lets list views return a subset of fields with `?fields=id,title`, or
+    the compact `list_serializer_class` with `?compact=true`. Only the
+    columns behind the selected fields are loaded from the database.
+    """
+    fields_query_param = 'fields'
+    compact_query_param = 'compact'
+    list_serializer_class = None
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            value = self.request.query_params.get(self.fields_query_param, '')
+            fields = [name.strip() for name in value.split(',') if name.strip()]
+            unknown = set(fields) - set(self.get_serializer_class()().fields)
+            if unknown:
+                raise ValidationError({ self.fields_query_param: 'Unknown fields: %s' % ', '.join(sorted(unknown)) })
+            self._requested_fields = fields
+        return self._requested_fields
+
+    def get_serializer_class(self):
+        compact = self.request.query_params.get(self.compact_query_param, '').lower() in ('1', 'true')
+        if compact and self.list_serializer_class is not None:
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields() or list(self.get_serializer_class()().fields)
+
+        columns, prefetch = set(), []
+        for name in fields:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.many_to_many:
+                prefetch.append(name)
+            elif field.concrete:
+                columns.add(name)
+        #Keyset pagination reads the ordering columns from every row
+        columns.update(name.lstrip('-') for name in queryset.query.order_by)
+        return queryset.only('id', *columns).prefetch_related(*prefetch)
+
+class MultiGetMixin:
+    """
+    Lets list views return the rows of `?ids=3,1,2` in that order, read
+    with one `id IN (...)` query and not paginated. Ids without a row are
+    left out.
+    """
+    ids_query_param = 'ids'
+    max_ids = 100
+
+    def get_requested_ids(self):
+        value = self.request.query_params.get(self.ids_query_param)
+        if value is None:
+            return None
+        try:
+            ids = [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise ValidationError({ self.ids_query_param: 'Must be a comma separated list of ids' })
+        if len(ids) > self.max_ids:
+            raise ValidationError({ self.ids_query_param: 'At most %d ids' % self.max_ids })
+        return list(dict.fromkeys(ids))
+
+    def list(self, request, *args, **kwargs):
+        ids = self.get_requested_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        rows = self.filter_queryset(self.get_queryset()).in_bulk(ids)
+        data = self.get_serializer([rows[pk] for pk in ids if pk in rows], many=True).data
+        if self.paginator is None:
+            return Response(data)
+        #Same envelope as a single page
+        return Response({ 'next': None, 'previous': None, 'results': data })
+
+
 #------------------------------Categories
-class CategoryList(ListAPIView):
-    queryset = Category.objects.all().order_by('slug')
+class CategoryList(ReplicaReadMixin, MultiGetMixin, SparseFieldsetMixin, ListAPIView):
+    queryset = Category.objects.all().order_by('slug', 'id')
     serializer_class = CategorySerializer
+    pagination_class = KeysetPagination
 
 class CategoryCreate(CreateAPIView):
     permission_classes = (IsAuthenticated, IsTeacher)
     serializer_class = CategorySerializer
 
-class CategoryRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
+class CategoryRetrieveUpdateDestroy(ReplicaReadMixin, RetrieveUpdateDestroyAPIView):
     permission_classes = (IsAuthenticated, IsTeacher)
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'id'
 
+class CategoryTreeMixin:
+    """
+    Resolves the materialized path of the category in the URL
+    """
+    def get_category_path(self):
+        category = get_object_or_404(Category.objects.only('path'), id=self.kwargs.get('id'))
+        return category.path
+
+class CategoryDescendants(ReplicaReadMixin, CategoryTreeMixin, ListAPIView):
+    serializer_class = CategorySerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return Category.objects.subtree(self.get_category_path()).order_by('path', 'id')
+
+class CategoryAncestors(ReplicaReadMixin, CategoryTreeMixin, ListAPIView):
+    serializer_class = CategorySerializer
+
+    def get_queryset(self):
+        return Category.objects.ancestors(self.get_category_path())
+
+class CategoryCourses(ReplicaReadMixin, CategoryTreeMixin, ListAPIView):
+    serializer_class = CourseSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        path = self.get_category_path()
+        categories = Category.objects.subtree(path, include_self=True)
+        return Course.objects.filter(category__in=categories.values('id')).order_by('title', 'id')
+
 
 #-----------------------------Courses
-class CourseList(ListAPIView):
-    queryset = Course.objects.all().order_by('title')
+class CourseList(ReplicaReadMixin, MultiGetMixin, SparseFieldsetMixin, ListAPIView):
+    queryset = Course.objects.all().order_by('title', 'id')
     serializer_class = CourseSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    list_serializer_class = CourseListSerializer
+    pagination_class = KeysetPagination
+    filter_backends = (DjangoFilterBackend, FullTextSearchFilter)
     filter_fields = ('category',)
+    search_kind = 'course'
+    #LIKE fallback only, the full-text index matches course titles and
+    #descriptions but not the item numbers of their lessons
     search_fields = ('title', 'lessons__item', )
 
 class CourseCreate(CreateAPIView):
@@ -56,59 +202,530 @@ class CourseCreate(CreateAPIView):
 
         return super().create(request, *args, **kwargs)
 
-class CourseRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
-    permission_classes = (IsAuthenticated, IsTeacher)
+    def perform_create(self, serializer):
+        #Courses created by a teacher are theirs to edit
+        teacher = get_resolver(self.request).has_role('teacher')
+        serializer.save(owner_id=self.request.user.pk if teacher else None)
+
+class CourseRetrieveUpdateDestroy(ReplicaReadMixin, CachedResponseMixin, RetrieveUpdateDestroyAPIView):
+    permission_classes = (IsAuthenticated, IsTeacher, IsCourseOwner)
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     lookup_field = 'id'
 
+    def get_cache_scope(self):
+        return 'course:%s' % self.kwargs.get('id')
+
+
+class CourseOutline(ReplicaReadMixin, APIView):
+    """
+    The precomputed outline of a course: its category path, its lessons in
+    course order and the titles of their slides, read with one primary key
+    lookup. Gzip clients get the stored bytes, other encodings are cached
+    per ETag.
+    """
+    def get(self, request, *args, **kwargs):
+        outline = outlines.get(self.kwargs.get('id'))
+        if outline is None:
+            raise Http404
+        etag, content = outline
+
+        encoding = compression.negotiate(request)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            response = HttpResponseNotModified()
+        elif encoding is not None:
+            response = HttpResponse(outlines.encode(etag, content, encoding), content_type='application/json')
+        else:
+            response = HttpResponse(outlines.decompress(content), content_type='application/json')
+        response['ETag'] = etag
+        if encoding is not None and response.status_code == status.HTTP_200_OK:
+            compression.set_encoding(response, encoding)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
 
 #-----------------------------Lessons
-class LessonList(ListAPIView):
-    queryset = Lesson.objects.all().order_by('position')
+class LessonList(ReplicaReadMixin, CachedResponseMixin, MultiGetMixin, SparseFieldsetMixin, ListAPIView):
+    cache_scope = 'lessons'
+    queryset = Lesson.objects.all().order_by('position', 'id')
     serializer_class = LessonSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
-    filter_fields = ('course',)
+    list_serializer_class = LessonListSerializer
+    pagination_class = KeysetPagination
+    filter_backends = (FullTextSearchFilter,)
+    search_kind = 'lesson'
     search_fields = ('title', 'item',)
 
-class LessonCreate(CreateAPIView):
-    permissions = (IsAuthenticated, IsTeacher)
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        course = self.request.query_params.get('course')
+        if not course:
+            return queryset
+        try:
+            course = int(course)
+        except ValueError:
+            raise ValidationError({ 'course': 'Must be an integer' })
+        #Lessons of a course follow their position in that course, read
+        #from the (course, position, lesson) index of the links
+        return queryset.filter(course_links__course_id=course) \
+            .annotate(course_position=F('course_links__position')).order_by('course_position', 'id')
+
+class PositionedMixin:
+    """
+    Creates rows at the end of `get_position_queryset()`, or right after
+    the row whose id is given as ?after=, when no position is sent, and
+    reorders them in bulk
+    """
+    unique_positions = False
+
+    def get_position_queryset(self):
+        raise NotImplementedError
+
+    def get_new_position(self, request):
+        queryset = self.get_position_queryset()
+        after = request.query_params.get('after')
+        if after is None:
+            return append_position(queryset)
+        try:
+            #An empty ?after= inserts in front of every row
+            after = int(after) if after else None
+            return insert_position(queryset, after=after, unique=self.unique_positions)
+        except (ValueError, ObjectDoesNotExist):
+            raise ValidationError({ 'after': 'Must be the id of an existing row' })
+
+    def get_order(self, request):
+        order = request.data.get('order') if isinstance(request.data, dict) else None
+        if not is_id_list(order):
+            raise ValidationError({ 'order': 'Must be a list of distinct ids' })
+        return order
+
+    def check_order_permissions(self, request, order):
+        pass
+
+    def reorder(self, request):
+        order = self.get_order(request)
+        self.check_order_permissions(request, order)
+        queryset = self.get_position_queryset()
+        with transaction.atomic():
+            try:
+                changed = reorder(queryset, order, unique=self.unique_positions)
+            except LookupError as e:
+                raise ValidationError({ 'order': 'Unknown ids: %s' % ', '.join(map(str, e.args[0])) })
+            bulk_changed.send(sender=queryset.model, instances=changed)
+        return Response(list(queryset.filter(id__in=order).order_by('position', 'id').values('id', 'position')))
+
+class LessonCreate(PositionedMixin, CreateAPIView):
+    permission_classes = (IsAuthenticated, IsTeacher)
     serializer_class = LessonSerializer
 
-class LessonRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
-    permissions = (IsAuthenticated, IsTeacher)
+    def get_position_queryset(self):
+        return Lesson.objects.only('id', 'position')
+
+    def perform_create(self, serializer):
+        resolver = get_resolver(self.request)
+        courses = serializer.validated_data.get('course', [])
+        if not all(may_edit(resolver, frozenset([course.owner_id])) for course in courses):
+            raise PermissionDenied()
+        if 'position' in serializer.validated_data:
+            serializer.save()
+        else:
+            with transaction.atomic():
+                serializer.save(position=self.get_new_position(self.request))
+
+class LessonReorder(PositionedMixin, APIView):
+    """
+    Reorders lessons by their global position, or by their position in the
+    course given as ?course=, which is the order lesson lists of that
+    course and its outline follow
+    """
+    permission_classes = (IsAuthenticated, IsTeacher)
+
+    def get_position_queryset(self):
+        return Lesson.objects.only('id', 'position')
+
+    def check_order_permissions(self, request, order):
+        #Every listed lesson has to be editable, as for LessonBulk
+        resolver = get_resolver(request)
+        owners = get_owners_by_lesson(order)
+        if not all(may_edit(resolver, lesson_owners) for lesson_owners in owners.values()):
+            raise PermissionDenied()
+
+    def post(self, request, *args, **kwargs):
+        course = request.query_params.get('course')
+        if course is None:
+            return self.reorder(request)
+        return self.reorder_course(request, course)
+
+    def reorder_course(self, request, course):
+        try:
+            course = int(course)
+        except ValueError:
+            raise ValidationError({ 'course': 'Must be an integer' })
+        course = get_object_or_404(Course.objects.only('id', 'owner'), id=course)
+        if not may_edit(get_resolver(request), frozenset([course.owner_id])):
+            raise PermissionDenied()
+        order = self.get_order(request)
+        links = CourseLesson.objects.filter(course=course).only('id', 'course', 'position')
+        with transaction.atomic():
+            link_ids = dict(links.filter(lesson_id__in=order).values_list('lesson_id', 'id'))
+            missing = [pk for pk in order if pk not in link_ids]
+            if missing:
+                raise ValidationError({ 'order': 'Unknown ids: %s' % ', '.join(map(str, missing)) })
+            changed = reorder(links, [link_ids[pk] for pk in order])
+            bulk_changed.send(sender=CourseLesson, instances=changed)
+        rows = links.filter(lesson_id__in=order).order_by('position', 'lesson_id').values_list('lesson_id', 'position')
+        return Response([{ 'id': lesson_id, 'position': position } for lesson_id, position in rows])
+
+class LessonRetrieveUpdateDestroy(ReplicaReadMixin, RetrieveUpdateDestroyAPIView):
+    permission_classes = (IsAuthenticated, IsLessonOwner)
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     lookup_field = 'id'
 
 
 #---------------------------Slides
-class SlideList(ListAPIView):
-    permissions = (IsAuthenticated, IsStudent)
-    serializer_class = SlideSerializer
+class LessonScopedMixin:
+    """
+    Resolves nested lesson/<id>/slides/ routes by filtering on lesson_id,
+    so a slide lookup is a single hit on the (lesson, position) index
+    """
+    lookup_field = 'position'
 
     def get_queryset(self):
-        lesson = self.kwargs.get('id')
-        slides = Slide.objects.filter(lesson=lesson)
-        return slides
+        return Slide.objects.filter(lesson_id=self.kwargs.get('id')).order_by('position')
+
+    def get_lesson(self, lock=False):
+        queryset = Lesson.objects.select_for_update() if lock else Lesson.objects
+        return get_object_or_404(queryset.only('id'), id=self.kwargs.get('id'))
+
+    def save_slide(self, serializer, **kwargs):
+        try:
+            with transaction.atomic():
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise ValidationError({ 'position': 'A slide already exists at this position' })
 
-class SlideCreate(CreateAPIView):
-    permissions = (IsAuthenticated, IsTeacher)
+    def perform_update(self, serializer):
+        self.save_slide(serializer)
+
+class SlideList(ReplicaReadMixin, MultiGetMixin, SparseFieldsetMixin, LessonScopedMixin, CachedResponseMixin, ListAPIView):
+    permission_classes = (IsAuthenticated, IsLessonReader)
+    serializer_class = SlideSerializer
+    list_serializer_class = SlideListSerializer
+
+    def get_cache_scope(self):
+        return 'slides:%s' % self.kwargs.get('id')
+
+class SlideCreate(PositionedMixin, LessonScopedMixin, CreateAPIView):
+    permission_classes = (IsAuthenticated, IsTeacher, IsLessonOwner)
     serializer_class = SlideSerializer
+    unique_positions = True
+
+    def get_position_queryset(self):
+        return self.get_queryset().only('id', 'position', 'lesson')
 
     def create(self, request, *args, **kwargs):
-        lesson_instance = Lesson.objects.get(id=self.kwargs.get('id'))
-        serializer = SlideSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(lesson=lesson_instance)
-            return Response(serializer.data)
-        return Response(serializer.error, status=status.HTTP_400_BAD_REQUEST)
-
-class SlideRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
-    permissions = (IsAuthenticated, IsTeacher)
+        lesson_instance = self.get_lesson()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if 'position' in serializer.validated_data:
+            self.save_slide(serializer, lesson=lesson_instance)
+        else:
+            with transaction.atomic():
+                #Creates in the same lesson wait here, so none picks the
+                #position another one is about to take
+                lesson_instance = self.get_lesson(lock=True)
+                self.save_slide(serializer, lesson=lesson_instance, position=self.get_new_position(request))
+        return Response(serializer.data)
+
+class SlideReorder(PositionedMixin, LessonScopedMixin, APIView):
+    permission_classes = (IsAuthenticated, IsTeacher, IsLessonOwner)
+    unique_positions = True
+
+    def get_position_queryset(self):
+        return self.get_queryset().only('id', 'position', 'lesson')
+
+    def post(self, request, *args, **kwargs):
+        self.get_lesson()
+        return self.reorder(request)
+
+class SlideRetrieveUpdateDestroy(ReplicaReadMixin, LessonScopedMixin, RetrieveUpdateDestroyAPIView):
+    permission_classes = (IsAuthenticated, IsLessonOwner)
     serializer_class = SlideSerializer
 
-    def get_queryset(self):
-        lesson_instance = Lesson.objects.get(id=self.kwargs.get('id'))
-        slides = Slide.objects.filter(lesson=lesson_instance)
-        return slides
\ No newline at end of file
+
+#---------------------------Search
+class Search(ReplicaReadMixin, APIView):
+    """
+    Ranked full-text search over courses (title, description) and lessons
+    (title, slide titles and content), paginated with limit/offset.
+    Databases without a full-text backend return no results.
+    """
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        terms = match_terms(request.query_params.get('q'))
+        kind = request.query_params.get('type')
+        if kind is not None and kind not in KINDS:
+            raise ValidationError({ 'type': 'Must be one of: %s' % ', '.join(KINDS) })
+        #An empty page would point `next` at its own offset
+        limit = self.get_int_param(request, 'limit', self.default_limit, self.max_limit, minimum=1)
+        offset = self.get_int_param(request, 'offset', 0)
+
+        backend = get_backend()
+        rows = []
+        if terms and backend is not None:
+            rows = backend.search(terms, kind=kind, limit=limit + 1, offset=offset)
+        results = [
+            {'type': KINDS[rowid % len(KINDS)], 'id': rowid // len(KINDS), 'title': title, 'rank': rank}
+            for rowid, title, rank in rows[:limit]
+        ]
+
+        url = request.build_absolute_uri()
+        next_url = previous_url = None
+        if len(rows) > limit:
+            next_url = replace_query_param(url, 'offset', offset + limit)
+        if offset > 0:
+            previous_url = replace_query_param(url, 'offset', max(offset - limit, 0))
+            if offset <= limit:
+                previous_url = remove_query_param(previous_url, 'offset')
+        return Response({ 'next': next_url, 'previous': previous_url, 'results': results })
+
+    def get_int_param(self, request, name, default, maximum=None, minimum=0):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({ name: 'Must be an integer' })
+        if value < minimum:
+            raise ValidationError({ name: 'Must be at least %d' % minimum })
+        return min(value, maximum) if maximum is not None else value
+
+
+#---------------------------Batch
+class Batch(APIView):
+    """
+    Runs up to `max_requests` GET requests against this API in one round
+    trip: `{"requests": [{"path": "course/1/"}, {"path": "lesson/?ids=2,3"}]}`.
+    Answers `{"responses": [{"path", "status", "body"}, ...]}` in the same
+    order.
+    """
+    max_requests = 50
+
+    def post(self, request, *args, **kwargs):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) and isinstance(item.get('path'), str) for item in items):
+            raise ValidationError({ 'requests': 'Must be a list of objects with a path' })
+        if len(items) > self.max_requests:
+            raise ValidationError({ 'requests': 'At most %d requests' % self.max_requests })
+        #Paths are relative to where this API is mounted
+        prefix = request.path[:-len('batch/')]
+        return Response({ 'responses': BatchReader(request, prefix).run(items) })
+
+
+#---------------------------Bulk
+class BulkImport(APIView):
+    permission_classes = (IsAuthenticated, IsTeacher)
+    parser_classes = (NDJSONParser,)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            batch_size = max(1, int(request.query_params.get('batch_size', 500)))
+        except ValueError:
+            raise ValidationError({ 'batch_size': 'Must be an integer' })
+        result = BulkImporter(batch_size=batch_size).run(request.data)
+        return Response(result)
+
+class BulkExport(APIView):
+    permission_classes = (IsAuthenticated, IsTeacher)
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(export_records(), content_type=NDJSONParser.media_type)
+        response['Content-Disposition'] = 'attachment; filename="courses.ndjson"'
+        return response
+
+
+#---------------------------Bulk writes
+class BulkWriteMixin:
+    """
+    PATCH and DELETE on many rows in one transaction. Rows are picked with
+    `{"ids": [...]}` or `{"filter": {...}}` on `bulk_filter_fields`. PATCH
+    applies `"data"` to all of them with one UPDATE, or the changes of
+    every row sent as `{"rows": [{"id": 1, ...}, ...]}` with one
+    bulk_update. Changes are validated with the view's serializer and
+    derived data catches up through bulk_changed.
+    """
+    bulk_filter_fields = ()
+    #Fields that need one request per row, such as category moves
+    bulk_excluded_fields = ()
+    #Lets an empty filter pick every row of get_queryset()
+    allow_unfiltered = False
+    max_bulk_rows = 1000
+
+    def get_bulk_rows(self, request, ids=None):
+        """
+        Returns the rows to change, or the rows of `ids`, locked until the
+        end of the transaction, and the requested ids that have no row
+        """
+        data = request.data if isinstance(request.data, dict) else {}
+        queryset = self.get_queryset().order_by()
+        if ids is None and 'ids' in data:
+            ids = data['ids']
+            if not is_id_list(ids):
+                raise ValidationError({ 'ids': 'Must be a list of distinct ids' })
+        elif ids is None:
+            lookups = data.get('filter')
+            if not isinstance(lookups, dict) or not (lookups or self.allow_unfiltered):
+                raise ValidationError({ 'filter': 'Send ids or a filter on: %s' % ', '.join(self.bulk_filter_fields) })
+            unknown = set(lookups) - set(self.bulk_filter_fields)
+            if unknown:
+                raise ValidationError({ 'filter': 'Unknown fields: %s' % ', '.join(sorted(unknown)) })
+            try:
+                ids = sorted(queryset.filter(**lookups).values_list('id', flat=True).distinct()[:self.max_bulk_rows + 1])
+            except (TypeError, ValueError, DjangoValidationError):
+                raise ValidationError({ 'filter': 'Invalid value' })
+        if len(ids) > self.max_bulk_rows:
+            raise ValidationError({ 'non_field_errors': 'At most %d rows per request' % self.max_bulk_rows })
+
+        rows = queryset.select_for_update().in_bulk(ids)
+        self.check_bulk_permissions(request, list(rows.values()))
+        return rows, [pk for pk in ids if pk not in rows]
+
+    def check_bulk_permissions(self, request, rows):
+        pass
+
+    def validate_bulk_values(self, data):
+        """
+        Returns the validated changes in `data`, a partial representation
+        """
+        if not isinstance(data, dict) or not data:
+            raise ValidationError({ 'data': 'Must be an object with the fields to change' })
+        serializer = self.get_serializer(data=data, partial=True)
+        #Uniqueness spans the whole batch, the database checks it
+        serializer.validators = []
+        serializer.is_valid(raise_exception=True)
+        values = dict(serializer.validated_data)
+        model = self.get_queryset().model
+        refused = set(data) - set(values)
+        refused.update(name for name in values if name in self.bulk_excluded_fields or model._meta.get_field(name).many_to_many)
+        if refused:
+            raise ValidationError({ 'data': 'Cannot be changed in bulk: %s' % ', '.join(sorted(refused)) })
+        return values
+
+    def get_derived_values(self, values):
+        """
+        Extra fields to write along with `values`, e.g. slugs of titles
+        """
+        return {}
+
+    def patch(self, request, *args, **kwargs):
+        data = request.data if isinstance(request.data, dict) else {}
+        changes = ids = None
+        if 'rows' in data:
+            changes = self.validate_bulk_rows(data['rows'])
+            ids = list(changes)
+        else:
+            values = self.validate_bulk_values(data.get('data'))
+            values.update(self.get_derived_values(values))
+
+        model = self.get_queryset().model
+        try:
+            with transaction.atomic():
+                rows, missing = self.get_bulk_rows(request, ids)
+                if changes is not None:
+                    fields = set()
+                    for pk, row in rows.items():
+                        row_values = dict(changes[pk], **self.get_derived_values(changes[pk]))
+                        for name, value in row_values.items():
+                            setattr(row, name, value)
+                        fields.update(row_values)
+                    if rows:
+                        model.objects.bulk_update(rows.values(), sorted(fields), batch_size=500)
+                elif rows:
+                    model.objects.filter(id__in=rows).update(**values)
+                    for row in rows.values():
+                        for name, value in values.items():
+                            setattr(row, name, value)
+                if rows:
+                    bulk_changed.send(sender=model, instances=list(rows.values()))
+        except IntegrityError:
+            raise ValidationError({ 'non_field_errors': 'The changes conflict with existing rows' })
+        return Response({ 'updated': len(rows), 'ids': sorted(rows), 'missing': missing })
+
+    def validate_bulk_rows(self, rows):
+        """
+        Returns the validated changes of every row in `rows` by id
+        """
+        if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows) \
+                or not is_id_list([row.get('id') for row in rows]):
+            raise ValidationError({ 'rows': 'Must be a list of objects with distinct ids' })
+        changes, errors = {}, {}
+        for index, row in enumerate(rows):
+            try:
+                changes[row['id']] = self.validate_bulk_values({ name: value for name, value in row.items() if name != 'id' })
+            except ValidationError as e:
+                errors[index] = e.detail
+        if errors:
+            raise ValidationError({ 'rows': errors })
+        return changes
+
+    def delete_rows(self, rows):
+        """
+        Deletes `rows` and returns the number of deleted rows per model,
+        cascades included
+        """
+        _, deleted = self.get_queryset().model.objects.filter(id__in=rows).delete()
+        return deleted
+
+    def delete(self, request, *args, **kwargs):
+        with transaction.atomic():
+            rows, missing = self.get_bulk_rows(request)
+            deleted = self.delete_rows(rows) if rows else {}
+        return Response({ 'deleted': deleted, 'ids': sorted(rows), 'missing': missing })
+
+class CategoryBulk(BulkWriteMixin, GenericAPIView):
+    permission_classes = (IsAuthenticated, IsTeacher)
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    bulk_filter_fields = ('parent',)
+    bulk_excluded_fields = ('parent',)
+
+    def delete_rows(self, rows):
+        #Deepest first, so every deleted category still finds its subtree
+        #under the path it was saved with
+        deleted = Counter()
+        for category in sorted(rows.values(), key=lambda category: category.depth, reverse=True):
+            deleted.update(category.delete()[1])
+        return dict(deleted)
+
+class CourseBulk(BulkWriteMixin, GenericAPIView):
+    permission_classes = (IsAuthenticated, IsTeacher)
+    queryset = Course.objects.all()
+    serializer_class = CourseSerializer
+    bulk_filter_fields = ('category', 'owner')
+
+    def check_bulk_permissions(self, request, rows):
+        resolver = get_resolver(request)
+        if not all(may_edit(resolver, frozenset([course.owner_id])) for course in rows):
+            raise PermissionDenied()
+
+    def get_derived_values(self, values):
+        #Same slugs as Course.save(), which bulk writes skip
+        return { 'slug': slugify(values['title']) } if 'title' in values else {}
+
+class LessonBulk(BulkWriteMixin, GenericAPIView):
+    permission_classes = (IsAuthenticated, IsLessonOwner)
+    queryset = Lesson.objects.all()
+    serializer_class = LessonSerializer
+    bulk_filter_fields = ('course', 'item')
+
+    def check_bulk_permissions(self, request, rows):
+        resolver = get_resolver(request)
+        owners = get_owners_by_lesson([lesson.pk for lesson in rows])
+        if not all(may_edit(resolver, lesson_owners) for lesson_owners in owners.values()):
+            raise PermissionDenied()
+
+class SlideBulk(BulkWriteMixin, LessonScopedMixin, GenericAPIView):
+    permission_classes = (IsAuthenticated, IsLessonOwner)
+    serializer_class = SlideSerializer
+    allow_unfiltered = True